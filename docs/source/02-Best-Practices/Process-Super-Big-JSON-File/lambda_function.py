@@ -7,6 +7,8 @@ big array node) without using much memory.
 Requirements::
 
     ijson
+    numpy
+    pyarrow  # only for the parquet output
 
 **Example 1**
 
@@ -37,16 +39,32 @@ if also delete the node
 
 - Duration: 50s
 - Max Memory Used: 1037 MB
+
+The numbers above are from the version that deleted the node with one extra
+pass per level of the json path. Now the node is deleted in the same pass as
+the split, the input is read exactly once.
 """
 
 import typing as T
+import re
 import json
+import base64
 import ijson
 import dataclasses
 import itertools
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future
 
+import numpy as np
 import boto3
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet
+except ImportError:  # only the parquet output requires pyarrow
+    pa = None
+
 
 s3_client = boto3.client("s3")
 
@@ -75,13 +93,174 @@ def put_object(uri: str, body):
     )
 
 
+def delete_object(uri: str):
+    bucket, key = split_s3_uri(uri)
+    return s3_client.delete_object(
+        Bucket=bucket,
+        Key=key,
+    )
+
+
+class JsonSplitter:
+    """
+    One pass JSON splitter built on the ``ijson.parse`` event stream.
+
+    The events of the arrays at ``json_path`` are turned into items and
+    grouped into chunks, one chunk stream per array, all the other events
+    are fed to an ``ijson.ObjectBuilder``, which rebuilds the document
+    without the array nodes. So the file is read exactly once, no matter how
+    many arrays are split.
+
+    Example::
+
+        >>> splitter = JsonSplitter(json_path="data.records", chunk_size=10)
+        >>> with open("data.json", "rb") as f_in:
+        ...     for items in splitter.iter_chunks(f_in):
+        ...         ...
+        >>> splitter.data  # the document without data.records
+        {"id": 1, "data": {"date": "2000-01-01"}, "name": "alice"}
+
+        >>> splitter = JsonSplitter(json_path=["data.records", "data.events"], chunk_size=10)
+        >>> with open("data.json", "rb") as f_in:
+        ...     for json_path, items in splitter.iter_path_chunks(f_in):
+        ...         ...
+
+    :param json_path: the json path in dot notation to the array you want to
+        split, or a list of them, a path can not be inside of another. A
+        path that is not in the document yields no chunk.
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max size of a chunk, the sum of the ``json.dumps`` size
+        of the items, a single item larger than this is a chunk by itself
+
+    The numbers are kept as they are, an integer stays an ``int`` and a float
+    stays a ``float``, even ``1.0``. With the default C backend of ``ijson``,
+    an integer must fit in 64 bits, a larger one is a parse error.
+    """
+
+    def __init__(
+        self,
+        json_path: T.Union[str, T.List[str]],
+        chunk_size: T.Optional[int] = None,
+        chunk_bytes: T.Optional[int] = None,
+    ):
+        if chunk_size is None and chunk_bytes is None:
+            raise ValueError("one of chunk_size and chunk_bytes is required")
+        if isinstance(json_path, str):
+            json_path = [json_path]
+        self.json_paths = [path.strip(".") for path in json_path]
+        for path, other in itertools.permutations(self.json_paths, 2):
+            if path == "" or path == other or other.startswith(f"{path}."):
+                raise ValueError(f"json path {other!r} is inside of {path!r}")
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.items = {path: list() for path in self.json_paths}
+        self.n_bytes = {path: 0 for path in self.json_paths}
+        self.item_prefixes = {
+            path: f"{path}.item" if path else "item" for path in self.json_paths
+        }
+        self.deleted_keys = {
+            tuple(path.rpartition(".")[::2]) for path in self.json_paths
+        }
+        self.nodes: T.Dict[str, T.Optional[str]] = dict()
+        self.builder = ijson.ObjectBuilder()
+
+    @property
+    def data(self) -> T.Any:
+        """
+        The document without the array nodes, available once
+        :meth:`iter_chunks` is exhausted.
+        """
+        return self.builder.value
+
+    def get_node(self, prefix: str) -> T.Optional[str]:
+        """
+        The json path of the array node the event prefix is or is inside of,
+        None if not in any. The prefixes repeat, so the answer is cached.
+        """
+        try:
+            return self.nodes[prefix]
+        except KeyError:
+            node = None
+            for path in self.json_paths:
+                if path == "" or prefix == path or prefix.startswith(f"{path}."):
+                    node = path
+                    break
+            self.nodes[prefix] = node
+            return node
+
+    def add_item(self, json_path: str, item: T.Any) -> T.Optional[list]:
+        """
+        Add the item to the current chunk of the array. Return the chunk if
+        it is full, the byte budget is checked before adding, so a chunk
+        never exceeds it.
+        """
+        items = self.items[json_path]
+        chunk = None
+        if self.chunk_bytes is not None:
+            size = len(json.dumps(item))
+            if items and self.n_bytes[json_path] + size > self.chunk_bytes:
+                chunk = items
+                items = self.items[json_path] = list()
+                self.n_bytes[json_path] = 0
+            self.n_bytes[json_path] += size
+        items.append(item)
+        if chunk is None and len(items) == self.chunk_size:
+            chunk = items
+            self.items[json_path] = list()
+            self.n_bytes[json_path] = 0
+        return chunk
+
+    def iter_path_chunks(self, f_in: T.BinaryIO) -> T.Iterator[T.Tuple[str, list]]:
+        """
+        Yield the ``(json_path, items)`` chunks, the chunks of each array are
+        in document order.
+        """
+        item_builder = None
+        for prefix, event, value in ijson.parse(f_in, use_float=True):
+            node = self.get_node(prefix)
+            if node is not None:
+                if prefix == self.item_prefixes[node]:
+                    chunk = None
+                    if event in ("start_map", "start_array"):
+                        item_builder = ijson.ObjectBuilder()
+                        item_builder.event(event, value)
+                    elif event in ("end_map", "end_array"):
+                        item_builder.event(event, value)
+                        chunk = self.add_item(node, item_builder.value)
+                        item_builder = None
+                    elif event == "map_key":
+                        item_builder.event(event, value)
+                    else:  # scalar item
+                        chunk = self.add_item(node, value)
+                    if chunk is not None:
+                        yield node, chunk
+                elif item_builder is not None:
+                    item_builder.event(event, value)
+                continue
+            if event == "map_key" and (prefix, value) in self.deleted_keys:
+                continue
+            self.builder.event(event, value)
+        for path in self.json_paths:
+            if self.items[path]:
+                yield path, self.items[path]
+                self.items[path] = list()
+                self.n_bytes[path] = 0
+
+    def iter_chunks(self, f_in: T.BinaryIO) -> T.Iterator[list]:
+        """
+        Yield the chunks of all arrays, use it if there is only one.
+        """
+        for _, chunk in self.iter_path_chunks(f_in):
+            yield chunk
+
+
 def delete_node(
     s3uri: str,
-    json_path: str,
+    json_path: T.Union[str, T.List[str]],
 ) -> dict:
     """
     Read json file from s3, delete node at certain json path, and return the
-    json data with the node deleted.
+    json data with the node deleted, the items are parsed and dropped.
 
     Example::
 
@@ -133,78 +312,791 @@ def delete_node(
             }
         }
     """
-    parts = json_path.split(".")
-    prefix_and_key_pairs = []
-    lst = list()
-    for part in parts:
-        prefix = ".".join(lst)
-        key = part
-        prefix_and_key_pairs.append((prefix, key))
-        lst.append(part)
-
-    new_data = dict()
-    parent_data = new_data
-    for prefix, key in prefix_and_key_pairs:
-        # print(f"------ prefix = {prefix}, key = {key} ------")
-        data = dict()
-        with get_object(s3uri)["Body"] as f_in:
-            for k, v in ijson.kvitems(f_in, prefix):
-                if k != key:
-                    data[k] = v
-        if prefix == "":
-            new_data = data
+    splitter = JsonSplitter(json_path=json_path, chunk_size=1000)
+    with get_object(s3uri)["Body"] as f_in:
+        for _ in splitter.iter_chunks(f_in):
+            pass
+    return splitter.data
+
+
+class ParquetEncoder:
+    """
+    Encode the chunks of one array as Parquet files, the items have to be
+    JSON objects.
+
+    Without ``schema``, the schema is inferred from the first chunk and
+    promoted when a later chunk has a new field or a wider type, for example
+    ``null`` to ``string`` or ``int64`` to ``double``, with the permissive
+    promotion of :func:`pyarrow.unify_schemas`. The chunk is written with the
+    promoted schema, so the last chunk has the schema of the array. The
+    first ``n_stale`` chunks, the ones before the last promotion, have
+    narrower types, and Athena or Glue expect one type per column, so they
+    are rewritten with the final schema once the array is done, see
+    :meth:`recode`. Only the chunks before a promotion are rewritten, and
+    each of them at most once.
+
+    The final schema is also written as a ``_schema.parquet`` sidecar without
+    rows, see :meth:`encode_schema`, for example to create the table::
+
+        >>> schema = pyarrow.parquet.read_schema("arrays/_schema.parquet")
+
+    The file name starts with ``_``, so Athena, Spark and pyarrow don't read
+    it as a chunk.
+
+    With ``schema``, the items are converted to it, the unknown fields are
+    dropped.
+
+    :param schema: the Arrow schema of the items
+    :param promote: promote the schema, the default is True if no ``schema``
+    :param compression: the Parquet compression codec
+    """
+
+    def __init__(
+        self,
+        schema: T.Optional["pa.Schema"] = None,
+        promote: T.Optional[bool] = None,
+        compression: str = "snappy",
+    ):
+        if pa is None:
+            raise ImportError("the parquet output requires pyarrow")
+        self.schema = schema
+        self.promote = schema is None if promote is None else promote
+        self.compression = compression
+        self.n_chunks = 0
+        self.n_stale = 0
+
+    def encode(self, items: list) -> bytes:
+        if self.promote:
+            # unlike Table.from_pylist, the struct inference sees the keys of all items
+            table = pa.Table.from_struct_array(pa.array(items))
+            if self.schema is not None and not table.schema.equals(self.schema):
+                try:
+                    schema = pa.unify_schemas(
+                        [self.schema, table.schema],
+                        promote_options="permissive",
+                    )
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"the items have incompatible schemas: {e}")
+                table = pa.Table.from_pylist(items, schema=schema)
+                if not schema.equals(self.schema):
+                    self.n_stale = self.n_chunks
+            self.schema = table.schema
         else:
-            parent_data[prefix.split(".")[-1]] = data
-        parent_data = data
-        # print("new_data:", new_data)
+            table = pa.Table.from_pylist(items, schema=self.schema)
+        self.n_chunks += 1
+        return self.encode_table(table)
+
+    def recode(self, data: bytes) -> bytes:
+        """
+        Rewrite a chunk encoded before the last promotion with the final
+        schema.
+        """
+        table = pyarrow.parquet.read_table(pa.BufferReader(data))
+        table = pa.Table.from_pylist(table.to_pylist(), schema=self.schema)
+        return self.encode_table(table)
+
+    def encode_table(self, table: "pa.Table") -> bytes:
+        sink = pa.BufferOutputStream()
+        pyarrow.parquet.write_table(table, sink, compression=self.compression)
+        return sink.getvalue().to_pybytes()
 
-    return new_data
+    def encode_schema(self) -> T.Optional[bytes]:
+        """
+        Encode the schema of all the chunks so far as a Parquet file without
+        rows, None if there is no chunk yet.
+        """
+        if self.schema is None:
+            return None
+        return self.encode_table(self.schema.empty_table())
 
 
-def take(n: int, iterable: T.Iterable):
+class ChunkUploader:
     """
-    Return first n items of the iterable as a list
+    Upload the chunks with a thread pool while the parser keeps going.
+
+    At most ``max_pending`` chunks are queued or uploading, :meth:`submit`
+    blocks when the queue is full, so the memory is capped by
+    ``max_pending`` times the chunk size. The first upload error is raised
+    by the next :meth:`submit` or when the context exits.
+
+    The chunks are uploaded as JSON lines, or as Parquet files with
+    ``output_format="parquet"``. The Parquet chunks are encoded by
+    :meth:`submit` in order, one :class:`ParquetEncoder` per subdir, so the
+    schema promotion doesn't depend on the upload order.
+
+    Example::
+
+        >>> with ChunkUploader(s3dir_arrays="s3://bucket/output/arrays/") as uploader:
+        ...     for ith, items in enumerate(chunks, start=1):
+        ...         uploader.submit(ith, items)
+
+    :param s3dir_arrays: the s3 uri of the output directory of the chunks
+    :param max_workers: number of concurrent uploads
+    :param max_pending: max number of chunks in memory
+    :param output_format: ``"json"`` or ``"parquet"``
+    :param schema: see :class:`ParquetEncoder`
+    :param promote: see :class:`ParquetEncoder`
     """
-    return list(itertools.islice(iterable, n))
+
+    def __init__(
+        self,
+        s3dir_arrays: str,
+        max_workers: int = 8,
+        max_pending: int = 16,
+        output_format: str = "json",
+        schema: T.Optional["pa.Schema"] = None,
+        promote: T.Optional[bool] = None,
+    ):
+        if output_format not in ("json", "parquet"):
+            raise ValueError(f"unknown output format {output_format!r}")
+        self.s3dir_arrays = s3dir_arrays
+        self.output_format = output_format
+        self.schema = schema
+        self.promote = promote
+        self.encoders: T.Dict[str, ParquetEncoder] = dict()
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.semaphore = threading.BoundedSemaphore(max_pending)
+        self.futures = deque()
+
+    def get_encoder(self, subdir: str = "") -> ParquetEncoder:
+        if subdir not in self.encoders:
+            self.encoders[subdir] = ParquetEncoder(schema=self.schema, promote=self.promote)
+        return self.encoders[subdir]
+
+    def upload(self, uri: str, body: T.Union[bytes, list]):
+        try:
+            if isinstance(body, list):  # json lines
+                body = "\n".join([
+                    json.dumps(item)
+                    for item in body
+                ])
+            put_object(uri, body)
+        finally:
+            self.semaphore.release()
+
+    def check(self):
+        """
+        Raise the error of the finished uploads, if any.
+        """
+        while self.futures and self.futures[0].done():
+            self.futures.popleft().result()
+
+    def submit(self, ith: int, items: list, subdir: str = "") -> Future:
+        """
+        :param subdir: upload to ``{s3dir_arrays}{subdir}{ith}.{output_format}``,
+            for example ``data.records/``
+        """
+        self.check()
+        if self.output_format == "parquet":
+            body = self.get_encoder(subdir).encode(items)
+        else:
+            body = items
+        self.semaphore.acquire()
+        future = self.executor.submit(
+            self.upload,
+            f"{self.s3dir_arrays}{subdir}{ith}.{self.output_format}",
+            body,
+        )
+        self.futures.append(future)
+        return future
+
+    def recode(self, uri: str, encoder: ParquetEncoder):
+        with get_object(uri)["Body"] as f:
+            data = f.read()
+        put_object(uri, encoder.recode(data))
+
+    def finish(self):
+        """
+        Call it once all the chunks are submitted. Rewrite the Parquet chunks
+        uploaded before the last schema promotion with the final schema, and
+        upload the final schema of each subdir to
+        ``{s3dir_arrays}{subdir}_schema.parquet``, see :class:`ParquetEncoder`.
+        """
+        # a chunk is rewritten once its upload is done
+        while self.futures:
+            self.futures.popleft().result()
+        for subdir, encoder in self.encoders.items():
+            for ith in range(1, 1 + encoder.n_stale):
+                self.check()
+                self.futures.append(
+                    self.executor.submit(
+                        self.recode,
+                        f"{self.s3dir_arrays}{subdir}{ith}.parquet",
+                        encoder,
+                    )
+                )
+            body = encoder.encode_schema()
+            if body is not None:
+                put_object(f"{self.s3dir_arrays}{subdir}_schema.parquet", body)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            for future in self.futures:
+                future.cancel()
+        self.executor.shutdown(wait=True)
+        if exc_type is None:
+            while self.futures:
+                self.futures.popleft().result()
 
 
 def split_json(
     s3file_input: str,
     s3dir_output: str,
-    json_path: str,
-    chunk_size: int,
+    json_path: T.Union[str, T.List[str]],
+    chunk_size: T.Optional[int] = None,
+    chunk_bytes: T.Optional[int] = None,
+    max_upload_workers: int = 8,
+    output_format: str = "json",
+    schema: T.Optional["pa.Schema"] = None,
 ):
     """
+    The chunks are uploaded to ``{s3dir_output}arrays/{ith}.json``. If
+    ``json_path`` is a list, all the arrays are split in the same pass, the
+    chunks of each array are uploaded to
+    ``{s3dir_output}arrays/{json_path}/{ith}.json``.
+
     :param s3file_input: the s3 uri of the input JSON file
     :param s3dir_output: the s3 uri of the output directory, it suppose to be empty
-    :param json_path: the json path in dot notation to the array you want to split
-    :param chunk_size: group items in the array into chunks of this size
+    :param json_path: the json path in dot notation to the array you want to
+        split, or a list of them
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max serialized size of a chunk in bytes, use it to
+        get uniform file size and predictable memory when the item size varies
+    :param max_upload_workers: number of concurrent chunk uploads
+    :param output_format: ``"json"`` for JSON lines or ``"parquet"``, the
+        parquet chunks can be queried directly, see :class:`ParquetEncoder`
+    :param schema: the Arrow schema of the parquet chunks, inferred if not
+        given. The chunks all have the final schema, it is also uploaded to
+        ``_schema.parquet`` next to the chunks
+    """
+    s3file_data = f"{s3dir_output}data.json"
+    s3dir_arrays = f"{s3dir_output}arrays/"
+
+    # split the big json arrays into many small json arrays, and rebuild the
+    # rest of the document in the same pass, the chunks are uploaded while
+    # the parsing continues
+    splitter = JsonSplitter(
+        json_path=json_path,
+        chunk_size=chunk_size,
+        chunk_bytes=chunk_bytes,
+    )
+    with ChunkUploader(
+        s3dir_arrays=s3dir_arrays,
+        max_workers=max_upload_workers,
+        output_format=output_format,
+        schema=schema,
+    ) as uploader:
+        with get_object(s3file_input)["Body"] as f_in:
+            n_chunks = dict()
+            for path, items in splitter.iter_path_chunks(f_in):
+                n_chunks[path] = n_chunks.get(path, 0) + 1
+                uploader.submit(
+                    n_chunks[path],
+                    items,
+                    subdir="" if isinstance(json_path, str) else f"{path}/",
+                )
+        uploader.finish()
+
+    put_object(s3file_data, json.dumps(splitter.data))
+
+
+MB = 1024 * 1024
+
+_structural = re.compile(rb'["\[\]{},:]')
+_string = re.compile(rb'"[^"\\]*(?:\\.[^"\\]*)*"', re.S)
+_is_structural = np.zeros(256, dtype=bool)
+_is_structural[list(b"[]{},")] = True
+_bracket_delta = np.zeros(256, dtype=np.int8)
+_bracket_delta[list(b"[{")] = 1
+_bracket_delta[list(b"]}")] = -1
+
+
+class ByteRangeSplitter:
+    """
+    Split the array at ``json_path`` from the raw bytes of the document,
+    fed segment by segment in order, for example the byte ranges of a
+    concurrent download.
+
+    The item boundaries are found with vectorized numpy operations, the items
+    are not parsed until a chunk is complete. A segment boundary can fall
+    anywhere, in the middle of an item or a string, the incomplete tail is
+    carried over to the next segment, so the chunks are always cut on item
+    boundaries and numbered in document order.
+
+    The bytes outside of the array are kept and parsed at the end, with the
+    array replaced by ``null``, then the node is deleted.
+
+    :param json_path: the json path in dot notation to the array you want to
+        split, object keys only.
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max size of a chunk, the sum of the item sizes in the
+        input, a single item larger than this is a chunk by itself
     """
-    json_path = json_path.strip(".")
 
+    def __init__(
+        self,
+        json_path: str,
+        chunk_size: T.Optional[int] = None,
+        chunk_bytes: T.Optional[int] = None,
+    ):
+        if chunk_size is None and chunk_bytes is None:
+            raise ValueError("one of chunk_size and chunk_bytes is required")
+        self.json_path = json_path.strip(".")
+        if "item" in self.json_path.split("."):
+            raise ValueError("the json path can not go through an array")
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.n_bytes = 0
+        self.offset = 0  # the offset of the buffer in the input
+        self.items_offset = 0
+        self.stack: T.List[list] = list()  # [is_object, key, expect_key]
+        self.mode = "seek"  # seek -> array -> after
+        self.depth = 0
+        self.in_string = 0
+        self.buffer = b""
+        self.pos = 0
+        self.outside_start = 0
+        self.item_start = 0
+        self.outside: T.List[bytes] = list()
+        self.items: T.List[bytes] = list()
+
+    @classmethod
+    def from_checkpoint(
+        cls,
+        json_path: str,
+        head: bytes,
+        offset: int,
+        chunk_size: T.Optional[int] = None,
+        chunk_bytes: T.Optional[int] = None,
+    ) -> "ByteRangeSplitter":
+        """
+        Resume the split in the array, the input is fed from ``offset``.
+
+        :param head: :attr:`head` of the previous splitter.
+        :param offset: :attr:`resume_offset` of the previous splitter.
+        """
+        splitter = cls(json_path=json_path, chunk_size=chunk_size, chunk_bytes=chunk_bytes)
+        splitter.mode = "array"
+        splitter.outside = [head]
+        splitter.offset = offset
+        return splitter
+
+    @property
+    def head(self) -> bytes:
+        """
+        The bytes before the array, with the array replaced by ``null``.
+        """
+        return b"".join(self.outside)
+
+    @property
+    def resume_offset(self) -> int:
+        """
+        The offset in the input of the first item that is not in a yielded
+        chunk, read it between two chunks.
+        """
+        if self.items:
+            return self.items_offset
+        return self.offset + self.item_start
+
+    def get_path(self) -> str:
+        return ".".join(key if is_object else "item" for is_object, key, _ in self.stack)
+
+    def add_item(self, item: bytes, start: int) -> T.Optional[list]:
+        """
+        Add the raw item to the current chunk. Return the parsed chunk if it
+        is full, the byte budget is checked before adding.
+
+        :param start: the offset of the item in the input.
+        """
+        item = item.strip()
+        if not item:  # empty array
+            return None
+        chunk = None
+        if (
+            self.chunk_bytes is not None
+            and self.items
+            and self.n_bytes + len(item) > self.chunk_bytes
+        ):
+            chunk = self.flush_items()
+        if not self.items:
+            self.items_offset = start
+        self.items.append(item)
+        self.n_bytes += len(item)
+        if chunk is None and len(self.items) == self.chunk_size:
+            chunk = self.flush_items()
+        return chunk
+
+    def flush_items(self) -> list:
+        items = json.loads(b"[" + b",".join(self.items) + b"]")
+        self.items = list()
+        self.n_bytes = 0
+        return items
+
+    def scan_seek(self):
+        """
+        Walk the structural characters until the target array starts,
+        tracking the object keys to know the current json path.
+        """
+        buf = self.buffer
+        pos = self.pos
+        while True:
+            m = _structural.search(buf, pos)
+            if m is None:
+                pos = len(buf)
+                break
+            i = m.start()
+            c = buf[i : i + 1]
+            if c == b'"':
+                match = _string.match(buf, i)
+                if match is None:  # incomplete string, wait for more data
+                    pos = i
+                    break
+                pos = match.end()
+                if self.stack and self.stack[-1][0] and self.stack[-1][2]:
+                    self.stack[-1][1] = json.loads(match.group())
+                continue
+            pos = i + 1
+            if c == b"{":
+                self.stack.append([True, None, True])
+            elif c == b"[":
+                if self.get_path() == self.json_path:
+                    self.mode = "array"
+                    self.outside.append(buf[self.outside_start : i])
+                    self.outside.append(b"null")
+                    self.item_start = pos
+                    break
+                self.stack.append([False, None, False])
+            elif c in b"]}":
+                self.stack.pop()
+            elif c == b":":
+                self.stack[-1][2] = False
+            elif c == b",":
+                if self.stack[-1][0]:
+                    self.stack[-1][2] = True
+        self.pos = pos
+
+    def scan_array(self) -> T.Iterator[list]:
+        """
+        Find the item boundaries, the commas at the array level, with numpy.
+        A quote is a string delimiter unless it is escaped by an odd number
+        of backslashes, a bracket or a comma counts if the number of string
+        delimiters before it says it is not in a string.
+        """
+        buf = self.buffer
+        # a trailing backslash may escape the first byte of the next segment
+        end = len(buf)
+        while end > self.pos and buf[end - 1] == 0x5C:
+            end -= 1
+        arr = np.frombuffer(buf, dtype=np.uint8)[self.pos : end]
+        if len(arr) == 0:
+            return
+
+        quotes = np.flatnonzero(arr == 0x22)
+        escaped = quotes[(quotes > 0) & (arr[quotes - 1] == 0x5C)]
+        if len(escaped):
+            # backslashes are rare, count the backslash runs one by one
+            real = np.ones(len(quotes), dtype=bool)
+            for ith in np.searchsorted(quotes, escaped).tolist():
+                k = int(quotes[ith]) - 1
+                while k >= 0 and arr[k] == 0x5C:
+                    k -= 1
+                real[ith] = (quotes[ith] - 1 - k) % 2 == 0
+            quotes = quotes[real]
+
+        structural = np.flatnonzero(_is_structural[arr])
+        n_quotes_before = np.searchsorted(quotes, structural)
+        structural = structural[(n_quotes_before + self.in_string) % 2 == 0]
+        chars = arr[structural]
+        depth = np.cumsum(_bracket_delta[chars], dtype=np.int64) + self.depth
+
+        array_ends = np.flatnonzero(depth < 0)
+        commas = structural[(chars == 0x2C) & (depth == 0)]
+        if len(array_ends):
+            array_end = int(structural[array_ends[0]]) + self.pos
+            commas = commas[commas + self.pos < array_end]
+
+        # move to the next item before yielding, so the resume offset is right
+        for comma in (commas + self.pos).tolist():
+            chunk = self.add_item(buf[self.item_start : comma], self.offset + self.item_start)
+            self.item_start = comma + 1
+            if chunk is not None:
+                yield chunk
+
+        if len(array_ends):
+            chunk = self.add_item(buf[self.item_start : array_end], self.offset + self.item_start)
+            self.item_start = array_end
+            self.mode = "after"
+            self.outside_start = array_end + 1
+            self.pos = array_end + 1
+            if chunk is not None:
+                yield chunk
+        else:
+            self.in_string = (self.in_string + len(quotes)) % 2
+            if len(depth):
+                self.depth = int(depth[-1])
+            self.pos = end
+
+    def scan(self) -> T.Iterator[list]:
+        if self.mode == "seek":
+            self.scan_seek()
+        if self.mode == "array":
+            yield from self.scan_array()
+        if self.mode == "after":
+            self.pos = len(self.buffer)
+
+        # drop the processed bytes, keep the incomplete item or string
+        if self.mode == "array":
+            keep = self.item_start
+        else:
+            self.outside.append(self.buffer[self.outside_start : self.pos])
+            self.outside_start = self.pos
+            keep = self.pos
+        self.buffer = self.buffer[keep:]
+        self.offset += keep
+        self.pos -= keep
+        self.item_start -= keep
+        self.outside_start -= keep
+
+    def feed(self, data: bytes) -> T.Iterator[list]:
+        """
+        Feed the next segment, yield the completed chunks.
+        """
+        self.buffer += data
+        yield from self.scan()
+
+    def close(self) -> T.Iterator[list]:
+        """
+        Yield the last chunk.
+        """
+        if self.mode == "seek":
+            raise ValueError(f"array at {self.json_path!r} not found")
+        if self.mode == "array":
+            raise ValueError("unexpected end of the JSON document")
+        self.outside.append(self.buffer[self.outside_start :])
+        if self.items:
+            yield self.flush_items()
+
+    @property
+    def data(self) -> T.Any:
+        """
+        The document without the array node, available once :meth:`close`
+        is exhausted.
+        """
+        data = json.loads(b"".join(self.outside))
+        if self.json_path == "":
+            return None
+        parent = data
+        parts = self.json_path.split(".")
+        for part in parts[:-1]:
+            parent = parent[part]
+        del parent[parts[-1]]
+        return data
+
+
+def iter_byte_ranges(
+    uri: str,
+    segment_size: int = 8 * MB,
+    max_workers: int = 8,
+    start: int = 0,
+) -> T.Iterator[bytes]:
+    """
+    Download the object with concurrent ranged GETs, yield the segments in
+    order. At most ``max_workers`` segments are downloaded ahead.
+
+    :param start: the offset to start from.
+    """
+    bucket, key = split_s3_uri(uri)
+    size = s3_client.head_object(Bucket=bucket, Key=key)["ContentLength"]
+
+    def get_range(start: int) -> bytes:
+        end = min(start + segment_size, size) - 1
+        res = s3_client.get_object(Bucket=bucket, Key=key, Range=f"bytes={start}-{end}")
+        return res["Body"].read()
+
+    starts = iter(range(start, size, segment_size))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = deque(
+            executor.submit(get_range, start)
+            for start in itertools.islice(starts, max_workers)
+        )
+        while futures:
+            data = futures.popleft().result()
+            for start in itertools.islice(starts, 1):
+                futures.append(executor.submit(get_range, start))
+            yield data
+
+
+@dataclasses.dataclass
+class Checkpoint:
+    """
+    The progress of :func:`split_json_parallel`, saved after each uploaded
+    chunk.
+
+    :param offset: the offset in the input of the first item that is not in
+        an uploaded chunk
+    :param n_chunks: number of uploaded chunks, ``1.json`` to ``{n_chunks}.json``
+    :param n_items: number of items in the uploaded chunks
+    :param schema: the base64 encoded Arrow schema of the last uploaded
+        chunk, if the output format is parquet
+    :param n_stale: number of chunks uploaded before the last schema
+        promotion, see :class:`ParquetEncoder`
+    """
+    offset: int
+    n_chunks: int
+    n_items: int
+    schema: T.Optional[str] = None
+    n_stale: int = 0
+
+    @staticmethod
+    def encode_schema(schema: "pa.Schema") -> str:
+        return base64.b64encode(schema.serialize().to_pybytes()).decode("ascii")
+
+    def decode_schema(self) -> T.Optional["pa.Schema"]:
+        if self.schema is None:
+            return None
+        return pa.ipc.read_schema(pa.py_buffer(base64.b64decode(self.schema)))
+
+
+def split_json_parallel(
+    s3file_input: str,
+    s3dir_output: str,
+    json_path: str,
+    chunk_size: T.Optional[int] = None,
+    chunk_bytes: T.Optional[int] = None,
+    segment_size: int = 8 * MB,
+    max_workers: int = 8,
+    max_upload_workers: int = 8,
+    resume: bool = False,
+    should_stop: T.Optional[T.Callable[[], bool]] = None,
+    output_format: str = "json",
+    schema: T.Optional["pa.Schema"] = None,
+) -> T.Optional[Checkpoint]:
+    """
+    Same output as :func:`split_json`, but the input is downloaded with
+    concurrent ranged GETs instead of one sequential stream. With
+    ``chunk_bytes`` the item size is measured on the input bytes, so the
+    chunks may be cut slightly differently than :func:`split_json`.
+
+    The split can be resumed. A checkpoint is saved to
+    ``{s3dir_output}checkpoint/`` once a chunk and all the chunks before it
+    are uploaded. ``should_stop`` is called after each chunk, if it returns
+    True, the function waits for the pending uploads and returns the
+    checkpoint, call it again with ``resume=True`` to continue from there.
+    A chunk uploaded after the last saved checkpoint, for example if the
+    Lambda is killed by the timeout, is uploaded again with the same content.
+
+    :param segment_size: the byte range size of each GET.
+    :param max_workers: number of concurrent GETs.
+    :param max_upload_workers: number of concurrent chunk uploads.
+    :param resume: continue from the saved checkpoint.
+    :param should_stop: stop early if it returns True.
+    :param output_format: ``"json"`` or ``"parquet"``, see :func:`split_json`.
+    :param schema: the Arrow schema of the parquet chunks, inferred if not
+        given, the promoted schema is saved in the checkpoint.
+
+    :return: the checkpoint if stopped early, None if finished.
+    """
     s3file_data = f"{s3dir_output}data.json"
     s3dir_arrays = f"{s3dir_output}arrays/"
+    s3file_checkpoint = f"{s3dir_output}checkpoint/checkpoint.json"
+    s3file_head = f"{s3dir_output}checkpoint/head.json"
 
-    # split the big json array into many small json arrays
-    with get_object(s3file_input)["Body"] as f_in:
-        iterator = ijson.items(f_in, f"{json_path}.item")
-        for ith in range(1, 1 + 999):
-            items = take(chunk_size, iterator)
-            s3path_output = f"{s3dir_arrays}{ith}.json"
-            if len(items) == 0:
+    if resume:
+        with get_object(s3file_checkpoint)["Body"] as f:
+            checkpoint = Checkpoint(**json.loads(f.read()))
+        with get_object(s3file_head)["Body"] as f:
+            head = f.read()
+        splitter = ByteRangeSplitter.from_checkpoint(
+            json_path=json_path,
+            head=head,
+            offset=checkpoint.offset,
+            chunk_size=chunk_size,
+            chunk_bytes=chunk_bytes,
+        )
+    else:
+        checkpoint = Checkpoint(offset=0, n_chunks=0, n_items=0)
+        splitter = ByteRangeSplitter(
+            json_path=json_path,
+            chunk_size=chunk_size,
+            chunk_bytes=chunk_bytes,
+        )
+
+    def iter_chunks() -> T.Iterator[list]:
+        for data in iter_byte_ranges(
+            s3file_input,
+            segment_size=segment_size,
+            max_workers=max_workers,
+            start=checkpoint.offset,
+        ):
+            yield from splitter.feed(data)
+        yield from splitter.close()
+
+    # the checkpoint of each chunk in flight, saved in order once uploaded
+    pending: T.Deque[T.Tuple[Future, Checkpoint]] = deque()
+    head_saved = resume
+
+    def save_checkpoint():
+        uploaded = None
+        while pending and pending[0][0].done():
+            future, uploaded = pending.popleft()
+            future.result()
+        if uploaded is not None:
+            put_object(s3file_checkpoint, json.dumps(dataclasses.asdict(uploaded)))
+
+    stopped = False
+    chunks = iter_chunks()
+    with ChunkUploader(
+        s3dir_arrays=s3dir_arrays,
+        max_workers=max_upload_workers,
+        output_format=output_format,
+        # continue the schema promotion where the previous invocation stopped
+        schema=schema if checkpoint.schema is None else checkpoint.decode_schema(),
+        promote=schema is None,
+    ) as uploader:
+        if output_format == "parquet" and checkpoint.n_chunks:
+            # the chunks of the previous invocations count too
+            encoder = uploader.get_encoder()
+            encoder.n_chunks = checkpoint.n_chunks
+            encoder.n_stale = checkpoint.n_stale
+        for items in chunks:
+            n_chunks = checkpoint.n_chunks + 1
+            future = uploader.submit(n_chunks, items)
+            checkpoint = Checkpoint(
+                offset=splitter.resume_offset,
+                n_chunks=n_chunks,
+                n_items=checkpoint.n_items + len(items),
+            )
+            if output_format == "parquet" and schema is None:
+                encoder = uploader.get_encoder()
+                checkpoint.schema = Checkpoint.encode_schema(encoder.schema)
+                checkpoint.n_stale = encoder.n_stale
+            # after the array, the rest is done without checkpoint
+            if splitter.mode != "array":
+                continue
+            if not head_saved:
+                put_object(s3file_head, splitter.head)
+                head_saved = True
+            pending.append((future, checkpoint))
+            save_checkpoint()
+            if should_stop is not None and should_stop():
+                stopped = True
                 break
-            else:
-                put_object(
-                    s3path_output,
-                    "\n".join([
-                        json.dumps(item)
-                        for item in items
-                    ])
-                )
+        chunks.close()
+        if not stopped:
+            uploader.finish()
+    save_checkpoint()
 
-    # delete the big json array node from the original json
-    data = delete_node(s3uri=s3file_input, json_path=json_path)
-    put_object(s3file_data, json.dumps(data))
+    if stopped:
+        return checkpoint
+
+    put_object(s3file_data, json.dumps(splitter.data))
+    if head_saved:
+        delete_object(s3file_checkpoint)
+        delete_object(s3file_head)
+    return None
 
 
 @dataclasses.dataclass
@@ -214,13 +1106,43 @@ class Request:
 
     :param s3file_input: the s3 uri of the input JSON file
     :param s3dir_output: the s3 uri of the output directory, it suppose to be empty
-    :param json_path: the json path in dot notation to the array you want to split
-    :param chunk_size: group items in the array into chunks of this size
+    :param json_path: the json path in dot notation to the array you want to
+        split, or a list of them, not parallel
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max serialized size of a chunk in bytes
+    :param parallel: download the input with concurrent ranged GETs
+    :param max_workers: number of concurrent GETs if parallel
+    :param max_upload_workers: number of concurrent chunk uploads
+    :param resume: continue from the checkpoint of the previous invocation,
+        parallel only
+    :param min_remaining_time: if parallel, stop and return a continuation
+        event when the remaining time of the invocation is less than this
+        many seconds, it should be enough to finish the pending uploads
+    :param output_format: ``"json"`` for JSON lines or ``"parquet"``
+    :param schema: the column types of the parquet chunks, for example
+        ``{"id": "int64", "name": "string"}``, the type names are the pyarrow
+        aliases, inferred if not given
     """
     s3file_input: str
     s3dir_output: str
-    json_path: str
-    chunk_size: int
+    json_path: T.Union[str, T.List[str]]
+    chunk_size: T.Optional[int] = None
+    chunk_bytes: T.Optional[int] = None
+    parallel: bool = False
+    max_workers: int = 8
+    max_upload_workers: int = 8
+    resume: bool = False
+    min_remaining_time: int = 60
+    output_format: str = "json"
+    schema: T.Optional[T.Dict[str, str]] = None
+
+    def get_schema(self) -> T.Optional["pa.Schema"]:
+        if self.schema is None:
+            return None
+        return pa.schema([
+            (name, pa.type_for_alias(type_))
+            for name, type_ in self.schema.items()
+        ])
 
 
 def lambda_handler(event, context):
@@ -233,12 +1155,87 @@ def lambda_handler(event, context):
             "json_path": "data.records",
             "chunk_size": 120
         }
+
+    Or cut the chunks by size, at most 64MB and 10000 items each::
+
+        {
+            ...
+            "chunk_bytes": 67108864,
+            "chunk_size": 10000
+        }
+
+    With ``"parallel": true`` a file too big for one invocation is split
+    across invocations. If the invocation is about to time out, the response
+    is::
+
+        {
+            "statusCode": 200,
+            "done": false,
+            "checkpoint": {"offset": 123456789, "n_chunks": 50, "n_items": 6000},
+            "next_event": {..., "resume": true}
+        }
+
+    Invoke the function with ``next_event`` until ``done`` is true, for
+    example with a Step Functions loop.
+
+    Only the parallel split can stop and resume, ``"resume": true`` without
+    ``"parallel": true`` is an error. The sequential split runs until the
+    end of the file, whatever the remaining time, a file that can't be split
+    within the Lambda timeout needs ``"parallel": true``.
+
+    Write the chunks as Parquet, the schema is inferred and promoted::
+
+        {
+            ...
+            "output_format": "parquet"
+        }
+
+    Split several arrays in one pass::
+
+        {
+            ...
+            "json_path": ["data.records", "data.events"],
+            "chunk_size": 120
+        }
     """
     request = Request(**event)
-    split_json(
-        s3file_input=request.s3file_input,
-        s3dir_output=request.s3dir_output,
-        json_path=request.json_path,
-        chunk_size=request.chunk_size,
-    )
-    return {"statusCode": 200}
+    if request.resume and not request.parallel:
+        raise ValueError("only the parallel split can be resumed")
+    if request.parallel and not isinstance(request.json_path, str):
+        raise ValueError("the parallel split supports one json path only")
+    if request.parallel:
+        checkpoint = split_json_parallel(
+            s3file_input=request.s3file_input,
+            s3dir_output=request.s3dir_output,
+            json_path=request.json_path,
+            chunk_size=request.chunk_size,
+            chunk_bytes=request.chunk_bytes,
+            max_workers=request.max_workers,
+            max_upload_workers=request.max_upload_workers,
+            resume=request.resume,
+            output_format=request.output_format,
+            schema=request.get_schema(),
+            should_stop=lambda: (
+                context.get_remaining_time_in_millis()
+                < request.min_remaining_time * 1000
+            ),
+        )
+        if checkpoint is not None:
+            return {
+                "statusCode": 200,
+                "done": False,
+                "checkpoint": dataclasses.asdict(checkpoint),
+                "next_event": dict(dataclasses.asdict(request), resume=True),
+            }
+    else:
+        split_json(
+            s3file_input=request.s3file_input,
+            s3dir_output=request.s3dir_output,
+            json_path=request.json_path,
+            chunk_size=request.chunk_size,
+            chunk_bytes=request.chunk_bytes,
+            max_upload_workers=request.max_upload_workers,
+            output_format=request.output_format,
+            schema=request.get_schema(),
+        )
+    return {"statusCode": 200, "done": True}
@@ -119,6 +119,12 @@ import itertools
 from pathlib import Path
 from datetime import datetime
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet
+except ImportError:  # only the parquet output requires pyarrow
+    pa = None
+
 dir_here = Path(__file__).parent
 
 
@@ -153,11 +159,167 @@ def make_data(path: Path):
         json.dump(data, f)
 
 
+class JsonSplitter:
+    """
+    One pass JSON splitter built on the ``ijson.parse`` event stream.
+
+    The events of the arrays at ``json_path`` are turned into items and
+    grouped into chunks, one chunk stream per array, all the other events
+    are fed to an ``ijson.ObjectBuilder``, which rebuilds the document
+    without the array nodes. So the file is read exactly once, no matter how
+    many arrays are split.
+
+    Example::
+
+        >>> splitter = JsonSplitter(json_path="data.records", chunk_size=10)
+        >>> with open("data.json", "rb") as f_in:
+        ...     for items in splitter.iter_chunks(f_in):
+        ...         ...
+        >>> splitter.data  # the document without data.records
+        {"id": 1, "data": {"date": "2000-01-01"}, "name": "alice"}
+
+        >>> splitter = JsonSplitter(json_path=["data.records", "data.events"], chunk_size=10)
+        >>> with open("data.json", "rb") as f_in:
+        ...     for json_path, items in splitter.iter_path_chunks(f_in):
+        ...         ...
+
+    :param json_path: the json path in dot notation to the array you want to
+        split, or a list of them, a path can not be inside of another. A
+        path that is not in the document yields no chunk.
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max size of a chunk, the sum of the ``json.dumps`` size
+        of the items, a single item larger than this is a chunk by itself
+
+    The numbers are kept as they are, an integer stays an ``int`` and a float
+    stays a ``float``, even ``1.0``. With the default C backend of ``ijson``,
+    an integer must fit in 64 bits, a larger one is a parse error.
+    """
+
+    def __init__(
+        self,
+        json_path: T.Union[str, T.List[str]],
+        chunk_size: T.Optional[int] = None,
+        chunk_bytes: T.Optional[int] = None,
+    ):
+        if chunk_size is None and chunk_bytes is None:
+            raise ValueError("one of chunk_size and chunk_bytes is required")
+        if isinstance(json_path, str):
+            json_path = [json_path]
+        self.json_paths = [path.strip(".") for path in json_path]
+        for path, other in itertools.permutations(self.json_paths, 2):
+            if path == "" or path == other or other.startswith(f"{path}."):
+                raise ValueError(f"json path {other!r} is inside of {path!r}")
+        self.chunk_size = chunk_size
+        self.chunk_bytes = chunk_bytes
+        self.items = {path: list() for path in self.json_paths}
+        self.n_bytes = {path: 0 for path in self.json_paths}
+        self.item_prefixes = {
+            path: f"{path}.item" if path else "item" for path in self.json_paths
+        }
+        self.deleted_keys = {
+            tuple(path.rpartition(".")[::2]) for path in self.json_paths
+        }
+        self.nodes: T.Dict[str, T.Optional[str]] = dict()
+        self.builder = ijson.ObjectBuilder()
+
+    @property
+    def data(self) -> T.Any:
+        """
+        The document without the array nodes, available once
+        :meth:`iter_chunks` is exhausted.
+        """
+        return self.builder.value
+
+    def get_node(self, prefix: str) -> T.Optional[str]:
+        """
+        The json path of the array node the event prefix is or is inside of,
+        None if not in any. The prefixes repeat, so the answer is cached.
+        """
+        try:
+            return self.nodes[prefix]
+        except KeyError:
+            node = None
+            for path in self.json_paths:
+                if path == "" or prefix == path or prefix.startswith(f"{path}."):
+                    node = path
+                    break
+            self.nodes[prefix] = node
+            return node
+
+    def add_item(self, json_path: str, item: T.Any) -> T.Optional[list]:
+        """
+        Add the item to the current chunk of the array. Return the chunk if
+        it is full, the byte budget is checked before adding, so a chunk
+        never exceeds it.
+        """
+        items = self.items[json_path]
+        chunk = None
+        if self.chunk_bytes is not None:
+            size = len(json.dumps(item))
+            if items and self.n_bytes[json_path] + size > self.chunk_bytes:
+                chunk = items
+                items = self.items[json_path] = list()
+                self.n_bytes[json_path] = 0
+            self.n_bytes[json_path] += size
+        items.append(item)
+        if chunk is None and len(items) == self.chunk_size:
+            chunk = items
+            self.items[json_path] = list()
+            self.n_bytes[json_path] = 0
+        return chunk
+
+    def iter_path_chunks(self, f_in: T.BinaryIO) -> T.Iterator[T.Tuple[str, list]]:
+        """
+        Yield the ``(json_path, items)`` chunks, the chunks of each array are
+        in document order.
+        """
+        item_builder = None
+        for prefix, event, value in ijson.parse(f_in, use_float=True):
+            node = self.get_node(prefix)
+            if node is not None:
+                if prefix == self.item_prefixes[node]:
+                    chunk = None
+                    if event in ("start_map", "start_array"):
+                        item_builder = ijson.ObjectBuilder()
+                        item_builder.event(event, value)
+                    elif event in ("end_map", "end_array"):
+                        item_builder.event(event, value)
+                        chunk = self.add_item(node, item_builder.value)
+                        item_builder = None
+                    elif event == "map_key":
+                        item_builder.event(event, value)
+                    else:  # scalar item
+                        chunk = self.add_item(node, value)
+                    if chunk is not None:
+                        yield node, chunk
+                elif item_builder is not None:
+                    item_builder.event(event, value)
+                continue
+            if event == "map_key" and (prefix, value) in self.deleted_keys:
+                continue
+            self.builder.event(event, value)
+        for path in self.json_paths:
+            if self.items[path]:
+                yield path, self.items[path]
+                self.items[path] = list()
+                self.n_bytes[path] = 0
+
+    def iter_chunks(self, f_in: T.BinaryIO) -> T.Iterator[list]:
+        """
+        Yield the chunks of all arrays, use it if there is only one.
+        """
+        for _, chunk in self.iter_path_chunks(f_in):
+            yield chunk
+
+
 def delete_node(
     p_in: Path,
-    json_path: str,
+    json_path: T.Union[str, T.List[str]],
 ) -> dict:
     """
+    Return the json data with the node at the json path deleted, the items
+    are parsed and dropped.
+
     Example::
 
         # example 1
@@ -208,53 +370,133 @@ def delete_node(
             }
         }
     """
-    parts = json_path.split(".")
-    prefix_and_key_pairs = []
-    lst = list()
-    for part in parts:
-        prefix = ".".join(lst)
-        key = part
-        prefix_and_key_pairs.append((prefix, key))
-        lst.append(part)
-
-    new_data = dict()
-    parent_data = new_data
-    for prefix, key in prefix_and_key_pairs:
-        # print(f"------ prefix = {prefix}, key = {key} ------")
-        data = dict()
-        with p_in.open("r") as f_in:
-            for k, v in ijson.kvitems(f_in, prefix):
-                if k != key:
-                    data[k] = v
-        if prefix == "":
-            new_data = data
-        else:
-            parent_data[prefix.split(".")[-1]] = data
-        parent_data = data
-        # print("new_data:", new_data)
-
-    return new_data
+    splitter = JsonSplitter(json_path=json_path, chunk_size=1000)
+    with p_in.open("rb") as f_in:
+        for _ in splitter.iter_chunks(f_in):
+            pass
+    return splitter.data
 
 
-def take(n: int, iterable: T.Iterable):
+class ParquetEncoder:
     """
-    Return first n items of the iterable as a list
+    Encode the chunks of one array as Parquet files, the items have to be
+    JSON objects.
+
+    Without ``schema``, the schema is inferred from the first chunk and
+    promoted when a later chunk has a new field or a wider type, for example
+    ``null`` to ``string`` or ``int64`` to ``double``, with the permissive
+    promotion of :func:`pyarrow.unify_schemas`. The chunk is written with the
+    promoted schema, so the last chunk has the schema of the array. The
+    first ``n_stale`` chunks, the ones before the last promotion, have
+    narrower types, and Athena or Glue expect one type per column, so they
+    are rewritten with the final schema once the array is done, see
+    :meth:`recode`. Only the chunks before a promotion are rewritten, and
+    each of them at most once.
+
+    The final schema is also written as a ``_schema.parquet`` sidecar without
+    rows, see :meth:`encode_schema`, for example to create the table::
+
+        >>> schema = pyarrow.parquet.read_schema("arrays/_schema.parquet")
+
+    The file name starts with ``_``, so Athena, Spark and pyarrow don't read
+    it as a chunk.
+
+    With ``schema``, the items are converted to it, the unknown fields are
+    dropped.
+
+    :param schema: the Arrow schema of the items
+    :param promote: promote the schema, the default is True if no ``schema``
+    :param compression: the Parquet compression codec
     """
-    return list(itertools.islice(iterable, n))
+
+    def __init__(
+        self,
+        schema: T.Optional["pa.Schema"] = None,
+        promote: T.Optional[bool] = None,
+        compression: str = "snappy",
+    ):
+        if pa is None:
+            raise ImportError("the parquet output requires pyarrow")
+        self.schema = schema
+        self.promote = schema is None if promote is None else promote
+        self.compression = compression
+        self.n_chunks = 0
+        self.n_stale = 0
+
+    def encode(self, items: list) -> bytes:
+        if self.promote:
+            # unlike Table.from_pylist, the struct inference sees the keys of all items
+            table = pa.Table.from_struct_array(pa.array(items))
+            if self.schema is not None and not table.schema.equals(self.schema):
+                try:
+                    schema = pa.unify_schemas(
+                        [self.schema, table.schema],
+                        promote_options="permissive",
+                    )
+                except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+                    raise ValueError(f"the items have incompatible schemas: {e}")
+                table = pa.Table.from_pylist(items, schema=schema)
+                if not schema.equals(self.schema):
+                    self.n_stale = self.n_chunks
+            self.schema = table.schema
+        else:
+            table = pa.Table.from_pylist(items, schema=self.schema)
+        self.n_chunks += 1
+        return self.encode_table(table)
+
+    def recode(self, data: bytes) -> bytes:
+        """
+        Rewrite a chunk encoded before the last promotion with the final
+        schema.
+        """
+        table = pyarrow.parquet.read_table(pa.BufferReader(data))
+        table = pa.Table.from_pylist(table.to_pylist(), schema=self.schema)
+        return self.encode_table(table)
+
+    def encode_table(self, table: "pa.Table") -> bytes:
+        sink = pa.BufferOutputStream()
+        pyarrow.parquet.write_table(table, sink, compression=self.compression)
+        return sink.getvalue().to_pybytes()
+
+    def encode_schema(self) -> T.Optional[bytes]:
+        """
+        Encode the schema of all the chunks so far as a Parquet file without
+        rows, None if there is no chunk yet.
+        """
+        if self.schema is None:
+            return None
+        return self.encode_table(self.schema.empty_table())
 
 
 def split_json(
     p_in: Path,
     dir_out: Path,
-    json_path: str,
-    chunk_size: int,
+    json_path: T.Union[str, T.List[str]],
+    chunk_size: T.Optional[int] = None,
+    chunk_bytes: T.Optional[int] = None,
+    output_format: str = "json",
+    schema: T.Optional["pa.Schema"] = None,
 ):
     """
+    The chunks are written to ``{dir_out}/arrays/{ith}.json``. If
+    ``json_path`` is a list, all the arrays are split in the same pass, the
+    chunks of each array are written to ``{dir_out}/arrays/{json_path}/{ith}.json``.
+
     :param p_in: input data path
     :param dir_out: output data directory, it should not exist
-    :param json_path: the json path in dot notation to the array you want to split
-    :param chunk_size: group items in the array into chunks of this size
+    :param json_path: the json path in dot notation to the array you want to
+        split, or a list of them
+    :param chunk_size: max number of items in a chunk
+    :param chunk_bytes: max serialized size of a chunk in bytes, use it to
+        get uniform file size when the item size varies
+    :param output_format: ``"json"`` or ``"parquet"``, the parquet chunks
+        can be queried directly, see :class:`ParquetEncoder`
+    :param schema: the Arrow schema of the parquet chunks, inferred if not
+        given. The chunks all have the final schema, it is also written to
+        ``_schema.parquet`` next to the chunks
     """
+    if output_format not in ("json", "parquet"):
+        raise ValueError(f"unknown output format {output_format!r}")
     if dir_out.exists():
         raise FileExistsError(f"{dir_out} already exists")
 
@@ -262,22 +504,42 @@ def split_json(
     dir_arrays = dir_out.joinpath("arrays")
     dir_arrays.mkdir(parents=True)
 
-    # split the big json array into many small json arrays
-    with p_in.open("r") as f_in:
-        iterator = ijson.items(f_in, f"{json_path}.item")
-        for ith in range(1, 1 + 999):
-            items = take(chunk_size, iterator)
-            path_out = dir_arrays.joinpath(f"{ith}.json")
-            if len(items) == 0:
-                break
+    # split the big json arrays into many small json arrays, and rebuild the
+    # rest of the document in the same pass
+    splitter = JsonSplitter(
+        json_path=json_path,
+        chunk_size=chunk_size,
+        chunk_bytes=chunk_bytes,
+    )
+    n_chunks = dict()
+    encoders = dict()
+    with p_in.open("rb") as f_in:
+        for path, items in splitter.iter_path_chunks(f_in):
+            n_chunks[path] = n_chunks.get(path, 0) + 1
+            filename = f"{n_chunks[path]}.{output_format}"
+            if isinstance(json_path, str):
+                path_out = dir_arrays.joinpath(filename)
+            else:
+                dir_arrays.joinpath(path).mkdir(exist_ok=True)
+                path_out = dir_arrays.joinpath(path, filename)
+            if output_format == "parquet":
+                if path not in encoders:
+                    encoders[path] = ParquetEncoder(schema=schema)
+                path_out.write_bytes(encoders[path].encode(items))
             else:
                 with path_out.open("w") as f_out:
                     json.dump(items, f_out)
 
-    # delete the big json array node from the original json
-    data = delete_node(p_in=p_in, json_path=json_path)
+    # the chunks before the last promotion have narrower types
+    for path, encoder in encoders.items():
+        dir_chunks = dir_arrays if isinstance(json_path, str) else dir_arrays / path
+        for ith in range(1, 1 + encoder.n_stale):
+            path_out = dir_chunks.joinpath(f"{ith}.parquet")
+            path_out.write_bytes(encoder.recode(path_out.read_bytes()))
+        dir_chunks.joinpath("_schema.parquet").write_bytes(encoder.encode_schema())
+
     with path_data.open("w") as f_out:
-        json.dump(data, f_out)
+        json.dump(splitter.data, f_out)
 
 
 if __name__ == "__main__":
@@ -1,21 +1,547 @@
 # -*- coding: utf-8 -*-
 
-from s3pathlib import S3Path
-from pyathena import connect
-from prettytable import from_db_cursor
+"""
+Athena query helpers.
+
+- :func:`run_sql`: run one query and print the result as a table, for
+  exploration in the notebook / console.
+- :func:`run_queries`: submit many queries concurrently, poll all of them
+  with ``batch_get_query_execution`` and return when the slowest is done.
+- :func:`iter_record_batches` / :func:`iter_pandas_chunks`: stream the
+  result of a query from the S3 output location, chunk by chunk, without
+  loading the full result into memory.
+- :class:`QueryCache`: local Parquet cache of read only query results, used
+  by :func:`run_sql` through :data:`query_cache` when asked to.
+
+Example::
+
+    >>> executions = run_queries([sql1, sql2, ..., sql50])
+    >>> for batch in iter_record_batches(executions[0]):
+    ...     ...
+"""
+
+import typing as T
+import os
+import re
+import time
+import hashlib
+import dataclasses
+from pathlib import Path
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.parquet
 
 from .config import config
-from .boto_ses import boto_ses
+from .boto_ses import get_boto_ses
 
-# define the s3 foldter to store result
-s3path_athena_result = S3Path(config.bucket, config.athena_result_prefix)
+if T.TYPE_CHECKING:  # pragma: no cover
+    import pandas as pd
+    from mypy_boto3_athena import AthenaClient
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_glue import GlueClient
 
-# define connection, use AWS CLI named profile for authentication
-conn = connect(
-    s3_staging_dir=s3path_athena_result.uri,
-    session=boto_ses,
-)
 
-def run_sql(sql: str):
-    cur = conn.cursor()
-    print(from_db_cursor(cur.execute(sql)))
+def run_sql(sql: str, use_cache: bool = False):
+    """
+    Run the query and print the result as a table. The full result is
+    loaded into memory, use :func:`run_queries` and
+    :func:`iter_record_batches` for large results.
+
+    :param use_cache: serve the repeated read only query from
+        :data:`query_cache`, the result may be stale up to the cache TTL.
+    """
+    from prettytable import PrettyTable
+
+    table = read_sql(sql, cache=query_cache if use_cache else None)
+    pretty_table = PrettyTable(field_names=table.column_names)
+    pretty_table.add_rows([list(row.values()) for row in table.to_pylist()])
+    print(pretty_table)
+
+
+class QueryStateEnum:
+    queued = "QUEUED"
+    running = "RUNNING"
+    succeeded = "SUCCEEDED"
+    failed = "FAILED"
+    cancelled = "CANCELLED"
+
+
+finished_states = {
+    QueryStateEnum.succeeded,
+    QueryStateEnum.failed,
+    QueryStateEnum.cancelled,
+}
+
+
+@dataclasses.dataclass
+class QueryExecution:
+    """
+    :param sql: the query.
+    :param query_execution_id: Athena query execution id.
+    :param state: one of :class:`QueryStateEnum`.
+    :param output_location: S3 uri of the result file.
+    :param reason: the state change reason, usually the error message.
+    """
+
+    sql: str
+    query_execution_id: str
+    state: str = dataclasses.field(default=QueryStateEnum.queued)
+    output_location: T.Optional[str] = dataclasses.field(default=None)
+    reason: T.Optional[str] = dataclasses.field(default=None)
+
+    @property
+    def is_finished(self) -> bool:
+        return self.state in finished_states
+
+    @property
+    def is_succeeded(self) -> bool:
+        return self.state == QueryStateEnum.succeeded
+
+    def update(self, data: dict):
+        """
+        Update from a ``QueryExecution`` dict of the Athena API response.
+        """
+        status = data["Status"]
+        self.state = status["State"]
+        self.reason = status.get("StateChangeReason")
+        self.output_location = data.get("ResultConfiguration", {}).get(
+            "OutputLocation"
+        )
+
+
+def get_athena_client() -> "AthenaClient":
+    return get_boto_ses().client("athena")
+
+
+def start_query(
+    sql: str,
+    athena_client: T.Optional["AthenaClient"] = None,
+    database: T.Optional[str] = None,
+    output_location: T.Optional[str] = None,
+) -> QueryExecution:
+    """
+    Submit the query and return immediately.
+
+    :param database: default is ``config.glue_database``.
+    :param output_location: default is ``config.s3dir_athena_result``.
+    """
+    if athena_client is None:
+        athena_client = get_athena_client()
+    if database is None:
+        database = config.glue_database
+    if output_location is None:
+        output_location = config.s3dir_athena_result.uri
+    res = athena_client.start_query_execution(
+        QueryString=sql,
+        QueryExecutionContext={"Database": database},
+        ResultConfiguration={"OutputLocation": output_location},
+    )
+    return QueryExecution(sql=sql, query_execution_id=res["QueryExecutionId"])
+
+
+def poll_queries(
+    executions: T.Iterable[QueryExecution],
+    athena_client: T.Optional["AthenaClient"] = None,
+):
+    """
+    Refresh the state of all unfinished queries, 50 queries per API call.
+    """
+    if athena_client is None:
+        athena_client = get_athena_client()
+    mapper = {
+        execution.query_execution_id: execution
+        for execution in executions
+        if execution.is_finished is False
+    }
+    ids = list(mapper)
+    for i in range(0, len(ids), 50):
+        res = athena_client.batch_get_query_execution(
+            QueryExecutionIds=ids[i : i + 50],
+        )
+        for data in res["QueryExecutions"]:
+            mapper[data["QueryExecutionId"]].update(data)
+
+
+def run_queries(
+    sqls: T.List[str],
+    athena_client: T.Optional["AthenaClient"] = None,
+    database: T.Optional[str] = None,
+    output_location: T.Optional[str] = None,
+    max_concurrency: int = 20,
+    delay: float = 0.2,
+    max_delay: float = 5.0,
+    timeout: float = 1800.0,
+    raise_on_failure: bool = True,
+) -> T.List[QueryExecution]:
+    """
+    Run many queries concurrently. At most ``max_concurrency`` queries are
+    running at the same time (Athena has a per account limit), a new one is
+    submitted as soon as one finishes. The polling interval starts at
+    ``delay`` and backs off up to ``max_delay``.
+
+    :return: the executions, in the same order as ``sqls``.
+    """
+    if athena_client is None:
+        athena_client = get_athena_client()
+    executions: T.List[T.Optional[QueryExecution]] = [None] * len(sqls)
+    todo = list(range(len(sqls)))[::-1]
+    running: T.List[QueryExecution] = list()
+    st = time.time()
+    sleep = delay
+    while todo or running:
+        while todo and len(running) < max_concurrency:
+            ith = todo.pop()
+            execution = start_query(
+                sql=sqls[ith],
+                athena_client=athena_client,
+                database=database,
+                output_location=output_location,
+            )
+            executions[ith] = execution
+            running.append(execution)
+        time.sleep(sleep)
+        poll_queries(running, athena_client=athena_client)
+        n_running = len(running)
+        running = [execution for execution in running if not execution.is_finished]
+        if len(running) < n_running:
+            sleep = delay
+        else:
+            sleep = min(sleep * 2, max_delay)
+        if time.time() - st > timeout:
+            for execution in running:
+                athena_client.stop_query_execution(
+                    QueryExecutionId=execution.query_execution_id
+                )
+            raise TimeoutError(f"{len(running)} queries are not finished in {timeout} sec")
+
+    if raise_on_failure:
+        for execution in executions:
+            if execution.is_succeeded is False:
+                raise RuntimeError(
+                    f"query {execution.query_execution_id} {execution.state}: "
+                    f"{execution.reason}\n{execution.sql}"
+                )
+    return executions
+
+
+athena_type_to_arrow_type = {
+    "boolean": pa.bool_(),
+    "tinyint": pa.int8(),
+    "smallint": pa.int16(),
+    "integer": pa.int32(),
+    "bigint": pa.int64(),
+    "float": pa.float32(),
+    "real": pa.float32(),
+    "double": pa.float64(),
+    "decimal": pa.float64(),
+    "char": pa.string(),
+    "varchar": pa.string(),
+    "string": pa.string(),
+    "date": pa.date32(),
+    "timestamp": pa.timestamp("ms"),
+}
+
+
+def get_result_schema(
+    execution: QueryExecution,
+    athena_client: T.Optional["AthenaClient"] = None,
+) -> pa.Schema:
+    """
+    Get the result columns from the query metadata, without reading rows.
+    Nested types (array, map, row) are returned as string.
+    """
+    if athena_client is None:
+        athena_client = get_athena_client()
+    res = athena_client.get_query_results(
+        QueryExecutionId=execution.query_execution_id,
+        MaxResults=1,
+    )
+    return pa.schema(
+        [
+            (
+                column["Name"],
+                athena_type_to_arrow_type.get(column["Type"].lower(), pa.string()),
+            )
+            for column in res["ResultSet"]["ResultSetMetadata"]["ColumnInfo"]
+        ]
+    )
+
+
+def iter_record_batches(
+    execution: QueryExecution,
+    athena_client: T.Optional["AthenaClient"] = None,
+    s3_client: T.Optional["S3Client"] = None,
+    block_size: int = 8 * 1024 * 1024,
+) -> T.Iterator[pa.RecordBatch]:
+    """
+    Stream the result CSV of a succeeded SELECT query from S3 as Arrow record
+    batches. Only about ``block_size`` bytes are in memory at a time.
+    """
+    if execution.is_succeeded is False:
+        raise ValueError(f"query {execution.query_execution_id} is {execution.state}")
+    if s3_client is None:
+        s3_client = get_boto_ses().client("s3")
+    schema = get_result_schema(execution, athena_client=athena_client)
+    bucket, key = execution.output_location.split("/", 3)[2:]
+    body = s3_client.get_object(Bucket=bucket, Key=key)["Body"]
+    reader = pyarrow.csv.open_csv(
+        pa.PythonFile(body, mode="r"),
+        read_options=pyarrow.csv.ReadOptions(block_size=block_size),
+        convert_options=pyarrow.csv.ConvertOptions(
+            column_types=schema,
+            # Athena writes null as an empty unquoted field
+            strings_can_be_null=True,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    for batch in reader:
+        yield batch
+
+
+def iter_pandas_chunks(
+    execution: QueryExecution,
+    athena_client: T.Optional["AthenaClient"] = None,
+    s3_client: T.Optional["S3Client"] = None,
+    block_size: int = 8 * 1024 * 1024,
+) -> T.Iterator["pd.DataFrame"]:
+    """
+    Same as :func:`iter_record_batches`, but yield pandas DataFrames.
+    """
+    for batch in iter_record_batches(
+        execution,
+        athena_client=athena_client,
+        s3_client=s3_client,
+        block_size=block_size,
+    ):
+        yield batch.to_pandas()
+
+
+def read_sql(
+    sql: str,
+    athena_client: T.Optional["AthenaClient"] = None,
+    s3_client: T.Optional["S3Client"] = None,
+    database: T.Optional[str] = None,
+    cache: T.Optional["QueryCache"] = None,
+) -> pa.Table:
+    """
+    Run the query and return the full result as an Arrow table.
+
+    :param cache: if given, the result of a read only query is served from /
+        stored into the cache, see :class:`QueryCache`. Other statements
+        (CTAS, INSERT, DDL, ...) always run.
+    """
+    if database is None:
+        database = config.glue_database
+    if cache is not None and is_read_only(sql) is False:
+        cache = None
+    if cache is not None:
+        table = cache.get(sql, database=database)
+        if table is not None:
+            return table
+    execution = run_queries(
+        [sql],
+        athena_client=athena_client,
+        database=database,
+    )[0]
+    table = pa.Table.from_batches(
+        list(
+            iter_record_batches(
+                execution,
+                athena_client=athena_client,
+                s3_client=s3_client,
+            )
+        ),
+        schema=get_result_schema(execution, athena_client=athena_client),
+    )
+    if cache is not None:
+        cache.put(sql, table, database=database)
+    return table
+
+
+_comment_pattern = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_literal_pattern = re.compile(r"('(?:[^']|'')*')")
+_table_pattern = re.compile(r"\b(?:from|join)\s+([\w\"`.]+)", re.IGNORECASE)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Remove comments, collapse white spaces, lower case everything except the
+    string literals and remove the trailing semicolon, so the formatting of
+    the same query doesn't change the cache key.
+    """
+    parts = _literal_pattern.split(_comment_pattern.sub(" ", sql))
+    # the odd parts are the string literals
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i].lower())
+    return "".join(parts).strip().rstrip(";").strip()
+
+
+def is_read_only(sql: str) -> bool:
+    """
+    Only a SELECT or WITH ... SELECT query can be cached, a statement with
+    side effects must run every time.
+    """
+    return re.match(r"(select|with)\b", normalize_sql(sql)) is not None
+
+
+def find_tables(sql: str, database: str) -> T.List[T.Tuple[str, str]]:
+    """
+    Find the ``(database, table)`` referenced after FROM / JOIN. It is a
+    best effort regex, good enough for the exploratory queries.
+    """
+    tables = set()
+    for name in _table_pattern.findall(normalize_sql(sql)):
+        name = name.replace('"', "").replace("`", "")
+        if "." in name:
+            db, tb = name.rsplit(".", 1)
+            tables.add((db.split(".")[-1], tb))
+        else:
+            tables.add((database, name))
+    return sorted(tables)
+
+
+class QueryCache:
+    """
+    Local query result cache. Each result is a Parquet file under
+    ``dir_root``, named by the hash of the normalized SQL, the database and
+    the Glue ``VersionId`` and ``UpdateTime`` of every referenced table. So
+    a change of the table definition (schema, location, ...) is a cache
+    miss.
+
+    Adding partitions or writing new files under the table location doesn't
+    change the table version, such a change is only picked up after the
+    ``ttl``. Call :meth:`clear` after loading new data.
+
+    The file mtime is the creation time, used for the TTL, the atime is the
+    last access time, used for the LRU eviction when the total size exceeds
+    ``max_size``.
+
+    :param dir_root: the cache directory.
+    :param ttl: time to live in seconds.
+    :param max_size: total size cap in bytes.
+    :param glue_client: used to get the table versions.
+    :param version_check_interval: the table versions are re-checked at most
+        every this many seconds, so a hit usually doesn't call Glue.
+    """
+
+    def __init__(
+        self,
+        dir_root: T.Union[str, Path],
+        ttl: float = 3600.0,
+        max_size: int = 1024 * 1024 * 1024,
+        glue_client: T.Optional["GlueClient"] = None,
+        version_check_interval: float = 60.0,
+    ):
+        self.dir_root = Path(dir_root)
+        self.ttl = ttl
+        self.max_size = max_size
+        self._glue_client = glue_client
+        self.version_check_interval = version_check_interval
+        self._versions: T.Dict[T.Tuple[str, str], T.Tuple[float, str]] = dict()
+        self.n_hit = 0
+        self.n_miss = 0
+
+    @property
+    def glue_client(self) -> "GlueClient":
+        if self._glue_client is None:
+            from .boto_ses import get_glue_client
+
+            return get_glue_client()
+        return self._glue_client
+
+    @property
+    def stats(self) -> T.Dict[str, int]:
+        return {"hit": self.n_hit, "miss": self.n_miss}
+
+    def get_table_version(self, database: str, table: str) -> str:
+        now = time.time()
+        key = (database, table)
+        if key in self._versions:
+            checked_at, version = self._versions[key]
+            if now - checked_at < self.version_check_interval:
+                return version
+        try:
+            res = self.glue_client.get_table(DatabaseName=database, Name=table)
+            version = "{}-{}".format(
+                res["Table"].get("VersionId", ""),
+                res["Table"].get("UpdateTime", ""),
+            )
+        except self.glue_client.exceptions.EntityNotFoundException:
+            version = ""
+        self._versions[key] = (now, version)
+        return version
+
+    def get_key(self, sql: str, database: str) -> str:
+        normalized_sql = normalize_sql(sql)
+        versions = [
+            f"{db}.{tb}={self.get_table_version(db, tb)}"
+            for db, tb in find_tables(normalized_sql, database)
+        ]
+        text = "\n".join([database, normalized_sql] + versions)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_path(self, key: str) -> Path:
+        return self.dir_root.joinpath(f"{key}.parquet")
+
+    def get(self, sql: str, database: T.Optional[str] = None) -> T.Optional[pa.Table]:
+        """
+        Return the cached result, or None.
+        """
+        if database is None:
+            database = config.glue_database
+        path = self.get_path(self.get_key(sql, database))
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            self.n_miss += 1
+            return None
+        if time.time() - stat.st_mtime > self.ttl:
+            path.unlink(missing_ok=True)
+            self.n_miss += 1
+            return None
+        table = pyarrow.parquet.read_table(path)
+        os.utime(path, (time.time(), stat.st_mtime))
+        self.n_hit += 1
+        return table
+
+    def put(self, sql: str, table: pa.Table, database: T.Optional[str] = None):
+        if database is None:
+            database = config.glue_database
+        self.dir_root.mkdir(parents=True, exist_ok=True)
+        path = self.get_path(self.get_key(sql, database))
+        path_tmp = path.with_suffix(".tmp")
+        pyarrow.parquet.write_table(table, path_tmp)
+        os.replace(path_tmp, path)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the expired results, then the least recently used ones until
+        the total size is under ``max_size``.
+        """
+        now = time.time()
+        entries = list()
+        for path in self.dir_root.glob("*.parquet"):
+            stat = path.stat()
+            if now - stat.st_mtime > self.ttl:
+                path.unlink(missing_ok=True)
+            else:
+                entries.append((stat.st_atime, stat.st_size, path))
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries, key=lambda x: x[0]):
+            if total_size <= self.max_size:
+                break
+            path.unlink(missing_ok=True)
+            total_size -= size
+
+    def clear(self):
+        for path in self.dir_root.glob("*.parquet"):
+            path.unlink(missing_ok=True)
+        self.n_hit = 0
+        self.n_miss = 0
+
+
+query_cache = QueryCache(
+    dir_root=Path.home().joinpath(".cache", "learn_big_data_on_aws", "athena"),
+)
@@ -1,12 +1,108 @@
 # -*- coding: utf-8 -*-
 
-import boto3
+"""
+Lazily initialized boto session and clients.
+
+Nothing is created at import time, and the AWS account id is cached on disk
+per profile, so importing the package doesn't cost a network round trip.
+The module level names are still available for backward compatibility, they
+are resolved on first access::
+
+    >>> from learn_big_data_on_aws.boto_ses import boto_ses, account_id
+"""
+
+import typing as T
+import json
+from pathlib import Path
+from functools import lru_cache
+
 from .config import config
 
-boto_ses = boto3.session.Session(
-    profile_name=config.aws_profile, region_name=config.aws_region,
+if T.TYPE_CHECKING:  # pragma: no cover
+    import boto3
+    from mypy_boto3_s3 import S3Client
+    from mypy_boto3_sts import STSClient
+    from mypy_boto3_glue import GlueClient
+
+path_account_id_cache = (
+    Path.home() / ".cache" / "learn_big_data_on_aws" / "account_id.json"
 )
-sts_client = boto_ses.client("sts")
-account_id = sts_client.get_caller_identity()["Account"]
 
-glue_client = boto_ses.client("glue")
+
+@lru_cache(maxsize=1)
+def get_boto_ses() -> "boto3.session.Session":
+    """
+    Create the boto session on first call, and attach it to ``s3pathlib``.
+    """
+    import boto3
+    from s3pathlib import context
+
+    boto_ses = boto3.session.Session(
+        profile_name=config.aws_profile,
+        region_name=config.aws_region,
+    )
+    context.attach_boto_session(boto_ses)
+    return boto_ses
+
+
+@lru_cache(maxsize=1)
+def get_sts_client() -> "STSClient":
+    return get_boto_ses().client("sts")
+
+
+@lru_cache(maxsize=1)
+def get_s3_client() -> "S3Client":
+    return get_boto_ses().client("s3")
+
+
+@lru_cache(maxsize=1)
+def get_glue_client() -> "GlueClient":
+    return get_boto_ses().client("glue")
+
+
+def read_account_id_cache() -> T.Dict[str, str]:
+    try:
+        return json.loads(path_account_id_cache.read_text())
+    except (FileNotFoundError, ValueError):
+        return dict()
+
+
+def write_account_id_cache(data: T.Dict[str, str]):
+    # the cache is an optimization, a read only file system (Lambda) is fine
+    try:
+        path_account_id_cache.parent.mkdir(parents=True, exist_ok=True)
+        path_account_id_cache.write_text(json.dumps(data, indent=4))
+    except OSError:  # pragma: no cover
+        pass
+
+
+@lru_cache(maxsize=1)
+def get_account_id() -> str:
+    """
+    Get the AWS account id of the configured profile. It only calls
+    ``sts.get_caller_identity`` when the account id is not in the on disk
+    cache yet.
+    """
+    profile = config.aws_profile or "default"
+    data = read_account_id_cache()
+    if profile in data:
+        return data[profile]
+    account_id = get_sts_client().get_caller_identity()["Account"]
+    data[profile] = account_id
+    write_account_id_cache(data)
+    return account_id
+
+
+_lazy_attributes: T.Dict[str, T.Callable[[], T.Any]] = {
+    "boto_ses": get_boto_ses,
+    "sts_client": get_sts_client,
+    "s3_client": get_s3_client,
+    "glue_client": get_glue_client,
+    "account_id": get_account_id,
+}
+
+
+def __getattr__(name: str):
+    if name in _lazy_attributes:
+        return _lazy_attributes[name]()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
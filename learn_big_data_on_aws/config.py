@@ -4,32 +4,66 @@ import typing as T
 import dataclasses
 from functools import cached_property
 
-from boto_session_manager import BotoSesManager
-from s3pathlib import S3Path
+if T.TYPE_CHECKING:  # pragma: no cover
+    from boto_session_manager import BotoSesManager
+    from s3pathlib import S3Path
 
 
 @dataclasses.dataclass
 class Config:
     aws_profile: T.Optional[str] = dataclasses.field(default=None)
+    aws_region: T.Optional[str] = dataclasses.field(default=None)
 
     @cached_property
-    def bsm(self) -> BotoSesManager:
-        return BotoSesManager(profile_name=self.aws_profile)
+    def bsm(self) -> "BotoSesManager":
+        from boto_session_manager import BotoSesManager
+
+        return BotoSesManager(
+            profile_name=self.aws_profile,
+            region_name=self.aws_region,
+        )
+
+    @cached_property
+    def aws_account_id(self) -> str:
+        """
+        The account id is cached on disk, see
+        :func:`learn_big_data_on_aws.boto_ses.get_account_id`.
+        """
+        from .boto_ses import get_account_id
+
+        return get_account_id()
 
     @cached_property
-    def s3dir_root(self) -> S3Path:
+    def aws_region_name(self) -> str:
+        from .boto_ses import get_boto_ses
+
+        return get_boto_ses().region_name
+
+    @cached_property
+    def s3dir_root(self) -> "S3Path":
+        from s3pathlib import S3Path
+
         return S3Path(
-            f"s3://{self.bsm.aws_account_id}-{self.bsm.aws_region}-data"
+            f"s3://{self.aws_account_id}-{self.aws_region_name}-data"
             f"/projects/learn_big_data_on_aws/"
         ).to_dir()
 
     @cached_property
-    def s3dir_athena_result(self) -> S3Path:
+    def s3dir_athena_result(self) -> "S3Path":
+        from s3pathlib import S3Path
+
         return S3Path(
-            f"s3://{self.bsm.aws_account_id}-{self.bsm.aws_region}-data"
+            f"s3://{self.aws_account_id}-{self.aws_region_name}-data"
             f"/athena/results/"
         ).to_dir()
 
+    @cached_property
+    def s3path_dataset_prefix(self) -> "S3Path":
+        """
+        The data lake folder of all datasets.
+        """
+        return self.s3dir_root.joinpath("dataset").to_dir()
+
     @property
     def glue_database(self) -> str:
         return "learn_big_data_on_aws"
@@ -1,11 +1,64 @@
 # -*- coding: utf-8 -*-
 
-from . import (
-    ds001,
-    ds002,
-)
+"""
+Dataset registry.
+
+The registry maps dataset names to the module that defines them. Modules
+are imported on demand, so listing the datasets or resolving one by name
+doesn't import the other datasets and their dependencies, and a generation
+worker only loads the dataset it runs.
+
+Example::
+
+    >>> from learn_big_data_on_aws.dataset import list_datasets, get_dataset
+    >>> list_datasets()
+    ['ds_001_multi_line_json', 'ds_002_single_doc_json', 'ds_003_walmart_mongodb']
+    >>> get_dataset("ds_001_multi_line_json").create_all()
+"""
+
+import typing as T
+import importlib
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .base import Dataset
+
+#: dataset name -> name of the module that defines the ``dataset`` object
+registry: T.Dict[str, str] = {
+    "ds_001_multi_line_json": "ds001",
+    "ds_002_single_doc_json": "ds002",
+    "ds_003_walmart_mongodb": "ds003",
+}
+
+
+def list_datasets() -> T.List[str]:
+    """
+    List the names of all registered datasets, nothing is imported.
+    """
+    return list(registry)
+
+
+def get_dataset(name: str) -> "Dataset":
+    """
+    Import the module of the dataset and return the dataset object.
+    """
+    try:
+        module_name = registry[name]
+    except KeyError:
+        raise KeyError(f"unknown dataset {name!r}, available: {list_datasets()}")
+    module = importlib.import_module(f".{module_name}", __name__)
+    return module.dataset
+
+
+def __getattr__(name: str):
+    # keep ``learn_big_data_on_aws.dataset.ds001`` working, lazily
+    if name in registry.values():
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 def create_all_dataset():
-    ds001.dataset.create_all()
-    ds002.dataset.create_all()
+    for name in [
+        "ds_001_multi_line_json",
+        "ds_002_single_doc_json",
+    ]:
+        get_dataset(name).create_all()
@@ -1,8 +1,33 @@
 # -*- coding: utf-8 -*-
 
+import typing as T
 import enum
+import time
+import random
+import hashlib
+from functools import cached_property
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pyarrow as pa
 from s3pathlib import S3Path
-from mpire import WorkerPool
+
+from .generator import RecordGenerator, derive_seed
+from .sink import MB, CountingSink
+from .storage import Sink, BaseStorage, S3Storage, MemoryStorage
+from .manifest import ShardRecord, Manifest
+from .writer import (
+    BaseWriter,
+    JsonLinesWriter,
+    JsonDocWriter,
+    CsvWriter,
+    TsvWriter,
+    ParquetWriter,
+)
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from mypy_boto3_glue import GlueClient
+    from .compaction import CompactionManifest
 
 
 class FormatEnum(enum.Enum):
@@ -13,21 +38,110 @@ class FormatEnum(enum.Enum):
     parquet = "parquet"
 
 
+class ExecutorEnum(enum.Enum):
+    """
+    How :meth:`Dataset.create_all` runs ``create_one``.
+
+    - process: mpire process pool, best for CPU bound generation.
+    - thread: thread pool, overlaps serialization with network I/O,
+      best for small files where the upload latency dominates.
+    - serial: one by one in the current process, for debugging.
+    """
+
+    process = "process"
+    thread = "thread"
+    serial = "serial"
+
+
+format_to_writer_class: T.Dict[FormatEnum, T.Type[BaseWriter]] = {
+    FormatEnum.csv: CsvWriter,
+    FormatEnum.tsv: TsvWriter,
+    FormatEnum.json_multi_line: JsonLinesWriter,
+    FormatEnum.json_single_doc: JsonDocWriter,
+    FormatEnum.parquet: ParquetWriter,
+}
+
+
+def get_writer(format: FormatEnum, **kwargs) -> BaseWriter:
+    """
+    Create the writer for the given format, ``kwargs`` are the writer options.
+    """
+    return format_to_writer_class[format](**kwargs)
+
+
 class Dataset:
     def __init__(
         self,
         name: str,
         format: FormatEnum,
-        datalake_s3_loc: S3Path,
         n_files: int,
         n_records_per_file: int,
+        datalake_s3_loc: T.Optional[S3Path] = None,
+        writer_options: T.Optional[dict] = None,
+        part_size: int = 8 * MB,
+        max_upload_workers: int = 4,
+        storage: T.Optional[BaseStorage] = None,
+        target_file_size: T.Optional[int] = None,
+        target_total_size: T.Optional[int] = None,
+        size_tolerance: float = 0.1,
         **kwargs,
     ):
+        """
+        :param datalake_s3_loc: the data lake folder, default is
+            ``config.s3path_dataset_prefix``, resolved on first access
+            because it may need the AWS account id.
+        :param writer_options: format specific options, see
+            :mod:`learn_big_data_on_aws.dataset.writer`.
+        :param part_size: S3 multipart upload part size in bytes.
+        :param max_upload_workers: number of parts uploaded concurrently
+            for each file.
+        :param storage: where the files are written, default is the S3 bucket
+            of ``datalake_s3_loc``. Use
+            :class:`~learn_big_data_on_aws.dataset.storage.LocalStorage` or
+            :class:`~learn_big_data_on_aws.dataset.storage.MemoryStorage`
+            to run without AWS, with the same key layout.
+        :param target_file_size: if given, ignore ``n_records_per_file`` and
+            size each file to about this many bytes, see :meth:`fit_size`.
+        :param target_total_size: if given together with
+            ``target_file_size``, ignore ``n_files`` and create enough files
+            to reach about this many bytes in total.
+        :param size_tolerance: acceptable relative error of the file size.
+        """
         self.name = name
         self.format = format
-        self.datalake_s3_loc = datalake_s3_loc
+        self._datalake_s3_loc = datalake_s3_loc
         self.n_files = n_files
         self.n_records_per_file = n_records_per_file
+        if writer_options is None:
+            writer_options = dict()
+        self.writer = get_writer(format, **writer_options)
+        self.part_size = part_size
+        self.max_upload_workers = max_upload_workers
+        self._storage = storage
+        self.target_file_size = target_file_size
+        self.target_total_size = target_total_size
+        self.size_tolerance = size_tolerance
+
+    @property
+    def datalake_s3_loc(self) -> S3Path:
+        if self._datalake_s3_loc is None:
+            from ..config import config
+
+            self._datalake_s3_loc = config.s3path_dataset_prefix
+        return self._datalake_s3_loc
+
+    @property
+    def storage(self) -> BaseStorage:
+        """
+        The storage backend, default is the S3 bucket of ``datalake_s3_loc``.
+        """
+        if self._storage is None:
+            self._storage = S3Storage(
+                bucket=self.datalake_s3_loc.bucket,
+                part_size=self.part_size,
+                max_upload_workers=self.max_upload_workers,
+            )
+        return self._storage
 
     @property
     def s3path_loc(self):
@@ -36,24 +150,443 @@ class Dataset:
         """
         return S3Path(self.datalake_s3_loc, self.name + "/")
 
+    def create_generator(self) -> RecordGenerator:
+        """
+        Define the columns of this dataset. Override it in the subclass.
+        """
+        raise NotImplementedError
+
+    @cached_property
+    def generator(self) -> RecordGenerator:
+        generator = self.create_generator()
+        if generator.seed is None:
+            generator.seed = self.get_seed(0)
+        return generator
+
+    def get_seed(self, nth_file: int) -> int:
+        """
+        Per file seed derived from (dataset name, nth_file). Any file can be
+        regenerated in isolation, in any process, with byte-identical output.
+        ``nth_file = 0`` is reserved for the dataset level value pools.
+        """
+        return derive_seed(self.name, nth_file)
+
+    def get_rng(self, nth_file: int) -> np.random.Generator:
+        """
+        Seeded numpy random generator for the ``nth_file``.
+        """
+        return np.random.default_rng(self.get_seed(nth_file))
+
+    def get_random(self, nth_file: int) -> random.Random:
+        """
+        Seeded stdlib random generator for the ``nth_file``, for datasets that
+        still build records in Python.
+        """
+        return random.Random(self.get_seed(nth_file))
+
+    @property
+    def schema(self) -> pa.Schema:
+        """
+        Arrow schema of the records.
+        """
+        return self.generator.schema
+
+    def iter_batches(
+        self,
+        nth_file: int,
+    ) -> T.Iterator[pa.RecordBatch]:
+        """
+        Generate the records of the ``nth_file`` as Arrow record batches.
+        The ids of each file are continuous across all files.
+        """
+        start_id = (nth_file - 1) * self.n_records_per_file + 1
+        yield from self.generator.iter_batches(
+            n_rows=self.n_records_per_file,
+            rng=self.get_rng(nth_file),
+            start_id=start_id,
+        )
+
+    def get_s3path(self, nth_file: int) -> S3Path:
+        """
+        S3 location of the ``nth_file``.
+        """
+        return S3Path(
+            self.s3path_loc,
+            f"{str(nth_file).zfill(3)}.{self.writer.ext}",
+        )
+
+    @property
+    def partition_keys(self) -> T.List[T.Tuple[str, str]]:
+        """
+        Hive partition keys as ``(name, glue type)``, empty if not partitioned.
+        """
+        return list()
+
+    def get_partition_values(self, nth_file: int) -> T.Dict[str, str]:
+        """
+        Partition key values of the ``nth_file``, they must match the
+        ``key=value`` folders of :meth:`get_s3path`.
+        """
+        return dict()
+
+    def open_sink(self, s3path: S3Path) -> Sink:
+        """
+        Open a streaming writable file object to the storage backend.
+        """
+        return self.storage.open_sink(s3path.key)
+
     def create_one(
         self,
         nth_file: int,
+        update_index: bool = True,
         **kwargs,
-    ) -> S3Path:
-        raise NotImplementedError
+    ) -> ShardRecord:
+        """
+        Generate the ``nth_file`` and stream it to the storage. Record batches
+        are serialized as they are produced, so the memory usage is bounded by
+        the part size rather than the file size.
+
+        The file is not recorded in the manifest, :meth:`create_all` does it.
+
+        :param update_index: add the file to the partition index if the
+            dataset is partitioned. :meth:`create_all` turns it off, it
+            rebuilds the index from the manifest at each checkpoint.
+        """
+        s3path = self.get_s3path(nth_file)
+        print(f"create {s3path.basename}, url = {self.storage.get_url(s3path.key)}")
+        with self.open_sink(s3path) as f:
+            n_rows = self.writer.write(
+                self.iter_batches(nth_file), f, schema=self.schema
+            )
+        shard = ShardRecord(
+            nth_file=nth_file,
+            key=s3path.key,
+            size=f.size,
+            n_rows=n_rows,
+            md5=f.md5.hexdigest(),
+            etag=f.etag,
+        )
+        if update_index and self.partition_keys:
+            from .partition_index import update_partition_index
+
+            update_partition_index(self, shard)
+        return shard
+
+    @property
+    def s3path_manifest(self) -> S3Path:
+        """
+        S3 location of the generation manifest. It is next to the dataset
+        folder rather than inside, so it is never read as data.
+        """
+        return S3Path(self.datalake_s3_loc, f"{self.name}.manifest.json")
+
+    def read_manifest(self) -> Manifest:
+        """
+        Read the generation manifest, return an empty one if not exists.
+        """
+        key = self.s3path_manifest.key
+        if self.storage.exists(key):
+            manifest = Manifest.from_json(self.storage.read_bytes(key).decode("utf-8"))
+            manifest.n_files = self.n_files
+            return manifest
+        return self.new_manifest()
+
+    def new_manifest(self) -> Manifest:
+        """
+        An empty manifest for the current configuration.
+        """
+        return Manifest(
+            dataset=self.name,
+            n_files=self.n_files,
+            format=self.format.value,
+            n_records_per_file=self.n_records_per_file,
+        )
+
+    def check_manifest(self, manifest: Manifest):
+        """
+        Raise if the shards of the manifest were created with another format
+        or number of records per file, the new shards can't be mixed with
+        them. A manifest that doesn't record them is trusted.
+        """
+        expected = self.new_manifest()
+        for name in ["format", "n_records_per_file"]:
+            recorded = getattr(manifest, name)
+            if recorded is not None and recorded != getattr(expected, name):
+                raise ValueError(
+                    f"the manifest of {self.name!r} was created with "
+                    f"{name} = {recorded!r}, not {getattr(expected, name)!r}, "
+                    f"use create_all(resume=False) to create all files again"
+                )
+            setattr(manifest, name, getattr(expected, name))
+
+    def write_manifest(self, manifest: Manifest):
+        """
+        Write the manifest, and the partition index if the dataset is
+        partitioned, they are checkpointed together.
+        """
+        self.storage.write_bytes(
+            self.s3path_manifest.key,
+            manifest.to_json().encode("utf-8"),
+        )
+        if self.partition_keys:
+            from .partition_index import write_partition_index
+
+            write_partition_index(self, manifest)
+
+    @property
+    def s3path_partition_index(self) -> S3Path:
+        """
+        S3 location of the partition index, see
+        :mod:`learn_big_data_on_aws.dataset.partition_index`.
+        """
+        return S3Path(self.datalake_s3_loc, f"{self.name}.partitions.parquet")
+
+    def read_partition_index(self) -> pa.Table:
+        from .partition_index import read_partition_index
+
+        return read_partition_index(self)
+
+    def is_complete(self) -> bool:
+        """
+        Check if all files are created, based on the manifest only, no LIST.
+        """
+        return self.read_manifest().is_complete()
+
+    def verify_shard(self, shard: ShardRecord) -> bool:
+        """
+        Check that the recorded shard still exists and is not corrupted.
+        On S3 it costs one HEAD request, the ETag is compared. The local and
+        in memory backends have no ETag, the content md5 is compared.
+        """
+        info = self.storage.head(shard.key)
+        if info is None:
+            return False
+        if info.size != shard.size:
+            return False
+        if info.etag is None:
+            md5 = hashlib.md5(self.storage.read_bytes(shard.key)).hexdigest()
+            return md5 == shard.md5
+        if shard.etag is not None and info.etag.strip('"') != shard.etag.strip('"'):
+            return False
+        return True
+
+    def set_n_rows_per_file(self, n_rows: int):
+        """
+        The knob that :meth:`fit_size` turns. Override it if the dataset
+        doesn't use ``n_records_per_file``.
+        """
+        self.n_records_per_file = n_rows
+
+    def measure_file_size(self, nth_file: int = 1) -> int:
+        """
+        Serialize the ``nth_file`` and count the bytes, nothing is stored.
+        """
+        f = CountingSink()
+        self.writer.write(self.iter_batches(nth_file), f, schema=self.schema)
+        return f.size
+
+    def fit_size(
+        self,
+        sample_rows: int = 10000,
+        max_iter: int = 5,
+    ) -> int:
+        """
+        Find the number of rows per file that hits ``target_file_size``
+        within ``size_tolerance``, and the number of files that hits
+        ``target_total_size``.
+
+        It starts with the bytes per row of a ``sample_rows`` sample, then
+        re-measures a full size file and rescales, because the compression
+        ratio of a small sample is not the one of a full file (especially
+        for Parquet). Every file then has the same number of rows, so the
+        ids stay continuous and any file can still be regenerated alone.
+
+        For example, the 5 MB / 50 MB / 500 MB tiers of the Polars benchmark
+        are ``target_file_size = 5 * MB, 50 * MB, 500 * MB``.
+
+        :return: the size in bytes of a file with the fitted number of rows.
+        """
+        target = self.target_file_size
+        n_rows = sample_rows
+        self.set_n_rows_per_file(n_rows)
+        size = self.measure_file_size()
+        for _ in range(max_iter):
+            bytes_per_row = max(size, 1) / n_rows
+            n_rows = max(1, round(target / bytes_per_row))
+            self.set_n_rows_per_file(n_rows)
+            size = self.measure_file_size()
+            if abs(size - target) / target <= self.size_tolerance:
+                break
+        if self.target_total_size is not None:
+            self.n_files = max(1, round(self.target_total_size / size))
+        return size
+
+    def prepare(self):
+        """
+        Called once in the parent process by :meth:`create_all` before
+        ``create_one`` runs in the workers. Override it to build the shared
+        state, for example the dimension tables.
+        """
+        if self.target_file_size is not None:
+            self.fit_size()
+
+    def imap_create_one(
+        self,
+        nth_files: T.List[int],
+        executor: ExecutorEnum = ExecutorEnum.process,
+        max_workers: T.Optional[int] = None,
+    ) -> T.Iterator[ShardRecord]:
+        """
+        Run ``create_one`` for each of the ``nth_files`` concurrently, yield
+        the shard records in completion order.
+
+        :param executor: see :class:`ExecutorEnum`.
+        :param max_workers: concurrency limit, default is the number of CPU
+            for process and ``min(32, cpu + 4)`` for thread.
+        """
+        executor = ExecutorEnum(executor)
+        if executor is ExecutorEnum.process and isinstance(
+            self.storage, MemoryStorage
+        ):
+            raise ValueError(
+                "MemoryStorage only works with the thread or serial executor"
+            )
+        if executor is ExecutorEnum.process:
+            # mpire takes a few hundred milliseconds to import
+            from mpire import WorkerPool
+
+            kwargs = [
+                {"nth_file": nth_file, "update_index": False}
+                for nth_file in nth_files
+            ]
+            with WorkerPool(n_jobs=max_workers) as pool:
+                yield from pool.imap_unordered(self.create_one, kwargs)
+        elif executor is ExecutorEnum.thread:
+            with ThreadPoolExecutor(max_workers=max_workers) as pool:
+                futures = [
+                    pool.submit(self.create_one, nth_file=nth_file, update_index=False)
+                    for nth_file in nth_files
+                ]
+                for future in as_completed(futures):
+                    yield future.result()
+        else:
+            for nth_file in nth_files:
+                yield self.create_one(nth_file=nth_file, update_index=False)
 
     def create_all(
         self,
+        resume: bool = True,
+        verify: bool = False,
+        checkpoint_every: int = 100,
+        executor: ExecutorEnum = ExecutorEnum.process,
+        max_workers: T.Optional[int] = None,
         **kwargs,
-    ):
+    ) -> Manifest:
+        """
+        Create all files. Completed files are recorded in the manifest, so
+        a crashed run can be resumed without regenerating finished files.
+
+        :param resume: skip the files recorded in the existing manifest, it
+            must have the same format and number of records per file, see
+            :meth:`check_manifest`. If False, start over with an empty
+            manifest.
+        :param verify: check every recorded file and regenerate the missing or
+            corrupted ones.
+        :param checkpoint_every: write the manifest to S3 every N files.
+        :param executor: see :class:`ExecutorEnum`.
+        :param max_workers: concurrency limit.
+        """
         print(f"--- creating dataset {self.s3path_loc.basename} ---")
-        kwargs = [
-            {"nth_file": ith_file}
-            for ith_file in range(1, 1 + self.n_files)
-        ]
-        with WorkerPool() as pool:
-            pool.map(self.create_one, kwargs)
+        self.prepare()
+        if resume:
+            manifest = self.read_manifest()
+            self.check_manifest(manifest)
+        else:
+            manifest = self.new_manifest()
+        if verify:
+            for shard in list(manifest.shards.values()):
+                if self.verify_shard(shard) is False:
+                    print(f"shard {shard.nth_file} is missing or corrupted")
+                    manifest.remove(shard.nth_file)
+        todo = manifest.missing()
+        print(f"{len(todo)} of {self.n_files} files to create")
+        if len(todo) == 0:
+            return manifest
+
+        n_files, n_bytes = 0, 0
+        st = time.perf_counter()
+        try:
+            for shard in self.imap_create_one(
+                nth_files=todo,
+                executor=executor,
+                max_workers=max_workers,
+            ):
+                manifest.add(shard)
+                n_files += 1
+                n_bytes += shard.size
+                if n_files % checkpoint_every == 0:
+                    self.write_manifest(manifest)
+        finally:
+            self.write_manifest(manifest)
+            elapse = max(time.perf_counter() - st, 1e-9)
+            print(
+                f"created {n_files} files, {n_bytes} bytes in {elapse:.2f} sec, "
+                f"{n_files / elapse:.2f} files/sec, "
+                f"{n_bytes / MB / elapse:.2f} MB/sec"
+            )
+        return manifest
+
+    def create_catalog(
+        self,
+        database: T.Optional[str] = None,
+        glue_client: T.Optional["GlueClient"] = None,
+        projection: bool = False,
+        infer: bool = False,
+    ) -> int:
+        """
+        Register the table and the partitions in the Glue catalog, see
+        :func:`~learn_big_data_on_aws.dataset.catalog.sync_catalog`.
+
+        :param infer: use the schema inferred from the existing files
+            instead of the declared one, see :meth:`infer_schema`.
+        """
+        from .catalog import sync_catalog
+
+        return sync_catalog(
+            self,
+            database=database,
+            glue_client=glue_client,
+            projection=projection,
+            schema=self.infer_schema() if infer else None,
+        )
+
+    def infer_schema(self, **kwargs) -> pa.Schema:
+        """
+        Infer the schema from a sample of the existing files, see
+        :func:`~learn_big_data_on_aws.dataset.inference.infer_schema`.
+        """
+        from .inference import infer_schema
+
+        return infer_schema(self, **kwargs)
+
+    @property
+    def s3path_compaction_manifest(self) -> S3Path:
+        """
+        S3 location of the compaction manifest, it points to the current
+        compacted version of the dataset.
+        """
+        return S3Path(self.datalake_s3_loc, f"{self.name}.compaction.json")
+
+    def compact(self, **kwargs) -> T.Optional["CompactionManifest"]:
+        """
+        Compact the small files into Parquet files, see
+        :func:`~learn_big_data_on_aws.dataset.compaction.compact`.
+        """
+        from .compaction import compact
+
+        return compact(self, **kwargs)
 
     def delete_all(self):
-        self.s3path_loc.delete_if_exists()
+        self.storage.delete_prefix(self.s3path_loc.key)
+        self.storage.delete(self.s3path_manifest.key)
+        self.storage.delete(self.s3path_partition_index.key)
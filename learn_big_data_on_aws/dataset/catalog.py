@@ -0,0 +1,353 @@
+# -*- coding: utf-8 -*-
+
+"""
+Register the datasets in the Glue catalog, without crawlers.
+
+The table schema is derived from the Arrow schema of the dataset, the SerDe
+from the file format, and the partitions from
+:meth:`~learn_big_data_on_aws.dataset.base.Dataset.get_partition_values`.
+Partitions are registered with ``batch_create_partition``, 100 partitions
+per call (the API limit), several calls in parallel.
+
+With ``projection=True`` the table gets partition projection properties
+instead, Athena computes the partitions from the properties and never looks
+up the partition metadata.
+
+Example::
+
+    >>> from learn_big_data_on_aws.dataset import get_dataset
+    >>> get_dataset("ds_003_walmart_mongodb").create_catalog()
+"""
+
+import typing as T
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from mypy_boto3_glue import GlueClient
+    from .base import Dataset
+
+#: max number of partitions per ``batch_create_partition`` call
+PARTITION_BATCH_SIZE = 100
+
+text_input_format = "org.apache.hadoop.mapred.TextInputFormat"
+text_output_format = "org.apache.hadoop.hive.ql.io.HiveIgnoreKeyTextOutputFormat"
+
+
+def arrow_type_to_glue_type(type_: pa.DataType) -> str:
+    """
+    Convert an Arrow type to the Hive type string used by Glue and Athena.
+    """
+    if pa.types.is_boolean(type_):
+        return "boolean"
+    if pa.types.is_int8(type_):
+        return "tinyint"
+    if pa.types.is_int16(type_):
+        return "smallint"
+    if pa.types.is_int32(type_):
+        return "int"
+    if pa.types.is_integer(type_):
+        return "bigint"
+    if pa.types.is_float32(type_):
+        return "float"
+    if pa.types.is_floating(type_):
+        return "double"
+    if pa.types.is_decimal(type_):
+        return f"decimal({type_.precision},{type_.scale})"
+    if pa.types.is_string(type_) or pa.types.is_large_string(type_):
+        return "string"
+    if pa.types.is_binary(type_) or pa.types.is_large_binary(type_):
+        return "binary"
+    if pa.types.is_timestamp(type_):
+        return "timestamp"
+    if pa.types.is_date(type_):
+        return "date"
+    if pa.types.is_list(type_) or pa.types.is_large_list(type_):
+        return f"array<{arrow_type_to_glue_type(type_.value_type)}>"
+    if pa.types.is_struct(type_):
+        fields = ",".join(
+            f"{field.name}:{arrow_type_to_glue_type(field.type)}" for field in type_
+        )
+        return f"struct<{fields}>"
+    if pa.types.is_map(type_):
+        return "map<{},{}>".format(
+            arrow_type_to_glue_type(type_.key_type),
+            arrow_type_to_glue_type(type_.item_type),
+        )
+    raise TypeError(f"unsupported type {type_}")
+
+
+def get_columns(schema: pa.Schema) -> T.List[dict]:
+    return [
+        dict(Name=field.name, Type=arrow_type_to_glue_type(field.type))
+        for field in schema
+    ]
+
+
+def get_table_schema(dataset: "Dataset", schema: pa.Schema) -> pa.Schema:
+    """
+    The schema of the columns as the SerDe reads them. The OpenCSVSerde only
+    parses a timestamp or a date from a UNIX number, the ISO strings the CSV
+    writer emits are declared as string, convert them in the query, for
+    example with ``from_iso8601_timestamp``.
+    """
+    from .base import FormatEnum
+
+    schema = dataset.writer.get_file_schema(schema)
+    if dataset.format in (FormatEnum.csv, FormatEnum.tsv):
+        schema = pa.schema(
+            [
+                field.with_type(pa.string())
+                if pa.types.is_timestamp(field.type) or pa.types.is_date(field.type)
+                else field
+                for field in schema
+            ]
+        )
+    return schema
+
+
+def get_storage_format(dataset: "Dataset") -> dict:
+    """
+    The ``InputFormat``, ``OutputFormat`` and ``SerdeInfo`` of the storage
+    descriptor, derived from the dataset format and writer options.
+    """
+    from .base import FormatEnum
+
+    if dataset.format is FormatEnum.json_multi_line:
+        return dict(
+            InputFormat=text_input_format,
+            OutputFormat=text_output_format,
+            SerdeInfo=dict(
+                SerializationLibrary="org.openx.data.jsonserde.JsonSerDe",
+            ),
+        )
+    elif dataset.format in (FormatEnum.csv, FormatEnum.tsv):
+        # the SerDe always has an escape character, the writer doubles it
+        if dataset.writer.escape_char is None:
+            raise ValueError(
+                "a CSV written without escape_char can not be cataloged, "
+                "the OpenCSVSerde would drop the escape characters of the values"
+            )
+        parameters = {
+            "separatorChar": dataset.writer.delimiter,
+            "quoteChar": '"',
+            "escapeChar": dataset.writer.escape_char,
+        }
+        table_parameters = dict()
+        if dataset.writer.include_header:
+            table_parameters["skip.header.line.count"] = "1"
+        return dict(
+            InputFormat=text_input_format,
+            OutputFormat=text_output_format,
+            SerdeInfo=dict(
+                SerializationLibrary="org.apache.hadoop.hive.serde2.OpenCSVSerde",
+                Parameters=parameters,
+            ),
+            TableParameters=table_parameters,
+        )
+    elif dataset.format is FormatEnum.parquet:
+        return dict(
+            InputFormat="org.apache.hadoop.hive.ql.io.parquet.MapredParquetInputFormat",
+            OutputFormat="org.apache.hadoop.hive.ql.io.parquet.MapredParquetOutputFormat",
+            SerdeInfo=dict(
+                SerializationLibrary="org.apache.hadoop.hive.ql.io.parquet.serde.ParquetHiveSerDe",
+            ),
+        )
+    else:
+        # a multi line JSON document can not be read by any Athena SerDe
+        raise ValueError(f"format {dataset.format.value!r} can not be cataloged")
+
+
+def get_projection_properties(dataset: "Dataset") -> T.Dict[str, str]:
+    """
+    Partition projection table properties. A partition key whose values are
+    all zero padded integers becomes an integer range, otherwise an enum.
+    """
+    values = [
+        dataset.get_partition_values(nth_file)
+        for nth_file in range(1, 1 + dataset.n_files)
+    ]
+    properties = {"projection.enabled": "true"}
+    for key, _ in dataset.partition_keys:
+        key_values = sorted({dct[key] for dct in values})
+        if all(value.isdigit() for value in key_values):
+            numbers = [int(value) for value in key_values]
+            properties[f"projection.{key}.type"] = "integer"
+            properties[f"projection.{key}.range"] = f"{min(numbers)},{max(numbers)}"
+            properties[f"projection.{key}.digits"] = str(
+                max(len(value) for value in key_values)
+            )
+        else:
+            properties[f"projection.{key}.type"] = "enum"
+            properties[f"projection.{key}.values"] = ",".join(key_values)
+    properties["storage.location.template"] = dataset.s3path_loc.uri + "".join(
+        f"{key}=${{{key}}}/" for key, _ in dataset.partition_keys
+    )
+    return properties
+
+
+def get_table_input(
+    dataset: "Dataset",
+    projection: bool = False,
+    schema: T.Optional[pa.Schema] = None,
+) -> dict:
+    """
+    The ``TableInput`` argument of ``create_table`` / ``update_table``.
+
+    :param projection: add the partition projection properties.
+    :param schema: default is ``dataset.schema``, or pass the schema inferred
+        from the data, see :mod:`learn_big_data_on_aws.dataset.inference`.
+    """
+    if schema is None:
+        schema = dataset.schema
+    storage_format = get_storage_format(dataset)
+    table_parameters = {
+        "classification": dataset.writer.ext,
+        "EXTERNAL": "TRUE",
+    }
+    table_parameters.update(storage_format.pop("TableParameters", {}))
+    if projection and dataset.partition_keys:
+        table_parameters.update(get_projection_properties(dataset))
+    return dict(
+        Name=dataset.name,
+        TableType="EXTERNAL_TABLE",
+        Parameters=table_parameters,
+        PartitionKeys=[
+            dict(Name=key, Type=type_) for key, type_ in dataset.partition_keys
+        ],
+        StorageDescriptor=dict(
+            Columns=get_columns(get_table_schema(dataset, schema)),
+            Location=dataset.s3path_loc.uri,
+            Compressed=False,
+            **storage_format,
+        ),
+    )
+
+
+def create_database(glue_client: "GlueClient", database: str):
+    try:
+        glue_client.create_database(DatabaseInput=dict(Name=database))
+    except glue_client.exceptions.AlreadyExistsException:
+        pass
+
+
+def put_table(
+    dataset: "Dataset",
+    database: str,
+    glue_client: "GlueClient",
+    projection: bool = False,
+    schema: T.Optional[pa.Schema] = None,
+):
+    """
+    Create the table, or update it if already exists.
+    """
+    table_input = get_table_input(dataset, projection=projection, schema=schema)
+    try:
+        glue_client.create_table(DatabaseName=database, TableInput=table_input)
+    except glue_client.exceptions.AlreadyExistsException:
+        glue_client.update_table(DatabaseName=database, TableInput=table_input)
+
+
+def iter_partition_inputs(
+    dataset: "Dataset",
+    schema: T.Optional[pa.Schema] = None,
+) -> T.Iterator[dict]:
+    """
+    One ``PartitionInput`` per partition, the storage descriptor is the one
+    of the table with the partition folder as the location.
+    """
+    storage_format = get_storage_format(dataset)
+    storage_format.pop("TableParameters", None)
+    if schema is None:
+        schema = dataset.schema
+    columns = get_columns(get_table_schema(dataset, schema))
+    seen = set()
+    for nth_file in range(1, 1 + dataset.n_files):
+        partition_values = dataset.get_partition_values(nth_file)
+        values = [partition_values[key] for key, _ in dataset.partition_keys]
+        if tuple(values) in seen:
+            continue
+        seen.add(tuple(values))
+        yield dict(
+            Values=values,
+            StorageDescriptor=dict(
+                Columns=columns,
+                Location=dataset.get_s3path(nth_file).parent.uri,
+                Compressed=False,
+                **storage_format,
+            ),
+        )
+
+
+def register_partitions(
+    dataset: "Dataset",
+    database: str,
+    glue_client: "GlueClient",
+    max_workers: int = 8,
+    schema: T.Optional[pa.Schema] = None,
+) -> int:
+    """
+    Register all partitions of the dataset, existing partitions are skipped.
+
+    :return: number of partitions newly created.
+    """
+    partition_inputs = list(iter_partition_inputs(dataset, schema=schema))
+    batches = [
+        partition_inputs[i : i + PARTITION_BATCH_SIZE]
+        for i in range(0, len(partition_inputs), PARTITION_BATCH_SIZE)
+    ]
+
+    def create_batch(batch: T.List[dict]) -> int:
+        res = glue_client.batch_create_partition(
+            DatabaseName=database,
+            TableName=dataset.name,
+            PartitionInputList=batch,
+        )
+        errors = [
+            error
+            for error in res.get("Errors", [])
+            if error["ErrorDetail"]["ErrorCode"] != "AlreadyExistsException"
+        ]
+        if errors:
+            raise RuntimeError(f"failed to create partitions: {errors}")
+        return len(batch) - len(res.get("Errors", []))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return sum(executor.map(create_batch, batches))
+
+
+def sync_catalog(
+    dataset: "Dataset",
+    database: T.Optional[str] = None,
+    glue_client: T.Optional["GlueClient"] = None,
+    projection: bool = False,
+    max_workers: int = 8,
+    schema: T.Optional[pa.Schema] = None,
+) -> int:
+    """
+    Create the database and the table, then register the partitions, unless
+    partition projection is used.
+
+    :param database: default is ``config.glue_database``.
+    :param glue_client: default is the lazily created client of the
+        configured profile.
+    :param schema: default is ``dataset.schema``.
+
+    :return: number of partitions newly created.
+    """
+    if database is None:
+        from ..config import config
+
+        database = config.glue_database
+    if glue_client is None:
+        from ..boto_ses import get_glue_client
+
+        glue_client = get_glue_client()
+    create_database(glue_client, database)
+    put_table(dataset, database, glue_client, projection=projection, schema=schema)
+    if dataset.partition_keys and projection is False:
+        return register_partitions(
+            dataset, database, glue_client, max_workers=max_workers, schema=schema
+        )
+    return 0
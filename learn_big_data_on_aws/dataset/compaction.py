@@ -0,0 +1,391 @@
+# -*- coding: utf-8 -*-
+
+"""
+Small file compaction.
+
+Rewrite the many small files of a dataset as Parquet files of about
+``target_file_size``, one set of files per hive partition, so the partition
+pruning still works. The partitions are compacted in parallel.
+
+The compacted files are written to a new versioned folder next to the
+dataset folder, then the compaction manifest is overwritten to point to it.
+The manifest PUT is the atomic swap, a reader that resolves the location from
+the manifest never sees a half compacted dataset.
+
+Once a compaction deleted the source files, the compacted version is the
+only copy of that data, and every later version inherits it. The next
+compaction reads the previous version back together with the new source
+files, and the new version covers both. A source file already carried into
+the previous version, recorded with its ETag or md5, is not read again.
+A source file overwritten with new content is a new file, its old content
+stays in the carried version::
+
+    s3://bucket/.../dataset/ds_003_walmart_mongodb/                   <- source
+    s3://bucket/.../dataset/ds_003_walmart_mongodb.compacted/v1666000000/
+    s3://bucket/.../dataset/ds_003_walmart_mongodb.compaction.json    <- manifest
+
+Example::
+
+    >>> from learn_big_data_on_aws.dataset import get_dataset
+    >>> manifest = get_dataset("ds_003_walmart_mongodb").compact()
+    >>> manifest.location
+    's3://bucket/.../dataset/ds_003_walmart_mongodb.compacted/v1666000000/'
+"""
+
+import typing as T
+import io
+import json
+import hashlib
+import time
+import dataclasses
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.json
+import pyarrow.parquet
+from s3pathlib import S3Path
+
+from .sink import MB
+from .manifest import ShardRecord
+from .writer import decode_nested
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .base import Dataset
+
+
+@dataclasses.dataclass
+class CompactionManifest:
+    """
+    :param dataset: dataset name.
+    :param location: S3 uri of the current compacted folder.
+    :param n_files_before: number of source files.
+    :param size_before: total size of the source files in bytes.
+    :param shards: the compacted files.
+    :param source_deleted: some source files were deleted by this or an
+        earlier compaction, the compacted files are the only copy of their
+        data.
+    :param kept_sources: the source files that are in the compacted files
+        and not deleted, key to ETag or md5, only recorded if
+        ``source_deleted``.
+    """
+
+    dataset: str
+    location: str
+    n_files_before: int
+    size_before: int
+    shards: T.List[ShardRecord] = dataclasses.field(default_factory=list)
+    source_deleted: bool = dataclasses.field(default=False)
+    kept_sources: T.Dict[str, str] = dataclasses.field(default_factory=dict)
+
+    @property
+    def n_files_after(self) -> int:
+        return len(self.shards)
+
+    @property
+    def size_after(self) -> int:
+        return sum(shard.size for shard in self.shards)
+
+    def to_json(self) -> str:
+        data = dataclasses.asdict(self)
+        return json.dumps(data, indent=4)
+
+    @classmethod
+    def from_json(cls, s: str) -> "CompactionManifest":
+        data = json.loads(s)
+        data["shards"] = [ShardRecord.from_dict(dct) for dct in data["shards"]]
+        return cls(**data)
+
+
+def read_table(dataset: "Dataset", data: bytes) -> pa.Table:
+    """
+    Parse one source file of the dataset into an Arrow table of the dataset
+    schema.
+    """
+    from .base import FormatEnum
+
+    schema = dataset.schema
+    if dataset.format is FormatEnum.json_multi_line:
+        return pyarrow.json.read_json(
+            io.BytesIO(data),
+            parse_options=pyarrow.json.ParseOptions(explicit_schema=schema),
+        )
+    elif dataset.format is FormatEnum.json_single_doc:
+        records = json.loads(data)
+        if isinstance(records, dict):
+            records = [records]
+        return pa.Table.from_pylist(records, schema=schema)
+    elif dataset.format in (FormatEnum.csv, FormatEnum.tsv):
+        table = pyarrow.csv.read_csv(
+            io.BytesIO(data),
+            parse_options=dataset.writer.get_parse_options(),
+            convert_options=pyarrow.csv.ConvertOptions(
+                column_types=dataset.writer.get_file_schema(schema)
+            ),
+        )
+        return decode_nested(table, schema)
+    else:
+        return pyarrow.parquet.read_table(io.BytesIO(data)).cast(schema)
+
+
+def get_source_signature(dataset: "Dataset", key: str) -> str:
+    """
+    The ETag of a source file, or the md5 of its content on the backends
+    without ETag.
+    """
+    info = dataset.storage.head(key)
+    if info.etag is not None:
+        return info.etag.strip('"')
+    return hashlib.md5(dataset.storage.read_bytes(key)).hexdigest()
+
+
+def group_by_partition(
+    dataset: "Dataset",
+    keys: T.List[str],
+    prefix: T.Optional[str] = None,
+) -> T.Dict[str, T.List[str]]:
+    """
+    Group the keys by the partition folder relative to the dataset folder,
+    for example ``year=2022/month=01/day=01/``, or ``""`` if not partitioned.
+
+    :param prefix: the folder the keys are relative to, default is the
+        dataset folder.
+    """
+    if prefix is None:
+        prefix = dataset.s3path_loc.key
+    groups: T.Dict[str, T.List[str]] = dict()
+    for key in sorted(keys):
+        relpath = key[len(prefix) :]
+        partition = relpath[: relpath.rfind("/") + 1]
+        groups.setdefault(partition, []).append(key)
+    return groups
+
+
+def compact_partition(
+    dataset: "Dataset",
+    keys: T.List[str],
+    s3dir_out: S3Path,
+    target_file_size: int,
+    row_group_nbytes: int,
+    compacted_keys: T.Optional[T.List[str]] = None,
+) -> T.List[ShardRecord]:
+    """
+    Stream the source files of one partition into Parquet files. Parsed
+    tables are buffered until ``row_group_nbytes`` in memory, then written as
+    one row group, and a new file is started once the current one reaches
+    ``target_file_size``.
+
+    :param compacted_keys: the Parquet files of the previous compacted
+        version to carry forward, they are read before the source files.
+    """
+    storage = dataset.storage
+    schema = dataset.schema
+    shards: T.List[ShardRecord] = list()
+    buffer: T.List[pa.Table] = list()
+    state = dict(key=None, f=None, writer=None, n_rows=0)
+
+    def close_file():
+        if state["writer"] is None:
+            return
+        state["writer"].close()
+        state["f"].close()
+        f = state["f"]
+        shards.append(
+            ShardRecord(
+                nth_file=len(shards) + 1,
+                key=state["key"],
+                size=f.size,
+                n_rows=state["n_rows"],
+                md5=f.md5.hexdigest(),
+                etag=f.etag,
+            )
+        )
+        state.update(key=None, f=None, writer=None, n_rows=0)
+
+    def flush():
+        if len(buffer) == 0:
+            return
+        table = pa.concat_tables(buffer)
+        buffer.clear()
+        if state["writer"] is None:
+            state["key"] = S3Path(
+                s3dir_out, f"part-{str(len(shards) + 1).zfill(5)}.parquet"
+            ).key
+            state["f"] = storage.open_sink(state["key"])
+            state["writer"] = pyarrow.parquet.ParquetWriter(
+                state["f"],
+                schema,
+                compression=getattr(dataset.writer, "compression", "snappy"),
+            )
+        state["writer"].write_table(table, row_group_size=table.num_rows)
+        state["n_rows"] += table.num_rows
+        if state["f"].size >= target_file_size:
+            close_file()
+
+    inputs = [(key, True) for key in (compacted_keys or [])]
+    inputs.extend((key, False) for key in keys)
+    try:
+        for key, is_compacted in inputs:
+            data = storage.read_bytes(key)
+            if is_compacted:
+                table = pyarrow.parquet.read_table(io.BytesIO(data)).cast(schema)
+            else:
+                table = read_table(dataset, data)
+            buffer.append(table)
+            if sum(table.nbytes for table in buffer) >= row_group_nbytes:
+                flush()
+        flush()
+        close_file()
+    except Exception:
+        if state["f"] is not None:
+            state["f"].abort()
+        raise
+    return shards
+
+
+def compact(
+    dataset: "Dataset",
+    target_file_size: int = 128 * MB,
+    row_group_nbytes: int = 64 * MB,
+    max_workers: int = 8,
+    delete_source: bool = False,
+) -> T.Optional[CompactionManifest]:
+    """
+    Compact the dataset into Parquet files, swap the manifest and return it.
+    If there is nothing new to compact, the current manifest is returned,
+    None if the dataset was never compacted, and only ``delete_source``
+    deletes the source files already carried into it.
+
+    The Glue catalog and the partition index still describe the source
+    folder, the caller must point the catalog to the new location, for
+    example by registering ``manifest.location`` as a new table.
+
+    :param target_file_size: the compacted file size in bytes, approximately,
+        a file is closed at the first row group boundary past it.
+    :param row_group_nbytes: in memory size of a row group.
+    :param max_workers: number of partitions compacted in parallel.
+    :param delete_source: delete the source files, the generation manifest
+        and the partition index after the swap, they only describe the
+        deleted files. The previous compacted version is deleted too, it is
+        covered by the new one. Once set, the later compactions carry the
+        compacted data forward, with or without ``delete_source``.
+    """
+    storage = dataset.storage
+    st = time.time()
+    print(f"--- compacting dataset {dataset.name} ---")
+    source_keys = [
+        key
+        for key in storage.list_keys(dataset.s3path_loc.key)
+        if key.endswith(f".{dataset.writer.ext}")
+    ]
+    previous = read_compaction_manifest(dataset)
+
+    # the previous version is the only copy of the data compacted before
+    carried_shards: T.List[ShardRecord] = list()
+    kept_sources: T.Dict[str, str] = dict()
+    if previous is not None and previous.source_deleted:
+        carried_shards = previous.shards
+        existing = set(source_keys)
+        kept_sources = {
+            key: signature
+            for key, signature in previous.kept_sources.items()
+            if key in existing and get_source_signature(dataset, key) == signature
+        }
+    new_keys = [key for key in source_keys if key not in kept_sources]
+    if len(new_keys) == 0:
+        print("no source file to compact")
+        if delete_source and len(kept_sources):
+            # they are already in the previous version
+            previous.kept_sources = dict()
+            storage.write_bytes(
+                dataset.s3path_compaction_manifest.key,
+                previous.to_json().encode("utf-8"),
+            )
+            storage.delete_keys(list(kept_sources))
+            storage.delete(dataset.s3path_manifest.key)
+            storage.delete(dataset.s3path_partition_index.key)
+        return previous
+
+    size_before = sum(storage.head(key).size for key in new_keys) + sum(
+        shard.size for shard in carried_shards
+    )
+    groups = group_by_partition(dataset, new_keys)
+    compacted_groups: T.Dict[str, T.List[str]] = dict()
+    if len(carried_shards):
+        compacted_groups = group_by_partition(
+            dataset,
+            [shard.key for shard in carried_shards],
+            prefix=S3Path(previous.location).key,
+        )
+
+    s3dir_version = S3Path(
+        dataset.datalake_s3_loc,
+        f"{dataset.name}.compacted",
+        f"v{int(st * 1000)}/",
+    )
+
+    def compact_one(partition: str) -> T.List[ShardRecord]:
+        return compact_partition(
+            dataset,
+            keys=groups.get(partition, []),
+            s3dir_out=S3Path(s3dir_version, partition) if partition else s3dir_version,
+            target_file_size=target_file_size,
+            row_group_nbytes=row_group_nbytes,
+            compacted_keys=compacted_groups.get(partition),
+        )
+
+    partitions = sorted(set(groups) | set(compacted_groups))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = list(executor.map(compact_one, partitions))
+
+    manifest = CompactionManifest(
+        dataset=dataset.name,
+        location=s3dir_version.uri,
+        n_files_before=len(new_keys) + len(carried_shards),
+        size_before=size_before,
+        # the data of the sources deleted before is in this version too
+        source_deleted=delete_source or len(carried_shards) > 0,
+    )
+    if manifest.source_deleted and not delete_source:
+        kept_sources.update(
+            (key, get_source_signature(dataset, key)) for key in new_keys
+        )
+        manifest.kept_sources = kept_sources
+    for shards in results:
+        for shard in shards:
+            shard.nth_file = len(manifest.shards) + 1
+            manifest.shards.append(shard)
+
+    # the atomic swap
+    storage.write_bytes(
+        dataset.s3path_compaction_manifest.key,
+        manifest.to_json().encode("utf-8"),
+    )
+
+    if delete_source:
+        storage.delete_keys(source_keys)
+        storage.delete(dataset.s3path_manifest.key)
+        storage.delete(dataset.s3path_partition_index.key)
+        # the new version read all the data of the previous one
+        if previous is not None and previous.location != manifest.location:
+            storage.delete_prefix(S3Path(previous.location).key)
+
+    elapse = time.time() - st
+    print(
+        f"compacted {manifest.n_files_before} files, {manifest.size_before} bytes "
+        f"into {manifest.n_files_after} files, {manifest.size_after} bytes "
+        f"in {elapse:.2f} sec"
+    )
+    return manifest
+
+
+def read_compaction_manifest(dataset: "Dataset") -> T.Optional[CompactionManifest]:
+    """
+    Read the current compaction manifest, return None if never compacted.
+    """
+    key = dataset.s3path_compaction_manifest.key
+    if dataset.storage.exists(key):
+        return CompactionManifest.from_json(
+            dataset.storage.read_bytes(key).decode("utf-8")
+        )
+    return None
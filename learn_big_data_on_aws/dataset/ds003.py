@@ -4,106 +4,415 @@
 Online E-Commerce Order Data
 """
 
-import uuid
-import random
-from typing import Dict, List
-from datetime import datetime, timedelta, timezone
-
-import pandas as pd
-from rich import print as rprint
-from faker import Faker
-from s3pathlib import S3Path, context
-
-from ..config import config
-from ..boto_ses import boto_ses
-from .base import Dataset as DS, FormatEnum
+import os
+import typing as T
+import tempfile
+from pathlib import Path
+from functools import cached_property
+from datetime import date, datetime, timedelta, timezone
 
-context.attach_boto_session(boto_ses)
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+from s3pathlib import S3Path
 
-fake = Faker()
+from .base import Dataset as DS, FormatEnum
+from .generator import (
+    RecordGenerator,
+    IdColumn,
+    FloatColumn,
+    ChoiceColumn,
+    PoolColumn,
+    derive_seed,
+)
 
 genders = [0, 1]
 
+customer_generator = RecordGenerator(
+    columns=[
+        IdColumn("customer_id"),
+        PoolColumn("email", factory=lambda fake: fake.email()),
+        PoolColumn("name", factory=lambda fake: fake.name()),
+        PoolColumn("dob", factory=lambda fake: fake.date()),
+        ChoiceColumn("gender", values=genders),
+        PoolColumn("billing_address", factory=lambda fake: fake.address()),
+        PoolColumn("shipping_address", factory=lambda fake: fake.address()),
+    ],
+    seed=derive_seed("ds003", "customer"),
+)
+
+item_generator = RecordGenerator(
+    columns=[
+        IdColumn("item_id"),
+        PoolColumn("name", factory=lambda fake: fake.word()),
+        FloatColumn("price", low=0.30, high=100.00, decimals=2),
+    ],
+    seed=derive_seed("ds003", "item"),
+)
+
+
+def get_dir_shared_memory() -> Path:
+    """
+    ``/dev/shm`` is a RAM backed file system on Linux, a memory mapped file
+    in it is shared memory. Fall back to the temp dir on other OS.
+    """
+    dir_shm = Path("/dev/shm")
+    if dir_shm.is_dir():
+        return dir_shm
+    return Path(tempfile.gettempdir())
+
+
+def get_path_dimension_table(
+    name: str,
+    table: str,
+    generator: RecordGenerator,
+    n_rows: int,
+) -> Path:
+    """
+    Path of a dimension table in shared memory. The file name has a hash of
+    the generator schema and seed, so a file left by an older version of the
+    generator is never reused.
+    """
+    fingerprint = derive_seed(
+        name, table, n_rows, generator.schema.to_string(), generator.seed
+    )
+    return get_dir_shared_memory().joinpath(
+        f"{name}-{table}-{n_rows}-{fingerprint:016x}.arrow"
+    )
+
+
+def write_arrow_file(table: pa.Table, path: Path):
+    """
+    Write the table as an Arrow IPC file. It writes to a temp file first then
+    rename, so a concurrent reader never sees a half written file.
+    """
+    path_tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with pa.OSFile(str(path_tmp), "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path_tmp, path)
+
+
+def read_arrow_file(path: Path) -> pa.Table:
+    """
+    Memory map an Arrow IPC file. It is zero copy, the table is backed by the
+    page cache shared by all processes, not by the process heap.
+    """
+    return pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all()
+
 
 class Dataset(DS):
-    _dimension_tables_created = False
+    """
+    Each file is one day partition of orders.
+
+    The default volume is 30 ~ 100 orders per day. For load tests, set both
+    ``n_order_per_day_lower`` and ``n_order_per_day_upper`` to millions, the
+    orders are synthesized in record batches of ``batch_size``.
+
+    :param n_customer: number of rows in the customer dimension table.
+    :param n_item: number of rows in the item dimension table.
+    :param n_order_per_day_lower: min number of orders per day.
+    :param n_order_per_day_upper: max number of orders per day.
+    :param n_item_per_order_lower: min number of distinct items per order.
+    :param n_item_per_order_upper: max number of distinct items per order.
+    :param batch_size: number of orders per record batch.
+    """
+
+    def __init__(
+        self,
+        n_customer: int = 1000,
+        n_item: int = 300,
+        n_order_per_day_lower: int = 30,
+        n_order_per_day_upper: int = 100,
+        n_item_per_order_lower: int = 1,
+        n_item_per_order_upper: int = 5,
+        batch_size: int = 65536,
+        **kwargs,
+    ):
+        if n_customer < 1 or n_item < 1 or batch_size < 1:
+            raise ValueError(
+                "n_customer, n_item and batch_size must be positive, "
+                f"got {n_customer}, {n_item} and {batch_size}"
+            )
+        if not (0 <= n_order_per_day_lower <= n_order_per_day_upper):
+            raise ValueError(
+                "expect 0 <= n_order_per_day_lower <= n_order_per_day_upper, "
+                f"got {n_order_per_day_lower} and {n_order_per_day_upper}"
+            )
+        # an order can not have more distinct items than the item table
+        if not (0 <= n_item_per_order_lower <= min(n_item_per_order_upper, n_item)):
+            raise ValueError(
+                "expect 0 <= n_item_per_order_lower <= "
+                "min(n_item_per_order_upper, n_item), got "
+                f"{n_item_per_order_lower}, {n_item_per_order_upper} and {n_item}"
+            )
+        super().__init__(**kwargs)
+        self.n_customer = n_customer
+        self.n_item = n_item
+        self.n_order_per_day_lower = n_order_per_day_lower
+        self.n_order_per_day_upper = n_order_per_day_upper
+        self.n_item_per_order_lower = n_item_per_order_lower
+        self.n_item_per_order_upper = n_item_per_order_upper
+        self.batch_size = batch_size
+        self._dimension_tables_created = False
+
+    @property
+    def path_customer_table(self) -> Path:
+        return get_path_dimension_table(
+            self.name, "customer", customer_generator, self.n_customer
+        )
+
+    @property
+    def path_item_table(self) -> Path:
+        return get_path_dimension_table(self.name, "item", item_generator, self.n_item)
 
     def create_dimension_tables(self):
+        """
+        Build the dimension tables once and store them as Arrow files in
+        shared memory. The generation is seeded, so an existing file is
+        always identical and can be reused.
+        """
         if self._dimension_tables_created is True:
             return
 
-        self.n_customer = 1000
-        self.customers: Dict[int: dict] = dict()
-        for customer_id in range(1, 1 + self.n_customer):
-            customer = {
-                "customer_id": customer_id,
-                "email": fake.email(),
-                "name": fake.name(),
-                "dob": fake.date(),
-                "gender": random.choice(genders),
-                "billing_address": fake.address(),
-                "shipping_address": fake.address(),
-            }
-            self.customers[customer_id] = customer
-
-        self.n_item = 300
-        self.items: Dict[int: dict] = dict()
-        for item_id in range(1, 1 + self.n_item):
-            item = {
-                "item_id": item_id,
-                "name": fake.word(),
-                "price": 0.01 * random.randint(30, 10000),
-            }
-            self.items[item_id] = item
-
-    def create_one(self, nth_file: int, **kwargs):
+        if self.path_customer_table.exists() is False:
+            write_arrow_file(
+                customer_generator.generate_table(
+                    n_rows=self.n_customer,
+                    rng=np.random.default_rng(derive_seed(self.name, "customer")),
+                ),
+                self.path_customer_table,
+            )
+
+        if self.path_item_table.exists() is False:
+            write_arrow_file(
+                item_generator.generate_table(
+                    n_rows=self.n_item,
+                    rng=np.random.default_rng(derive_seed(self.name, "item")),
+                ),
+                self.path_item_table,
+            )
+
+        self._dimension_tables_created = True
+
+    def prepare(self):
         self.create_dimension_tables()
-        n_order_per_day_lower = 30
-        n_order_per_day_upper = 100
+        super().prepare()
+
+    def delete_dimension_tables(self):
+        """
+        Remove the dimension table files from shared memory, they would
+        otherwise stay in RAM until reboot.
+        """
+        for path in [self.path_customer_table, self.path_item_table]:
+            path.unlink(missing_ok=True)
+        self.__dict__.pop("customer_table", None)
+        self.__dict__.pop("item_table", None)
+        self._dimension_tables_created = False
+
+    def delete_all(self):
+        super().delete_all()
+        self.delete_dimension_tables()
+
+    def set_n_rows_per_file(self, n_rows: int):
+        self.n_order_per_day_lower = n_rows
+        self.n_order_per_day_upper = n_rows
 
+    @cached_property
+    def customer_table(self) -> pa.Table:
+        """
+        Customer dimension table, attached zero copy from shared memory.
+        """
+        self.create_dimension_tables()
+        return read_arrow_file(self.path_customer_table)
+
+    @cached_property
+    def item_table(self) -> pa.Table:
+        """
+        Item dimension table, attached zero copy from shared memory.
+        """
+        self.create_dimension_tables()
+        return read_arrow_file(self.path_item_table)
+
+    @property
+    def schema(self) -> pa.Schema:
+        return pa.schema(
+            [
+                ("order_id", pa.string()),
+                ("create_time", pa.timestamp("s", tz="UTC")),
+                ("customer", pa.struct(list(customer_generator.schema))),
+                (
+                    "items",
+                    pa.list_(
+                        pa.struct(
+                            list(item_generator.schema)
+                            + [pa.field("quantity", pa.int64())]
+                        )
+                    ),
+                ),
+            ]
+        )
+
+    def get_today_date(self, nth_file: int) -> datetime:
+        """
+        Each file is the orders of one day, starting from 2022-01-01.
+        """
         start_date = datetime(2022, 1, 1, tzinfo=timezone.utc)
-        item_ids = list(range(1, 1 + self.n_item))
-
-        today_date = start_date + timedelta(days=(nth_file - 1))
-        orders: List[dict] = list()
-        for _ in range(random.randint(n_order_per_day_lower, n_order_per_day_upper)):
-            order = {
-                "order_id": str(uuid.uuid4()),
-                "create_time": (today_date + timedelta(seconds=random.randint(0, 86399))),
-                "customer": self.customers[random.randint(1, self.n_customer)],
-            }
-            items = list()
-            for item_id in random.sample(item_ids, random.randint(1, 5)):
-                item = self.items[item_id]
-                item["quantity"] = random.randint(1, 10)
-                items.append(item)
-            order["items"] = items
-            orders.append(order)
-        df = pd.DataFrame(orders)
-        s3path = S3Path(
+        return start_date + timedelta(days=(nth_file - 1))
+
+    def get_s3path(self, nth_file: int) -> S3Path:
+        today_date = self.get_today_date(nth_file)
+        return S3Path(
             self.s3path_loc,
             f"year={today_date.year}",
             f"month={str(today_date.month).zfill(2)}",
             f"day={str(today_date.day).zfill(2)}",
-            f"{str(1).zfill(3)}.json"
+            f"{str(1).zfill(3)}.{self.writer.ext}",
         )
-        print(f"create {s3path.basename}, console_url = {s3path.console_url}")
-        with s3path.open("w") as f:
-            df.to_json(f, orient="records", lines=True)
 
-    def create_all(
+    @property
+    def partition_keys(self):
+        return [("year", "string"), ("month", "string"), ("day", "string")]
+
+    def get_partition_values(self, nth_file: int):
+        today_date = self.get_today_date(nth_file)
+        return {
+            "year": str(today_date.year),
+            "month": str(today_date.month).zfill(2),
+            "day": str(today_date.day).zfill(2),
+        }
+
+    def find_keys(
         self,
-        **kwargs,
-    ):
-        print(f"--- creating dataset {self.s3path_loc.basename} ---")
-        for nth_file in range(1, 1 + self.n_files):
-            self.create_one(nth_file=nth_file)
+        start_date: T.Optional[date] = None,
+        end_date: T.Optional[date] = None,
+    ) -> T.List[str]:
+        """
+        Resolve a date range, both ends inclusive, to the object keys, from
+        the partition index, no LIST call.
+        """
+        index = self.read_partition_index()
+        dates = pc.binary_join_element_wise(
+            index["year"], index["month"], index["day"], "-"
+        )
+        mask = pc.is_valid(dates)
+        if start_date is not None:
+            mask = pc.and_(mask, pc.greater_equal(dates, start_date.isoformat()))
+        if end_date is not None:
+            mask = pc.and_(mask, pc.less_equal(dates, end_date.isoformat()))
+        return index.filter(mask)["key"].to_pylist()
+
+    def generate_order_ids(
+        self,
+        rng: np.random.Generator,
+        n: int,
+    ) -> pa.Array:
+        """
+        Vectorized random UUID4 strings.
+        """
+        data = rng.integers(0, 256, size=(n, 16), dtype=np.uint8)
+        data[:, 6] = (data[:, 6] & 0x0F) | 0x40  # version 4
+        data[:, 8] = (data[:, 8] & 0x3F) | 0x80  # RFC 4122 variant
+        hex_chars = np.frombuffer(data.tobytes().hex().encode("ascii"), dtype=np.uint8)
+        hex_chars = hex_chars.reshape(n, 32)
+        chars = np.full((n, 36), ord("-"), dtype=np.uint8)
+        chars[:, 0:8] = hex_chars[:, 0:8]
+        chars[:, 9:13] = hex_chars[:, 8:12]
+        chars[:, 14:18] = hex_chars[:, 12:16]
+        chars[:, 19:23] = hex_chars[:, 16:20]
+        chars[:, 24:36] = hex_chars[:, 20:32]
+        return pa.array(chars.reshape(-1).view("S36"), type=pa.binary(36)).cast(
+            pa.string()
+        )
+
+    def generate_items(
+        self,
+        rng: np.random.Generator,
+        n: int,
+    ) -> pa.Array:
+        """
+        Vectorized ``items`` column, a list of 1 ~ 5 distinct items per order,
+        as an Arrow list-of-struct array.
+
+        To get distinct items without a per order ``random.sample``, each
+        order picks a random first item, then walks forward with random
+        steps. The total walk is shorter than ``n_item``, so no item repeats.
+        """
+        max_n_line = min(self.n_item_per_order_upper, self.n_item)
+        counts = rng.integers(
+            self.n_item_per_order_lower, max_n_line + 1, size=n
+        )
+        offsets = np.zeros(n + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        total = int(offsets[-1])
+        starts = np.repeat(offsets[:-1], counts)
+
+        max_step = max(1, (self.n_item - 1) // max(1, max_n_line - 1))
+        steps = rng.integers(1, max_step + 1, size=total)
+        steps[offsets[:-1][counts > 0]] = 0
+        walk = np.cumsum(steps)
+        walk -= walk[starts]
+        first = np.repeat(rng.integers(0, self.n_item, size=n), counts)
+        indices = (first + walk) % self.n_item
+
+        items = self.item_table.take(pa.array(indices))
+        quantity = pa.array(rng.integers(1, 11, size=total))
+        struct = pa.StructArray.from_arrays(
+            [column.combine_chunks() for column in items.columns] + [quantity],
+            fields=list(items.schema) + [pa.field("quantity", pa.int64())],
+        )
+        return pa.ListArray.from_arrays(pa.array(offsets), struct)
+
+    def generate_order_batch(
+        self,
+        rng: np.random.Generator,
+        n: int,
+        today_date: datetime,
+    ) -> pa.RecordBatch:
+        """
+        Generate ``n`` orders of the given day as one record batch, every
+        column is built with numpy / Arrow, no per order Python code.
+        """
+        schema = self.schema
+        start = int(today_date.timestamp())
+        create_time = pa.array(
+            start + rng.integers(0, 86400, size=n), type=pa.int64()
+        ).cast(schema.field("create_time").type)
+        customers = self.customer_table.take(
+            pa.array(rng.integers(0, self.n_customer, size=n))
+        )
+        customer = pa.StructArray.from_arrays(
+            [column.combine_chunks() for column in customers.columns],
+            fields=list(customers.schema),
+        )
+        return pa.RecordBatch.from_arrays(
+            [
+                self.generate_order_ids(rng, n),
+                create_time,
+                customer,
+                self.generate_items(rng, n),
+            ],
+            schema=schema,
+        )
+
+    def iter_batches(self, nth_file: int):
+        # never use the global random module, the output only depends on nth_file
+        rng = self.get_rng(nth_file)
+        today_date = self.get_today_date(nth_file)
+        n_order = int(
+            rng.integers(
+                self.n_order_per_day_lower,
+                self.n_order_per_day_upper + 1,
+            )
+        )
+        for offset in range(0, n_order, self.batch_size):
+            n = min(self.batch_size, n_order - offset)
+            yield self.generate_order_batch(rng, n, today_date)
 
 
 dataset = Dataset(
     name="ds_003_walmart_mongodb",
     format=FormatEnum.json_multi_line,
-    datalake_s3_loc=config.s3path_dataset_prefix,
     n_files=100,
     n_records_per_file=0,
 )
@@ -7,14 +7,12 @@ import random
 
 from rich import print as rprint
 from faker import Faker
-from s3pathlib import S3Path, context
+from s3pathlib import S3Path
 from mpire import WorkerPool
 
 from ..config import config
-from ..boto_ses import boto_ses
 from .base import Dataset, FormatEnum
-
-context.attach_boto_session(boto_ses)
+from .generator import derive_seed
 
 
 # class DataSet(Dataset):
@@ -24,16 +22,22 @@ context.attach_boto_session(boto_ses)
 dataset = Dataset(
     name="ds_001_multi_line_json",
     format=FormatEnum.json_multi_line,
-    datalake_s3_loc=config.s3path_dataset_prefix,
     n_files=10,
     n_records_per_file=50,
 )
 
 
 
-s3path_prefix = S3Path(config.s3path_prefix, "ds01_nested_json")
+folder = "ds01_nested_json"
+
+
+def get_s3path_prefix() -> S3Path:
+    """
+    The output folder, in the data lake folder of ``dataset``, resolved on
+    call because it may need the AWS account id.
+    """
+    return S3Path(dataset.datalake_s3_loc, f"{folder}/")
 
-fake = Faker()
 
 n_files = 50
 n_message_lower = 1
@@ -43,29 +47,35 @@ n_tag_upper = 5
 
 
 def create_one(nth_file: int):
+    # seeded per file, so any file can be regenerated with identical content
+    seed = derive_seed(folder, nth_file)
+    rnd = random.Random(seed)
+    fake = Faker()
+    fake.seed_instance(seed)
     data = {
         "id": nth_file,
         "messages": [
             f"message {id + 1}"
-            for id in range(random.randint(n_message_lower, n_message_upper))
+            for id in range(rnd.randint(n_message_lower, n_message_upper))
         ],
         "tags": [
             {"key": "Name", "value": fake.name()}
-            for _ in range(random.randint(n_tag_lower, n_tag_upper))
+            for _ in range(rnd.randint(n_tag_lower, n_tag_upper))
         ]
     }
     data["data"] = copy.copy(data)
 
-    s3path = S3Path(s3path_prefix, f"{str(nth_file).zfill(3)}.json")
-    print(f"dump to {s3path.console_url}")
-    with s3path.open("w") as f:
-        json.dump(data, f, indent=4)
+    s3path = S3Path(get_s3path_prefix(), f"{str(nth_file).zfill(3)}.json")
+    print(f"dump to {dataset.storage.get_url(s3path.key)}")
+    dataset.storage.write_bytes(
+        s3path.key, json.dumps(data, indent=4).encode("utf-8")
+    )
 
     return data
 
 
 def create_dataset():
-    print(f"--- creating dataset {s3path_prefix.basename} ---")
+    print(f"--- creating dataset {folder} ---")
     kwargs = [
         {"nth_file": ith_file}
         for ith_file in range(1, 1 + n_files)
@@ -0,0 +1,288 @@
+# -*- coding: utf-8 -*-
+
+"""
+Vectorized columnar record generator.
+
+Calling ``Faker`` once per field per row caps us at a few thousand rows per
+second. Instead, every "fake" column draws a small pool of values from Faker
+once per process, then each batch is produced by sampling indices with numpy
+and taking them from the pool with Arrow. There is no per-row Python code
+involved, so a batch of 64K rows costs a few milliseconds.
+
+Example::
+
+    >>> generator = RecordGenerator(
+    ...     columns=[
+    ...         IdColumn("id"),
+    ...         PoolColumn("name", factory=lambda fake: fake.name()),
+    ...         IntColumn("age", low=18, high=80),
+    ...     ]
+    ... )
+    >>> for batch in generator.iter_batches(n_rows=1000000):
+    ...     ...
+"""
+
+import typing as T
+import hashlib
+import dataclasses
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from faker import Faker
+
+
+def derive_seed(*parts) -> int:
+    """
+    Derive a stable 64 bits seed from the parts, for example
+    ``derive_seed(dataset_name, nth_file)``. Unlike ``hash()``, the result
+    doesn't depend on ``PYTHONHASHSEED``, so it is the same in every process.
+    """
+    key = ":".join(str(part) for part in parts)
+    return int.from_bytes(hashlib.sha256(key.encode("utf-8")).digest()[:8], "big")
+
+
+@dataclasses.dataclass
+class Column:
+    """
+    Base class of all column generators.
+
+    :param name: column name
+    """
+
+    name: str
+
+    @property
+    def type(self) -> pa.DataType:  # pragma: no cover
+        raise NotImplementedError
+
+    def build_pool(self, fake: "Faker"):
+        """
+        Prepare the precomputed values for this column, if any.
+        """
+        pass
+
+    def generate(
+        self,
+        rng: np.random.Generator,
+        n: int,
+        start_id: int,
+    ) -> pa.Array:  # pragma: no cover
+        raise NotImplementedError
+
+
+@dataclasses.dataclass
+class IdColumn(Column):
+    """
+    Sequential int64 id, starting from ``start_id`` of the batch.
+    """
+
+    @property
+    def type(self) -> pa.DataType:
+        return pa.int64()
+
+    def generate(self, rng, n, start_id):
+        return pa.array(np.arange(start_id, start_id + n, dtype=np.int64))
+
+
+@dataclasses.dataclass
+class IntColumn(Column):
+    """
+    Uniformly distributed integer in ``[low, high]`` (both inclusive).
+    """
+
+    low: int = dataclasses.field(default=0)
+    high: int = dataclasses.field(default=100)
+
+    @property
+    def type(self) -> pa.DataType:
+        return pa.int64()
+
+    def generate(self, rng, n, start_id):
+        return pa.array(rng.integers(self.low, self.high + 1, size=n))
+
+
+@dataclasses.dataclass
+class FloatColumn(Column):
+    """
+    Uniformly distributed float in ``[low, high)``, rounded to ``decimals``.
+    """
+
+    low: float = dataclasses.field(default=0.0)
+    high: float = dataclasses.field(default=1.0)
+    decimals: int = dataclasses.field(default=2)
+
+    @property
+    def type(self) -> pa.DataType:
+        return pa.float64()
+
+    def generate(self, rng, n, start_id):
+        values = rng.uniform(self.low, self.high, size=n)
+        return pa.array(np.round(values, self.decimals))
+
+
+@dataclasses.dataclass
+class ChoiceColumn(Column):
+    """
+    Pick one of the given ``values`` uniformly.
+    """
+
+    values: T.List[T.Any] = dataclasses.field(default_factory=list)
+
+    @property
+    def type(self) -> pa.DataType:
+        return pa.array(self.values).type
+
+    def generate(self, rng, n, start_id):
+        indices = rng.integers(0, len(self.values), size=n)
+        return pa.array(self.values).take(pa.array(indices))
+
+
+@dataclasses.dataclass
+class TimestampColumn(Column):
+    """
+    Uniformly distributed UTC timestamp in ``[start, end)``, second precision.
+    """
+
+    start: datetime = dataclasses.field(
+        default=datetime(2022, 1, 1, tzinfo=timezone.utc)
+    )
+    end: datetime = dataclasses.field(
+        default=datetime(2023, 1, 1, tzinfo=timezone.utc)
+    )
+
+    @property
+    def type(self) -> pa.DataType:
+        return pa.timestamp("s", tz="UTC")
+
+    def generate(self, rng, n, start_id):
+        low = int(self.start.timestamp())
+        high = int(self.end.timestamp())
+        values = rng.integers(low, high, size=n)
+        return pa.array(values, type=pa.int64()).cast(self.type)
+
+
+@dataclasses.dataclass
+class PoolColumn(Column):
+    """
+    Sample from a pool of ``pool_size`` values produced by ``factory(fake)``.
+
+    The pool is built once per process by :meth:`RecordGenerator.build_pools`,
+    after that generating a batch is just an Arrow ``take``.
+
+    :param factory: a callable that takes a ``Faker`` instance and returns
+        one value, for example ``lambda fake: fake.email()``.
+    :param pool_size: number of distinct values in the pool.
+    """
+
+    factory: T.Callable[["Faker"], T.Any] = dataclasses.field(default=None)
+    pool_size: int = dataclasses.field(default=1000)
+    pool: T.Optional[pa.Array] = dataclasses.field(default=None, repr=False)
+
+    @property
+    def type(self) -> pa.DataType:
+        if self.pool is None:
+            return pa.string()
+        return self.pool.type
+
+    def build_pool(self, fake):
+        self.pool = pa.array([self.factory(fake) for _ in range(self.pool_size)])
+
+    def generate(self, rng, n, start_id):
+        indices = rng.integers(0, len(self.pool), size=n)
+        return self.pool.take(pa.array(indices))
+
+
+class RecordGenerator:
+    """
+    Generate Arrow record batches from a list of :class:`Column`.
+
+    :param columns: column generators, in output order.
+    :param batch_size: max number of rows per record batch.
+    :param seed: seed of the Faker instance used to build the value pools.
+        With the same seed, every process builds identical pools.
+    """
+
+    def __init__(
+        self,
+        columns: T.List[Column],
+        batch_size: int = 65536,
+        seed: T.Optional[int] = None,
+    ):
+        self.columns = columns
+        self.batch_size = batch_size
+        self.seed = seed
+        self._pools_built = False
+
+    @property
+    def schema(self) -> pa.Schema:
+        self.build_pools()
+        return pa.schema([(column.name, column.type) for column in self.columns])
+
+    def build_pools(self, fake: T.Optional["Faker"] = None):
+        """
+        Build the value pools of all :class:`PoolColumn`. It only happens once.
+        """
+        if self._pools_built is True:
+            return
+        if fake is None:
+            from faker import Faker
+
+            fake = Faker()
+            if self.seed is not None:
+                fake.seed_instance(self.seed)
+        for column in self.columns:
+            column.build_pool(fake)
+        self._pools_built = True
+
+    def generate_batch(
+        self,
+        n_rows: int,
+        rng: T.Optional[np.random.Generator] = None,
+        start_id: int = 1,
+    ) -> pa.RecordBatch:
+        """
+        Generate exactly one record batch of ``n_rows`` rows.
+
+        :param rng: numpy random generator, pass a seeded one to get
+            reproducible output.
+        """
+        self.build_pools()
+        if rng is None:
+            rng = np.random.default_rng()
+        arrays = [
+            column.generate(rng=rng, n=n_rows, start_id=start_id)
+            for column in self.columns
+        ]
+        return pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+
+    def iter_batches(
+        self,
+        n_rows: int,
+        rng: T.Optional[np.random.Generator] = None,
+        start_id: int = 1,
+    ) -> T.Iterator[pa.RecordBatch]:
+        """
+        Generate ``n_rows`` rows, as record batches of at most ``batch_size``.
+        """
+        if rng is None:
+            rng = np.random.default_rng()
+        for offset in range(0, n_rows, self.batch_size):
+            n = min(self.batch_size, n_rows - offset)
+            yield self.generate_batch(n_rows=n, rng=rng, start_id=start_id + offset)
+
+    def generate_table(
+        self,
+        n_rows: int,
+        rng: T.Optional[np.random.Generator] = None,
+        start_id: int = 1,
+    ) -> pa.Table:
+        """
+        Generate ``n_rows`` rows as one Arrow table.
+        """
+        batches = list(self.iter_batches(n_rows=n_rows, rng=rng, start_id=start_id))
+        if len(batches) == 0:
+            return self.schema.empty_table()
+        return pa.Table.from_batches(batches, schema=self.schema)
@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+
+"""
+Sampling based schema inference.
+
+Instead of crawling every object under a prefix, read a bounded random sample
+of them, and only a bounded number of bytes of each object:
+
+- JSON lines, CSV, TSV: the first ``sample_bytes`` bytes, the last partial
+  line is dropped. The range grows if the first line is longer.
+- Parquet: only the footer, the schema is in the file metadata.
+- JSON document: the whole object, skipped if larger than ``max_doc_size``.
+
+Empty objects are skipped. The keys and sizes come from the generation
+manifest when it exists, so no LIST call is needed.
+
+The sample schemas are merged with the permissive promotion of
+:func:`pyarrow.unify_schemas`, so nested types are merged field by field, for
+example a ``null`` in one file and a ``struct`` in another becomes the
+``struct``, and two structs become the union of their fields.
+
+Example::
+
+    >>> from learn_big_data_on_aws.dataset import get_dataset
+    >>> schema = get_dataset("ds_003_walmart_mongodb").infer_schema()
+"""
+
+import typing as T
+import io
+import json
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.json
+import pyarrow.parquet
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .base import Dataset
+    from .storage import BaseStorage
+
+KB = 1024
+
+#: the last 64KB of a Parquet file usually contains the whole footer
+PARQUET_FOOTER_READ_SIZE = 64 * KB
+
+
+def drop_partial_line(data: bytes, size: int) -> bytes:
+    """
+    If the range doesn't cover the whole object, the last line may be cut.
+    """
+    if len(data) < size:
+        return data
+    return data[: data.rfind(b"\n") + 1]
+
+
+def read_text_sample(
+    storage: "BaseStorage",
+    key: str,
+    size: int,
+    sample_bytes: int,
+    max_line_size: int,
+) -> bytes:
+    """
+    Read the complete lines in the first ``sample_bytes`` bytes. If the
+    first line is longer, keep doubling the range until it is complete.
+
+    :param size: the object size.
+    :return: the complete lines, empty if the first line is longer than
+        ``max_line_size``.
+    """
+    end = min(sample_bytes, size)
+    data = storage.read_range(key, 0, end)
+    while end < size and data.find(b"\n") == -1:
+        if end >= max_line_size:
+            return b""
+        new_end = min(end * 2, max_line_size, size)
+        data += storage.read_range(key, end, new_end)
+        end = new_end
+    if end >= size:
+        return data
+    return drop_partial_line(data, end)
+
+
+def infer_json_lines(data: bytes) -> pa.Schema:
+    return pyarrow.json.read_json(io.BytesIO(data)).schema
+
+
+def infer_json_doc(data: bytes) -> pa.Schema:
+    records = json.loads(data)
+    if isinstance(records, dict):
+        records = [records]
+    return pa.Table.from_pylist(records).schema
+
+
+def infer_csv(data: bytes, parse_options: pyarrow.csv.ParseOptions) -> pa.Schema:
+    return pyarrow.csv.read_csv(io.BytesIO(data), parse_options=parse_options).schema
+
+
+def read_parquet_footer(storage: "BaseStorage", key: str, size: int) -> bytes:
+    """
+    Read the footer of a Parquet file with one, at most two, range GETs. The
+    file layout ends with ``<metadata> <metadata length: 4 bytes> PAR1``.
+    """
+    start = max(0, size - PARQUET_FOOTER_READ_SIZE)
+    tail = storage.read_range(key, start, size)
+    if tail[-4:] != b"PAR1":
+        raise ValueError(f"{key!r} is not a Parquet file")
+    metadata_size = int.from_bytes(tail[-8:-4], "little")
+    if metadata_size + 8 > len(tail):
+        start = size - metadata_size - 8
+        tail = storage.read_range(key, start, size)
+    return tail[-(metadata_size + 8) :]
+
+
+def infer_parquet(storage: "BaseStorage", key: str, size: int) -> pa.Schema:
+    footer = read_parquet_footer(storage, key, size)
+    # a valid Parquet file with the footer only, the column chunks are not read
+    metadata = pyarrow.parquet.read_metadata(io.BytesIO(b"PAR1" + footer))
+    return metadata.schema.to_arrow_schema()
+
+
+def merge_schemas(schemas: T.List[pa.Schema]) -> pa.Schema:
+    """
+    Merge the sample schemas, nested types are merged recursively.
+    """
+    try:
+        return pa.unify_schemas(schemas, promote_options="permissive")
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"the sampled files have incompatible schemas: {e}")
+
+
+def list_objects(dataset: "Dataset") -> T.List[T.Tuple[str, T.Optional[int]]]:
+    """
+    The ``(key, size)`` of the files of the dataset. They come from the
+    generation manifest if it exists, otherwise from a LIST of the dataset
+    folder, the size is then unknown until a HEAD.
+    """
+    manifest = dataset.read_manifest()
+    if len(manifest.shards):
+        return sorted((shard.key, shard.size) for shard in manifest.shards.values())
+    return [
+        (key, None)
+        for key in dataset.storage.list_keys(dataset.s3path_loc.key)
+        if key.endswith(f".{dataset.writer.ext}")
+    ]
+
+
+def infer_schema(
+    dataset: "Dataset",
+    n_samples: int = 20,
+    sample_bytes: int = 256 * KB,
+    max_doc_size: int = 16 * 1024 * KB,
+    max_workers: int = 8,
+    seed: int = 0,
+) -> pa.Schema:
+    """
+    Infer the schema of the files under ``dataset.s3path_loc``.
+
+    :param n_samples: max number of objects to read.
+    :param sample_bytes: number of bytes to read from each text file, more if
+        the first line is longer.
+    :param max_doc_size: JSON documents and text files with a first line
+        larger than this are not sampled.
+    :param max_workers: number of concurrent range GETs.
+    :param seed: the sample is reproducible.
+    """
+    from .base import FormatEnum
+
+    storage = dataset.storage
+    objects = list_objects(dataset)
+    if len(objects) == 0:
+        raise ValueError(f"no file found under {dataset.s3path_loc.uri}")
+    if len(objects) > n_samples:
+        objects = random.Random(seed).sample(objects, n_samples)
+
+    def infer_one(obj: T.Tuple[str, T.Optional[int]]) -> T.Optional[pa.Schema]:
+        key, size = obj
+        if size is None:
+            size = storage.head(key).size
+        if size == 0:
+            return None
+        if dataset.format is FormatEnum.parquet:
+            return infer_parquet(storage, key, size)
+        if dataset.format is FormatEnum.json_single_doc:
+            if size > max_doc_size:
+                return None
+            return infer_json_doc(storage.read_range(key, 0, size))
+        data = read_text_sample(storage, key, size, sample_bytes, max_doc_size)
+        if len(data) == 0:
+            return None
+        if dataset.format is FormatEnum.json_multi_line:
+            return infer_json_lines(data)
+        return infer_csv(data, parse_options=dataset.writer.get_parse_options())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        schemas = [
+            schema
+            for schema in executor.map(infer_one, objects)
+            if schema is not None
+        ]
+    if len(schemas) == 0:
+        raise ValueError(
+            "all sampled files are empty or larger than "
+            f"{max_doc_size} bytes per document / line"
+        )
+    return merge_schemas(schemas)
@@ -0,0 +1,136 @@
+# -*- coding: utf-8 -*-
+
+"""
+Generation manifest.
+
+The manifest is a small JSON object stored next to the dataset folder (not
+inside it, so Athena never reads it as data). It records every completed
+shard, so :meth:`~learn_big_data_on_aws.dataset.base.Dataset.create_all`
+can skip the finished ones and checking completeness is one GET instead of
+a LIST of the whole prefix.
+
+Example::
+
+    {
+        "dataset": "ds_001_multi_line_json",
+        "n_files": 10,
+        "format": "json_multi_line",
+        "n_records_per_file": 50,
+        "shards": [
+            {
+                "nth_file": 1,
+                "key": "projects/learn_big_data_on_aws/dataset/ds_001_multi_line_json/001.json",
+                "size": 2163,
+                "n_rows": 50,
+                "md5": "6a3d4b...",
+                "etag": "\\"6a3d4b...\\""
+            },
+            ...
+        ]
+    }
+"""
+
+import typing as T
+import json
+import dataclasses
+
+
+@dataclasses.dataclass
+class ShardRecord:
+    """
+    One completed file of a dataset.
+
+    :param nth_file: the shard number, starts from 1.
+    :param key: the S3 key of the file.
+    :param size: file size in bytes.
+    :param n_rows: number of records in the file.
+    :param md5: md5 hex digest of the file content.
+    :param etag: the S3 ETag, for multipart upload it is not the md5.
+    """
+
+    nth_file: int
+    key: str
+    size: int
+    n_rows: int
+    md5: str
+    etag: T.Optional[str] = dataclasses.field(default=None)
+
+    def to_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_dict(cls, dct: dict) -> "ShardRecord":
+        return cls(**dct)
+
+
+@dataclasses.dataclass
+class Manifest:
+    """
+    :param dataset: dataset name.
+    :param n_files: expected number of files.
+    :param shards: completed shards, keyed by ``nth_file``.
+    :param format: the file format of the shards, None if not recorded.
+    :param n_records_per_file: the number of records per file of the shards,
+        None if not recorded.
+    """
+
+    dataset: str
+    n_files: int
+    shards: T.Dict[int, ShardRecord] = dataclasses.field(default_factory=dict)
+    format: T.Optional[str] = dataclasses.field(default=None)
+    n_records_per_file: T.Optional[int] = dataclasses.field(default=None)
+
+    def add(self, shard: ShardRecord):
+        self.shards[shard.nth_file] = shard
+
+    def remove(self, nth_file: int):
+        self.shards.pop(nth_file, None)
+
+    def missing(self) -> T.List[int]:
+        """
+        Shard numbers that are not completed yet.
+        """
+        return [
+            nth_file
+            for nth_file in range(1, 1 + self.n_files)
+            if nth_file not in self.shards
+        ]
+
+    def is_complete(self) -> bool:
+        return len(self.missing()) == 0
+
+    @property
+    def total_size(self) -> int:
+        return sum(shard.size for shard in self.shards.values())
+
+    @property
+    def total_rows(self) -> int:
+        return sum(shard.n_rows for shard in self.shards.values())
+
+    def to_json(self) -> str:
+        return json.dumps(
+            {
+                "dataset": self.dataset,
+                "n_files": self.n_files,
+                "format": self.format,
+                "n_records_per_file": self.n_records_per_file,
+                "shards": [
+                    self.shards[nth_file].to_dict()
+                    for nth_file in sorted(self.shards)
+                ],
+            },
+            indent=4,
+        )
+
+    @classmethod
+    def from_json(cls, s: str) -> "Manifest":
+        data = json.loads(s)
+        manifest = cls(
+            dataset=data["dataset"],
+            n_files=data["n_files"],
+            format=data.get("format"),
+            n_records_per_file=data.get("n_records_per_file"),
+        )
+        for dct in data["shards"]:
+            manifest.add(ShardRecord.from_dict(dct))
+        return manifest
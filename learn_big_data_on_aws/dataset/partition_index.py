@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+"""
+Partition index.
+
+A Parquet sidecar next to the dataset folder, one row per file::
+
+    year | month | day | nth_file | key                                  | size | n_rows
+    2022 | 01    | 01  | 1        | .../year=2022/month=01/day=01/001.json | 1234 | 56
+
+:meth:`~learn_big_data_on_aws.dataset.base.Dataset.create_all` rebuilds it
+from the generation manifest at each checkpoint, in one PUT. A file written
+by calling ``create_one`` directly adds its row to the index, with one GET
+and one PUT, see :func:`update_partition_index`, until the next rebuild,
+which only keeps the files of the manifest. A reader resolves a
+partition predicate to object keys with one GET, instead of LIST the
+``key=value`` folders.
+
+Example::
+
+    >>> from learn_big_data_on_aws.dataset import get_dataset
+    >>> ds = get_dataset("ds_003_walmart_mongodb")
+    >>> ds.find_keys(start_date=date(2022, 1, 1), end_date=date(2022, 1, 31))
+"""
+
+import typing as T
+import io
+
+import pyarrow as pa
+import pyarrow.parquet
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from .base import Dataset
+    from .manifest import Manifest, ShardRecord
+
+
+def get_index_schema(dataset: "Dataset") -> pa.Schema:
+    return pa.schema(
+        [(key, pa.string()) for key, _ in dataset.partition_keys]
+        + [
+            ("nth_file", pa.int64()),
+            ("key", pa.string()),
+            ("size", pa.int64()),
+            ("n_rows", pa.int64()),
+        ]
+    )
+
+
+def get_index_row(dataset: "Dataset", shard: "ShardRecord") -> dict:
+    row = dataset.get_partition_values(shard.nth_file)
+    row.update(
+        nth_file=shard.nth_file,
+        key=shard.key,
+        size=shard.size,
+        n_rows=shard.n_rows,
+    )
+    return row
+
+
+def build_partition_index(dataset: "Dataset", manifest: "Manifest") -> pa.Table:
+    rows = [
+        get_index_row(dataset, manifest.shards[nth_file])
+        for nth_file in sorted(manifest.shards)
+    ]
+    return pa.Table.from_pylist(rows, schema=get_index_schema(dataset))
+
+
+def put_partition_index(dataset: "Dataset", index: pa.Table):
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(index, buffer)
+    dataset.storage.write_bytes(dataset.s3path_partition_index.key, buffer.getvalue())
+
+
+def write_partition_index(dataset: "Dataset", manifest: "Manifest"):
+    put_partition_index(dataset, build_partition_index(dataset, manifest))
+
+
+def update_partition_index(dataset: "Dataset", shard: "ShardRecord"):
+    """
+    Add the row of one shard to the partition index, or replace it if the
+    file was created before. It is a read modify write, the concurrent
+    updates of the same index may lose rows, use
+    :meth:`~learn_big_data_on_aws.dataset.base.Dataset.create_all` to create
+    files in parallel.
+    """
+    rows = [
+        row
+        for row in read_partition_index(dataset).to_pylist()
+        if row["nth_file"] != shard.nth_file
+    ]
+    rows.append(get_index_row(dataset, shard))
+    rows.sort(key=lambda row: row["nth_file"])
+    put_partition_index(
+        dataset, pa.Table.from_pylist(rows, schema=get_index_schema(dataset))
+    )
+
+
+def read_partition_index(dataset: "Dataset") -> pa.Table:
+    """
+    Read the partition index, return an empty table if not exists.
+    """
+    key = dataset.s3path_partition_index.key
+    if dataset.storage.exists(key):
+        return pyarrow.parquet.read_table(
+            io.BytesIO(dataset.storage.read_bytes(key))
+        )
+    return get_index_schema(dataset).empty_table()
@@ -0,0 +1,310 @@
+# -*- coding: utf-8 -*-
+
+"""
+Streaming sinks, writable binary file objects that the dataset writers write
+into. All of them track the ``size``, ``md5`` and ``etag`` of the content.
+
+:class:`S3MultipartSink` streams to S3 with multipart upload. Bytes are
+buffered until there is one ``part_size`` worth of data, then the part is uploaded by
+a thread pool while the caller keeps serializing. At most
+``max_pending_parts`` parts are in flight, so the peak memory is about
+``(max_pending_parts + 1) * part_size`` no matter how large the file is.
+
+:class:`LocalFileSink` and :class:`MemorySink` are the local file system and
+in memory counterparts, used by the storage backends.
+
+Example::
+
+    >>> with S3MultipartSink(s3_client, bucket, key) as f:
+    ...     writer.write(batches, f)
+"""
+
+import typing as T
+import io
+import os
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from mypy_boto3_s3 import S3Client
+
+MB = 1024 * 1024
+#: S3 requires every part except the last one to be at least 5 MB
+MIN_PART_SIZE = 5 * MB
+
+
+class S3MultipartSink(io.RawIOBase):
+    """
+    :param s3_client: boto3 S3 client.
+    :param bucket: S3 bucket.
+    :param key: S3 key.
+    :param part_size: size of each part in bytes, at least 5 MB.
+    :param max_workers: number of threads uploading parts concurrently.
+    :param max_pending_parts: max number of parts buffered or being uploaded,
+        default equals to ``max_workers``.
+    :param extra_args: additional arguments for ``create_multipart_upload``
+        and ``put_object``, for example ``{"ContentType": "application/json"}``.
+    """
+
+    def __init__(
+        self,
+        s3_client: "S3Client",
+        bucket: str,
+        key: str,
+        part_size: int = 8 * MB,
+        max_workers: int = 4,
+        max_pending_parts: T.Optional[int] = None,
+        extra_args: T.Optional[dict] = None,
+    ):
+        if part_size < MIN_PART_SIZE:
+            raise ValueError(f"part_size has to be at least {MIN_PART_SIZE} bytes")
+        if max_pending_parts is None:
+            max_pending_parts = max_workers
+        if extra_args is None:
+            extra_args = dict()
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.max_workers = max_workers
+        self.extra_args = extra_args
+
+        self.size: int = 0
+        self.md5 = hashlib.md5()
+        self.etag: T.Optional[str] = None
+        self._buffer = bytearray()
+        self._upload_id: T.Optional[str] = None
+        self._part_number = 0
+        self._futures: T.List[Future] = list()
+        self._executor: T.Optional[ThreadPoolExecutor] = None
+        self._semaphore = threading.BoundedSemaphore(max_pending_parts)
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        n = len(b)
+        self._buffer.extend(b)
+        self.md5.update(b)
+        self.size += n
+        while len(self._buffer) >= self.part_size:
+            body = bytes(self._buffer[: self.part_size])
+            del self._buffer[: self.part_size]
+            self._submit_part(body)
+        return n
+
+    def _upload_part(self, part_number: int, body: bytes) -> dict:
+        try:
+            res = self.s3_client.upload_part(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+                PartNumber=part_number,
+                Body=body,
+            )
+            return {"PartNumber": part_number, "ETag": res["ETag"]}
+        finally:
+            self._semaphore.release()
+
+    def _submit_part(self, body: bytes):
+        if self._upload_id is None:
+            res = self.s3_client.create_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                **self.extra_args,
+            )
+            self._upload_id = res["UploadId"]
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        # fail fast, don't keep uploading if a previous part already failed
+        for future in self._futures:
+            if future.done() and future.exception() is not None:
+                raise future.exception()
+        # block until there is room, this is what bounds the memory
+        self._semaphore.acquire()
+        self._part_number += 1
+        future = self._executor.submit(self._upload_part, self._part_number, body)
+        self._futures.append(future)
+
+    def abort(self):
+        """
+        Abort the multipart upload, nothing will be visible in S3.
+        """
+        self._buffer.clear()
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        if self._upload_id is not None:
+            self.s3_client.abort_multipart_upload(
+                Bucket=self.bucket,
+                Key=self.key,
+                UploadId=self._upload_id,
+            )
+        super().close()
+
+    def close(self):
+        """
+        Upload the remaining buffer and complete the upload. A file smaller
+        than one part is uploaded with a single ``put_object``.
+        """
+        if self.closed:
+            return
+        try:
+            if self._upload_id is None:
+                res = self.s3_client.put_object(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    Body=bytes(self._buffer),
+                    **self.extra_args,
+                )
+            else:
+                if len(self._buffer):
+                    self._submit_part(bytes(self._buffer))
+                parts = [future.result() for future in self._futures]
+                res = self.s3_client.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=self.key,
+                    UploadId=self._upload_id,
+                    MultipartUpload={"Parts": parts},
+                )
+                self._executor.shutdown(wait=True)
+            self.etag = res["ETag"]
+            self._buffer.clear()
+        except Exception:
+            self.abort()
+            raise
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class LocalFileSink(io.RawIOBase):
+    """
+    Writable binary file object to a local file. It writes to a temp file
+    next to the target then renames it on close, so a reader never sees a
+    half written file. It tracks ``size`` and ``md5`` like
+    :class:`S3MultipartSink`, the ``etag`` is the md5 like a single part S3
+    object.
+
+    :param path: the target file path, parent folders are created.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.path_tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.size: int = 0
+        self.md5 = hashlib.md5()
+        self.etag: T.Optional[str] = None
+        self._f = open(self.path_tmp, "wb")
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        n = self._f.write(b)
+        self.md5.update(b)
+        self.size += n
+        return n
+
+    def abort(self):
+        self._f.close()
+        if os.path.exists(self.path_tmp):
+            os.remove(self.path_tmp)
+        super().close()
+
+    def close(self):
+        if self.closed:
+            return
+        self._f.close()
+        os.replace(self.path_tmp, self.path)
+        self.etag = f'"{self.md5.hexdigest()}"'
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class MemorySink(io.RawIOBase):
+    """
+    Writable binary file object that stores the content into a dict on close.
+
+    :param store: the ``{key: bytes}`` dict.
+    :param key: the key.
+    """
+
+    def __init__(self, store: T.Dict[str, bytes], key: str):
+        self.store = store
+        self.key = key
+        self.size: int = 0
+        self.md5 = hashlib.md5()
+        self.etag: T.Optional[str] = None
+        self._buffer = io.BytesIO()
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def write(self, b) -> int:
+        if self.closed:
+            raise ValueError("I/O operation on closed file.")
+        n = self._buffer.write(b)
+        self.md5.update(b)
+        self.size += n
+        return n
+
+    def abort(self):
+        super().close()
+
+    def close(self):
+        if self.closed:
+            return
+        self.store[self.key] = self._buffer.getvalue()
+        self.etag = f'"{self.md5.hexdigest()}"'
+        super().close()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+class CountingSink(io.RawIOBase):
+    """
+    Writable binary file object that discards the content and only counts
+    the bytes. It is used to measure the serialized size without memory or
+    I/O cost.
+    """
+
+    def __init__(self):
+        self.size: int = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.size
+
+    def write(self, b) -> int:
+        n = len(b)
+        self.size += n
+        return n
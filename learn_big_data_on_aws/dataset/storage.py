@@ -0,0 +1,275 @@
+# -*- coding: utf-8 -*-
+
+"""
+Storage backends of the datasets.
+
+A dataset only deals with S3 style keys, for example
+``projects/learn_big_data_on_aws/dataset/ds_003/year=2022/month=01/day=01/001.json``.
+The backend decides where the key lives:
+
+- :class:`S3Storage`: an object in an S3 bucket.
+- :class:`LocalStorage`: a file under a local directory, the directory tree
+  mirrors the S3 layout, including the hive partitions.
+- :class:`MemoryStorage`: an item in a dict, for tests and for profiling
+  generation and serialization without any I/O.
+"""
+
+import typing as T
+import os
+import shutil
+import dataclasses
+
+from botocore.exceptions import ClientError
+
+from .sink import MB, S3MultipartSink, LocalFileSink, MemorySink
+
+if T.TYPE_CHECKING:  # pragma: no cover
+    from mypy_boto3_s3 import S3Client
+
+Sink = T.Union[S3MultipartSink, LocalFileSink, MemorySink]
+
+
+@dataclasses.dataclass
+class ObjectInfo:
+    """
+    :param size: content length in bytes.
+    :param etag: the ETag, with the double quotes.
+    """
+
+    size: int
+    etag: T.Optional[str] = None
+
+
+class BaseStorage:
+    """
+    Base class of all storage backends.
+    """
+
+    def open_sink(self, key: str) -> Sink:  # pragma: no cover
+        """
+        Open a writable binary file object to the key.
+        """
+        raise NotImplementedError
+
+    def read_bytes(self, key: str) -> bytes:  # pragma: no cover
+        raise NotImplementedError
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:  # pragma: no cover
+        """
+        Read the bytes ``[start, end)``, it may return less if the object is
+        smaller than ``end``.
+        """
+        raise NotImplementedError
+
+    def write_bytes(self, key: str, data: bytes):
+        with self.open_sink(key) as f:
+            f.write(data)
+
+    def head(self, key: str) -> T.Optional[ObjectInfo]:  # pragma: no cover
+        """
+        Return the object info, or None if not exists.
+        """
+        raise NotImplementedError
+
+    def exists(self, key: str) -> bool:
+        return self.head(key) is not None
+
+    def list_keys(self, prefix: str) -> T.Iterator[str]:  # pragma: no cover
+        """
+        Yield the keys starting with the prefix, in lexicographic order.
+        """
+        raise NotImplementedError
+
+    def delete(self, key: str):  # pragma: no cover
+        raise NotImplementedError
+
+    def delete_keys(self, keys: T.Iterable[str]):
+        for key in keys:
+            self.delete(key)
+
+    def delete_prefix(self, prefix: str):
+        self.delete_keys(list(self.list_keys(prefix)))
+
+    def get_url(self, key: str) -> str:  # pragma: no cover
+        """
+        A human friendly url to inspect the object.
+        """
+        raise NotImplementedError
+
+
+class S3Storage(BaseStorage):
+    """
+    :param bucket: S3 bucket.
+    :param s3_client: boto3 S3 client, default is the lazily created client of
+        the configured profile, see :mod:`learn_big_data_on_aws.boto_ses`.
+    :param part_size: multipart upload part size in bytes.
+    :param max_upload_workers: number of parts uploaded concurrently per file.
+    """
+
+    def __init__(
+        self,
+        bucket: str,
+        s3_client: T.Optional["S3Client"] = None,
+        part_size: int = 8 * MB,
+        max_upload_workers: int = 4,
+    ):
+        self.bucket = bucket
+        self._s3_client = s3_client
+        self.part_size = part_size
+        self.max_upload_workers = max_upload_workers
+
+    @property
+    def s3_client(self) -> "S3Client":
+        if self._s3_client is None:
+            from ..boto_ses import get_s3_client
+
+            return get_s3_client()
+        return self._s3_client
+
+    def open_sink(self, key: str) -> S3MultipartSink:
+        return S3MultipartSink(
+            s3_client=self.s3_client,
+            bucket=self.bucket,
+            key=key,
+            part_size=self.part_size,
+            max_workers=self.max_upload_workers,
+        )
+
+    def read_bytes(self, key: str) -> bytes:
+        return self.s3_client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        res = self.s3_client.get_object(
+            Bucket=self.bucket,
+            Key=key,
+            Range=f"bytes={start}-{end - 1}",
+        )
+        return res["Body"].read()
+
+    def head(self, key: str) -> T.Optional[ObjectInfo]:
+        try:
+            res = self.s3_client.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return None
+            raise
+        return ObjectInfo(size=res["ContentLength"], etag=res["ETag"])
+
+    def list_keys(self, prefix: str) -> T.Iterator[str]:
+        paginator = self.s3_client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix):
+            for content in page.get("Contents", []):
+                yield content["Key"]
+
+    def delete(self, key: str):
+        self.s3_client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_keys(self, keys: T.Iterable[str]):
+        """
+        Delete in batches of 1000 keys, one API call per batch.
+        """
+        keys = list(keys)
+        for i in range(0, len(keys), 1000):
+            self.s3_client.delete_objects(
+                Bucket=self.bucket,
+                Delete={"Objects": [{"Key": key} for key in keys[i : i + 1000]]},
+            )
+
+    def get_url(self, key: str) -> str:
+        return (
+            f"https://console.aws.amazon.com/s3/object/{self.bucket}?prefix={key}"
+        )
+
+
+class LocalStorage(BaseStorage):
+    """
+    :param dir_root: the local directory that mirrors the bucket root.
+    """
+
+    def __init__(self, dir_root: str):
+        self.dir_root = str(dir_root)
+
+    def get_path(self, key: str) -> str:
+        return os.path.join(self.dir_root, *key.split("/"))
+
+    def open_sink(self, key: str) -> LocalFileSink:
+        return LocalFileSink(self.get_path(key))
+
+    def read_bytes(self, key: str) -> bytes:
+        with open(self.get_path(key), "rb") as f:
+            return f.read()
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        with open(self.get_path(key), "rb") as f:
+            f.seek(start)
+            return f.read(end - start)
+
+    def head(self, key: str) -> T.Optional[ObjectInfo]:
+        path = self.get_path(key)
+        if os.path.isfile(path) is False:
+            return None
+        return ObjectInfo(size=os.path.getsize(path))
+
+    def list_keys(self, prefix: str) -> T.Iterator[str]:
+        """
+        Yield the keys in lexicographic order, the same as S3. Only the
+        directory of the prefix is walked, not the whole root.
+        """
+        dir_prefix = prefix.rsplit("/", 1)[0] if "/" in prefix else ""
+        keys = list()
+        for dirpath, _, filenames in os.walk(self.get_path(dir_prefix)):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, self.dir_root).replace(os.sep, "/")
+                if key.startswith(prefix):
+                    keys.append(key)
+        yield from sorted(keys)
+
+    def delete(self, key: str):
+        path = self.get_path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_prefix(self, prefix: str):
+        if prefix.endswith("/") and os.path.isdir(self.get_path(prefix)):
+            shutil.rmtree(self.get_path(prefix))
+        else:
+            super().delete_prefix(prefix)
+
+    def get_url(self, key: str) -> str:
+        return f"file://{self.get_path(key)}"
+
+
+class MemoryStorage(BaseStorage):
+    """
+    Store the objects in a dict. The dict lives in the current process, so
+    it only works with the thread and serial executors.
+    """
+
+    def __init__(self):
+        self.store: T.Dict[str, bytes] = dict()
+
+    def open_sink(self, key: str) -> MemorySink:
+        return MemorySink(self.store, key)
+
+    def read_bytes(self, key: str) -> bytes:
+        return self.store[key]
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        return self.store[key][start:end]
+
+    def head(self, key: str) -> T.Optional[ObjectInfo]:
+        if key not in self.store:
+            return None
+        return ObjectInfo(size=len(self.store[key]))
+
+    def list_keys(self, prefix: str) -> T.Iterator[str]:
+        for key in sorted(self.store):
+            if key.startswith(prefix):
+                yield key
+
+    def delete(self, key: str):
+        self.store.pop(key, None)
+
+    def get_url(self, key: str) -> str:
+        return f"memory://{key}"
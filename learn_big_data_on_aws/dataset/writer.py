@@ -0,0 +1,326 @@
+# -*- coding: utf-8 -*-
+
+"""
+Serialize Arrow record batches into a binary file object.
+
+Each writer is a dataclass that carries its own format specific options, so
+the same logical dataset can be produced in every format::
+
+    >>> writer = ParquetWriter(row_group_size=100000, compression="zstd")
+    >>> with open("data.parquet", "wb") as f:
+    ...     n_rows = writer.write(batches, f, schema=schema)
+"""
+
+import typing as T
+import json
+import dataclasses
+from datetime import datetime, date
+
+import pyarrow as pa
+import pyarrow.csv
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+
+def json_default(obj):
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def peek_schema(
+    batches: T.Iterable[pa.RecordBatch],
+    schema: T.Optional[pa.Schema] = None,
+) -> T.Tuple[T.Iterator[pa.RecordBatch], pa.Schema]:
+    """
+    If schema is not given, take it from the first batch, and return an
+    iterator that still yields all batches.
+    """
+    iterator = iter(batches)
+    if schema is not None:
+        return iterator, schema
+    try:
+        first = next(iterator)
+    except StopIteration:
+        raise ValueError("cannot infer schema from an empty batch iterator")
+
+    def chain():
+        yield first
+        yield from iterator
+
+    return chain(), first.schema
+
+
+def encode_nested_schema(schema: pa.Schema) -> pa.Schema:
+    """
+    The schema with every nested column replaced by a string column.
+    """
+    return pa.schema(
+        [
+            field.with_type(pa.string()) if pa.types.is_nested(field.type) else field
+            for field in schema
+        ]
+    )
+
+
+def encode_nested(batch: pa.RecordBatch) -> pa.RecordBatch:
+    """
+    JSON encode the struct, list and map columns, the flat formats can't
+    store them otherwise.
+    """
+    if not any(pa.types.is_nested(field.type) for field in batch.schema):
+        return batch
+    arrays = list()
+    for field, array in zip(batch.schema, batch.columns):
+        if pa.types.is_nested(field.type):
+            array = pa.array(
+                [
+                    None if value is None else json.dumps(value, default=json_default)
+                    for value in array.to_pylist()
+                ],
+                type=pa.string(),
+            )
+        arrays.append(array)
+    return pa.RecordBatch.from_arrays(arrays, schema=encode_nested_schema(batch.schema))
+
+
+def escape_strings(batch: pa.RecordBatch, escape_char: str) -> pa.RecordBatch:
+    """
+    Double the escape character in the string columns, a reader that drops
+    the escape character then reads the original value.
+    """
+    arrays = [
+        pc.replace_substring(array, escape_char, escape_char * 2)
+        if pa.types.is_string(field.type)
+        else array
+        for field, array in zip(batch.schema, batch.columns)
+    ]
+    return pa.RecordBatch.from_arrays(arrays, schema=batch.schema)
+
+
+def decode_nested(table: pa.Table, schema: pa.Schema) -> pa.Table:
+    """
+    The reverse of :func:`encode_nested`, parse the JSON string columns back
+    to the nested types of ``schema``. A null is written as an empty field in
+    CSV, so an empty string is read as null.
+    """
+    arrays = list()
+    for field in schema:
+        array = table.column(field.name)
+        if pa.types.is_nested(field.type):
+            array = pa.array(
+                [
+                    json.loads(value) if value else None
+                    for value in array.to_pylist()
+                ],
+                type=field.type,
+            )
+        arrays.append(array)
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+@dataclasses.dataclass
+class BaseWriter:
+    """
+    Base class of all writers.
+    """
+
+    @property
+    def ext(self) -> str:  # pragma: no cover
+        """
+        File extension without the dot.
+        """
+        raise NotImplementedError
+
+    def get_file_schema(self, schema: pa.Schema) -> pa.Schema:
+        """
+        The schema of the data in the file, for example what a reader or the
+        Glue catalog sees. It is the record schema unless the format can't
+        store some of the types.
+        """
+        return schema
+
+    def write(
+        self,
+        batches: T.Iterable[pa.RecordBatch],
+        f: T.BinaryIO,
+        schema: T.Optional[pa.Schema] = None,
+    ) -> int:  # pragma: no cover
+        """
+        Write all batches to the binary file object.
+
+        :return: number of rows written.
+        """
+        raise NotImplementedError
+
+
+@dataclasses.dataclass
+class JsonLinesWriter(BaseWriter):
+    """
+    One JSON object per line, a.k.a. multi line JSON, this is what Athena and
+    Glue can read.
+    """
+
+    @property
+    def ext(self) -> str:
+        return "json"
+
+    def write(self, batches, f, schema=None) -> int:
+        n_rows = 0
+        for batch in batches:
+            rows = batch.to_pylist()
+            lines = [json.dumps(row, default=json_default) for row in rows]
+            if len(lines):
+                f.write(("\n".join(lines) + "\n").encode("utf-8"))
+            n_rows += len(rows)
+        return n_rows
+
+
+@dataclasses.dataclass
+class JsonDocWriter(BaseWriter):
+    """
+    One pretty formatted JSON document per file. If there is exactly one row,
+    the document is the row object, otherwise it is an array of rows.
+
+    :param indent: json indent.
+    """
+
+    indent: T.Optional[int] = dataclasses.field(default=4)
+
+    @property
+    def ext(self) -> str:
+        return "json"
+
+    def write(self, batches, f, schema=None) -> int:
+        rows = list()
+        for batch in batches:
+            rows.extend(batch.to_pylist())
+        data = rows[0] if len(rows) == 1 else rows
+        f.write(
+            json.dumps(data, indent=self.indent, default=json_default).encode("utf-8")
+        )
+        return len(rows)
+
+
+@dataclasses.dataclass
+class CsvWriter(BaseWriter):
+    """
+    Delimiter separated values. CSV has no nested type, the struct, list and
+    map columns are written as JSON strings, see :func:`encode_nested`.
+
+    :param delimiter: field delimiter.
+    :param quoting: one of ``"needed"``, ``"all_valid"``, ``"none"``,
+        see :class:`pyarrow.csv.WriteOptions`.
+    :param include_header: write the header line or not.
+    :param escape_char: the escape character of the readers, it is doubled
+        in the string values, see :func:`escape_strings`. The Athena
+        OpenCSVSerde escape character is the backslash, it drops a single
+        one, and the JSON encoded columns have many. None to write plain
+        CSV, it can't be cataloged then.
+    """
+
+    delimiter: str = dataclasses.field(default=",")
+    quoting: str = dataclasses.field(default="needed")
+    include_header: bool = dataclasses.field(default=True)
+    escape_char: T.Optional[str] = dataclasses.field(default="\\")
+
+    @property
+    def ext(self) -> str:
+        return "csv"
+
+    def get_file_schema(self, schema: pa.Schema) -> pa.Schema:
+        return encode_nested_schema(schema)
+
+    def get_parse_options(self) -> pyarrow.csv.ParseOptions:
+        """
+        The options to read the files back with :func:`pyarrow.csv.read_csv`.
+        """
+        return pyarrow.csv.ParseOptions(
+            delimiter=self.delimiter,
+            escape_char=False if self.escape_char is None else self.escape_char,
+        )
+
+    def write(self, batches, f, schema=None) -> int:
+        batches, schema = peek_schema(batches, schema)
+        options = pyarrow.csv.WriteOptions(
+            include_header=self.include_header,
+            delimiter=self.delimiter,
+            quoting_style=self.quoting,
+        )
+        n_rows = 0
+        with pyarrow.csv.CSVWriter(
+            f, self.get_file_schema(schema), write_options=options
+        ) as writer:
+            for batch in batches:
+                n_rows += batch.num_rows
+                batch = encode_nested(batch)
+                if self.escape_char is not None:
+                    batch = escape_strings(batch, self.escape_char)
+                writer.write_batch(batch)
+        return n_rows
+
+
+@dataclasses.dataclass
+class TsvWriter(CsvWriter):
+    """
+    Tab separated values.
+    """
+
+    delimiter: str = dataclasses.field(default="\t")
+
+    @property
+    def ext(self) -> str:
+        return "tsv"
+
+
+@dataclasses.dataclass
+class ParquetWriter(BaseWriter):
+    """
+    Parquet file. Incoming batches are buffered until there are
+    ``row_group_size`` rows, so the row group size doesn't depend on the
+    generator batch size.
+
+    :param row_group_size: number of rows per row group.
+    :param compression: compression codec, e.g. ``"snappy"``, ``"zstd"``,
+        ``"gzip"``, ``"none"``.
+    :param use_dictionary: enable dictionary encoding, can also be a list of
+        column names.
+    """
+
+    row_group_size: int = dataclasses.field(default=1000000)
+    compression: str = dataclasses.field(default="snappy")
+    use_dictionary: T.Union[bool, T.List[str]] = dataclasses.field(default=True)
+
+    @property
+    def ext(self) -> str:
+        return "parquet"
+
+    def write(self, batches, f, schema=None) -> int:
+        batches, schema = peek_schema(batches, schema)
+        n_rows = 0
+        buffer: T.List[pa.RecordBatch] = list()
+        n_buffered = 0
+        with pq.ParquetWriter(
+            f,
+            schema,
+            compression=self.compression,
+            use_dictionary=self.use_dictionary,
+        ) as writer:
+            for batch in batches:
+                buffer.append(batch)
+                n_buffered += batch.num_rows
+                if n_buffered >= self.row_group_size:
+                    table = pa.Table.from_batches(buffer, schema=schema)
+                    n_full = n_buffered - n_buffered % self.row_group_size
+                    writer.write_table(
+                        table.slice(0, n_full),
+                        row_group_size=self.row_group_size,
+                    )
+                    n_rows += n_full
+                    rest = table.slice(n_full)
+                    buffer, n_buffered = rest.to_batches(), rest.num_rows
+            if n_buffered:
+                table = pa.Table.from_batches(buffer, schema=schema)
+                writer.write_table(table, row_group_size=self.row_group_size)
+                n_rows += n_buffered
+        return n_rows
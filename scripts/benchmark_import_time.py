@@ -0,0 +1,47 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measure how long it takes to import the package in a fresh interpreter, and
+how long the first ``account_id`` access takes with a cold and a warm cache.
+"""
+
+import sys
+import subprocess
+
+from learn_big_data_on_aws.boto_ses import path_account_id_cache
+
+n_run = 5
+
+
+def measure(code: str, cold: bool = False) -> float:
+    """
+    Run the code in a fresh interpreter ``n_run`` times, return the best
+    elapsed time in milliseconds.
+
+    :param cold: remove the account id cache before each run.
+    """
+    timer = (
+        "import time; st = time.perf_counter(); "
+        f"{code}; "
+        "print((time.perf_counter() - st) * 1000)"
+    )
+    results = list()
+    for _ in range(n_run):
+        if cold:
+            path_account_id_cache.unlink(missing_ok=True)
+        res = subprocess.run(
+            [sys.executable, "-c", timer],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        results.append(float(res.stdout.strip().splitlines()[-1]))
+    return min(results)
+
+
+print(f"import boto_ses: {measure('import learn_big_data_on_aws.boto_ses'):.1f} ms")
+print(f"import config: {measure('import learn_big_data_on_aws.config'):.1f} ms")
+
+code = "from learn_big_data_on_aws.boto_ses import account_id"
+print(f"account_id, cold cache: {measure(code, cold=True):.1f} ms")
+print(f"account_id, warm cache: {measure(code):.1f} ms")
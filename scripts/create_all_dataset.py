@@ -2,4 +2,4 @@
 
 from learn_big_data_on_aws.dataset import create_all_dataset
 
-create_all_deataset()
+create_all_dataset()
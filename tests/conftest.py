@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+The fixtures shared by the dataset tests, the datasets run without AWS.
+"""
+
+import typing as T
+import importlib
+
+import pytest
+from s3pathlib import S3Path
+
+from learn_big_data_on_aws.config import config
+from learn_big_data_on_aws.dataset.base import Dataset, FormatEnum
+from learn_big_data_on_aws.dataset.storage import (
+    BaseStorage,
+    LocalStorage,
+    MemoryStorage,
+)
+
+s3dir_dataset = S3Path("s3://bucket/projects/learn_big_data_on_aws/dataset/")
+
+
+class NoListMemoryStorage(MemoryStorage):
+    """
+    Fail on LIST, to check that a code path only reads the manifest or the
+    partition index.
+    """
+
+    def list_keys(self, prefix: str):
+        raise AssertionError("LIST is not allowed")
+
+
+class CountingMemoryStorage(MemoryStorage):
+    """
+    Count the bytes read by range GET.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.n_bytes_read = 0
+
+    def read_range(self, key: str, start: int, end: int) -> bytes:
+        data = super().read_range(key, start, end)
+        self.n_bytes_read += len(data)
+        return data
+
+
+@pytest.fixture
+def offline_config(monkeypatch):
+    # cached properties live in the instance __dict__, no AWS call needed
+    monkeypatch.setitem(config.__dict__, "s3path_dataset_prefix", s3dir_dataset)
+
+
+@pytest.fixture
+def make_storage(tmp_path) -> T.Callable[[str], BaseStorage]:
+    """
+    Create a storage backend by name, ``"memory"``, ``"no_list"``,
+    ``"counting"`` or ``"local"``.
+    """
+
+    def make(storage: str = "memory") -> BaseStorage:
+        if storage == "local":
+            return LocalStorage(dir_root=str(tmp_path))
+        return {
+            "memory": MemoryStorage,
+            "no_list": NoListMemoryStorage,
+            "counting": CountingMemoryStorage,
+        }[storage]()
+
+    return make
+
+
+@pytest.fixture
+def make_dataset(make_storage) -> T.Callable[..., Dataset]:
+    """
+    Create a dataset of one of the dataset modules, in the test data lake
+    folder, for example::
+
+        >>> ds = make_dataset("ds001", n_files=3, storage="local")
+    """
+
+    def make(
+        module: str = "ds003",
+        name: T.Optional[str] = None,
+        format: FormatEnum = FormatEnum.json_multi_line,
+        n_files: int = 5,
+        n_records_per_file: int = 0,
+        storage: str = "memory",
+        **kwargs,
+    ) -> Dataset:
+        module = importlib.import_module(f"learn_big_data_on_aws.dataset.{module}")
+        if name is None:
+            name = f"{module.dataset.name}_test"
+        return module.Dataset(
+            name=name,
+            format=format,
+            datalake_s3_loc=s3dir_dataset,
+            n_files=n_files,
+            n_records_per_file=n_records_per_file,
+            storage=make_storage(storage),
+            **kwargs,
+        )
+
+    return make
+
+
+@pytest.fixture
+def ds003(request, offline_config, make_dataset) -> Dataset:
+    """
+    A ds003 dataset, the arguments of :func:`make_dataset` can be changed
+    with an indirect parametrization::
+
+        @pytest.mark.parametrize("ds003", [dict(n_files=40)], indirect=True)
+    """
+    kwargs = dict(module="ds003")
+    kwargs.update(getattr(request, "param", dict()))
+    return make_dataset(**kwargs)
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import uuid
+
+import boto3
+import pyarrow as pa
+import pytest
+from moto import mock_aws
+from s3pathlib import S3Path
+
+from learn_big_data_on_aws import athena
+from learn_big_data_on_aws.config import config
+
+
+class FakeAthenaClient:
+    """
+    Every query succeeds after ``n_poll`` polls and writes a CSV result
+    to the S3 output location.
+    """
+
+    def __init__(self, s3_client, n_poll: int = 2):
+        self.s3_client = s3_client
+        self.n_poll = n_poll
+        self.queries = dict()
+        self.max_running = 0
+
+    def start_query_execution(self, QueryString, QueryExecutionContext, ResultConfiguration):
+        query_execution_id = str(uuid.uuid4())
+        output_location = f"{ResultConfiguration['OutputLocation']}{query_execution_id}.csv"
+        self.queries[query_execution_id] = dict(
+            sql=QueryString, output_location=output_location, n_poll=0
+        )
+        running = [q for q in self.queries.values() if q["n_poll"] < self.n_poll]
+        self.max_running = max(self.max_running, len(running))
+        return {"QueryExecutionId": query_execution_id}
+
+    def batch_get_query_execution(self, QueryExecutionIds):
+        assert len(QueryExecutionIds) <= 50
+        executions = list()
+        for query_execution_id in QueryExecutionIds:
+            query = self.queries[query_execution_id]
+            query["n_poll"] += 1
+            state = "SUCCEEDED" if query["n_poll"] >= self.n_poll else "RUNNING"
+            if state == "SUCCEEDED":
+                bucket, key = query["output_location"].split("/", 3)[2:]
+                n = int(query["sql"].split()[-1])
+                body = '"id","name"\n' + "".join(
+                    f'"{i}","{"" if i % 2 else f"n{i}"}"\n' for i in range(n)
+                )
+                self.s3_client.put_object(Bucket=bucket, Key=key, Body=body.encode("utf-8"))
+            executions.append(
+                {
+                    "QueryExecutionId": query_execution_id,
+                    "Status": {"State": state},
+                    "ResultConfiguration": {"OutputLocation": query["output_location"]},
+                }
+            )
+        return {"QueryExecutions": executions}
+
+    def get_query_results(self, QueryExecutionId, MaxResults):
+        return {
+            "ResultSet": {
+                "ResultSetMetadata": {
+                    "ColumnInfo": [
+                        {"Name": "id", "Type": "bigint"},
+                        {"Name": "name", "Type": "varchar"},
+                    ]
+                }
+            }
+        }
+
+
+@pytest.fixture
+def clients():
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket="my-bucket")
+        yield FakeAthenaClient(s3_client), s3_client
+
+
+def test_run_queries_and_stream(clients):
+    athena_client, s3_client = clients
+    sqls = [f"SELECT * FROM t LIMIT {i}" for i in range(1, 61)]
+    executions = athena.run_queries(
+        sqls,
+        athena_client=athena_client,
+        database="db",
+        output_location="s3://my-bucket/athena/results/",
+        max_concurrency=20,
+        delay=0.001,
+    )
+    assert [execution.sql for execution in executions] == sqls
+    assert all(execution.is_succeeded for execution in executions)
+    assert athena_client.max_running <= 20
+
+    batches = list(
+        athena.iter_record_batches(
+            executions[-1],
+            athena_client=athena_client,
+            s3_client=s3_client,
+            block_size=64,
+        )
+    )
+    assert len(batches) > 1
+    assert sum(batch.num_rows for batch in batches) == 60
+    assert str(batches[0].schema.field("id").type) == "int64"
+    df = next(
+        athena.iter_pandas_chunks(
+            executions[-1], athena_client=athena_client, s3_client=s3_client
+        )
+    )
+    assert df["name"].tolist()[:2] == ["n0", ""]
+
+
+class FakeGlueClient:
+    class exceptions:
+        class EntityNotFoundException(Exception):
+            pass
+
+    def __init__(self):
+        self.version = "1"
+
+    def get_table(self, DatabaseName, Name):
+        return {"Table": {"VersionId": self.version}}
+
+
+def test_normalize_sql():
+    sql = """
+    -- comment
+    SELECT *  FROM  "db"."t" /* block */ WHERE name = 'Alice' ;
+    """
+    assert athena.normalize_sql(sql) == (
+        "select * from \"db\".\"t\" where name = 'Alice'"
+    )
+    assert athena.find_tables(
+        "select * from t1 a join db2.t2 b on a.id = b.id", "db"
+    ) == [("db", "t1"), ("db2", "t2")]
+
+
+def test_query_cache(tmp_path):
+    glue_client = FakeGlueClient()
+    cache = athena.QueryCache(
+        dir_root=tmp_path,
+        max_size=10 * 1024,
+        glue_client=glue_client,
+        version_check_interval=0,
+    )
+    table = pa.table({"id": list(range(100))})
+    assert cache.get("SELECT * FROM t", database="db") is None
+    cache.put("SELECT * FROM t", table, database="db")
+    assert cache.get("select *\nfrom t;", database="db").equals(table)
+    assert cache.stats == {"hit": 1, "miss": 1}
+
+    # new table version
+    glue_client.version = "2"
+    assert cache.get("SELECT * FROM t", database="db") is None
+
+    # ttl
+    cache.put("SELECT * FROM t", table, database="db")
+    cache.ttl = -1
+    assert cache.get("SELECT * FROM t", database="db") is None
+    cache.ttl = 3600
+
+    # lru
+    for i in range(20):
+        cache.put(f"SELECT * FROM t LIMIT {i}", table, database="db")
+    assert sum(p.stat().st_size for p in tmp_path.glob("*.parquet")) <= 10 * 1024
+    assert cache.get("SELECT * FROM t LIMIT 19", database="db") is not None
+    assert cache.get("SELECT * FROM t LIMIT 0", database="db") is None
+
+
+def test_is_read_only():
+    assert athena.is_read_only("SELECT * FROM t")
+    assert athena.is_read_only("-- comment\n with a AS (SELECT 1) SELECT * FROM a")
+    assert athena.is_read_only("CREATE TABLE t2 AS SELECT * FROM t") is False
+    assert athena.is_read_only("INSERT INTO t2 SELECT * FROM t") is False
+    assert athena.is_read_only("MSCK REPAIR TABLE t") is False
+    assert athena.is_read_only("selection") is False
+
+
+def test_read_sql_cache(clients, tmp_path, monkeypatch):
+    monkeypatch.setitem(
+        config.__dict__,
+        "s3dir_athena_result",
+        S3Path("s3://my-bucket/athena/results/"),
+    )
+    athena_client, s3_client = clients
+    cache = athena.QueryCache(dir_root=tmp_path, glue_client=FakeGlueClient())
+    kwargs = dict(
+        athena_client=athena_client,
+        s3_client=s3_client,
+        database="db",
+        cache=cache,
+    )
+
+    for _ in range(2):
+        table = athena.read_sql("SELECT * FROM t LIMIT 3", **kwargs)
+        assert table.num_rows == 3
+    assert len(athena_client.queries) == 1
+    assert cache.stats == {"hit": 1, "miss": 1}
+
+    # a statement with side effects is never cached
+    for _ in range(2):
+        athena.read_sql("CREATE TABLE t2 AS SELECT * FROM t LIMIT 3", **kwargs)
+    assert len(athena_client.queries) == 3
+    assert len(list(tmp_path.glob("*.parquet"))) == 1
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from learn_big_data_on_aws import boto_ses
+from learn_big_data_on_aws.config import config
+
+
+class FakeStsClient:
+    def __init__(self):
+        self.n_call = 0
+
+    def get_caller_identity(self):
+        self.n_call += 1
+        return {"Account": "111122223333"}
+
+
+@pytest.fixture
+def fake_sts(tmp_path, monkeypatch):
+    sts_client = FakeStsClient()
+    monkeypatch.setattr(
+        boto_ses, "path_account_id_cache", tmp_path.joinpath("account_id.json")
+    )
+    monkeypatch.setattr(boto_ses, "get_sts_client", lambda: sts_client)
+    boto_ses.get_account_id.cache_clear()
+    yield sts_client
+    boto_ses.get_account_id.cache_clear()
+
+
+def run_python(code: str):
+    # a fresh interpreter, the result doesn't depend on the other tests
+    dir_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=dir_project_root)
+
+
+def test_import_is_lazy():
+    run_python(
+        "import sys; "
+        "import learn_big_data_on_aws.boto_ses; "
+        "assert 'boto3' not in sys.modules"
+    )
+
+
+def test_import_dataset_is_lazy():
+    run_python(
+        "from learn_big_data_on_aws.config import config; "
+        "from learn_big_data_on_aws.boto_ses import get_boto_ses; "
+        "from learn_big_data_on_aws.dataset import ds001, ds002, ds003; "
+        "assert get_boto_ses.cache_info().currsize == 0; "
+        "assert 's3path_dataset_prefix' not in config.__dict__"
+    )
+
+
+def test_get_account_id(fake_sts):
+    assert boto_ses.account_id == "111122223333"
+    assert fake_sts.n_call == 1
+    data = json.loads(boto_ses.path_account_id_cache.read_text())
+    assert data == {config.aws_profile: "111122223333"}
+
+    # the second process reads the cache, no STS call
+    boto_ses.get_account_id.cache_clear()
+    assert boto_ses.get_account_id() == "111122223333"
+    assert fake_sts.n_call == 1
+
+
+def test_unknown_attribute():
+    with pytest.raises(AttributeError):
+        boto_ses.not_exists
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+
+import typing as T
+import io
+import csv
+
+import boto3
+import pyarrow as pa
+import pytest
+from moto import mock_aws
+
+from learn_big_data_on_aws.dataset.base import FormatEnum, get_writer
+from learn_big_data_on_aws.dataset.writer import CsvWriter, encode_nested
+from learn_big_data_on_aws.dataset import catalog
+
+
+pytestmark = pytest.mark.parametrize("ds003", [dict(n_files=250)], indirect=True)
+
+
+@pytest.fixture
+def glue_client():
+    with mock_aws():
+        yield boto3.client("glue", region_name="us-east-1")
+
+
+def test_table_input(ds003):
+    table_input = catalog.get_table_input(ds003)
+    columns = {
+        column["Name"]: column["Type"]
+        for column in table_input["StorageDescriptor"]["Columns"]
+    }
+    assert columns["create_time"] == "timestamp"
+    assert columns["items"].startswith("array<struct<item_id:bigint,")
+    assert [key["Name"] for key in table_input["PartitionKeys"]] == [
+        "year",
+        "month",
+        "day",
+    ]
+
+
+def test_csv_table_input(ds003):
+    ds003.format = FormatEnum.csv
+    ds003.writer = CsvWriter()
+    table_input = catalog.get_table_input(ds003)
+    columns = {
+        column["Name"]: column["Type"]
+        for column in table_input["StorageDescriptor"]["Columns"]
+    }
+    # the SerDe can't parse the ISO timestamp strings nor the nested types
+    assert columns["create_time"] == "string"
+    assert columns["items"] == "string"
+
+    ds003.writer = CsvWriter(escape_char=None)
+    with pytest.raises(ValueError):
+        catalog.get_table_input(ds003)
+
+
+def read_open_csv(data: bytes, parameters: dict) -> T.List[T.List[str]]:
+    """
+    Parse like the OpenCSVSerde, the escape character is dropped and makes
+    the next character literal.
+    """
+    reader = csv.reader(
+        io.StringIO(data.decode("utf-8")),
+        delimiter=parameters["separatorChar"],
+        quotechar=parameters["quoteChar"],
+        escapechar=parameters["escapeChar"],
+        doublequote=True,
+    )
+    return list(reader)
+
+
+@pytest.mark.parametrize("format", [FormatEnum.csv, FormatEnum.tsv])
+def test_csv_serde_round_trip(ds003, format):
+    ds003.format = format
+    ds003.writer = get_writer(format)
+    shard = ds003.create_one(nth_file=1)
+    parameters = catalog.get_storage_format(ds003)["SerdeInfo"]["Parameters"]
+    header, *lines = read_open_csv(ds003.storage.read_bytes(shard.key), parameters)
+
+    file_schema = ds003.writer.get_file_schema(ds003.schema)
+    expected = pa.Table.from_batches(
+        [encode_nested(batch) for batch in ds003.iter_batches(1)],
+        schema=file_schema,
+    )
+    assert header == file_schema.names
+    assert len(lines) == expected.num_rows
+    n_backslash = 0
+    for field in file_schema:
+        if field.type != pa.string():
+            continue
+        values = expected.column(field.name).to_pylist()
+        column = [line[header.index(field.name)] for line in lines]
+        assert column == ["" if value is None else value for value in values]
+        n_backslash += sum("\\" in value for value in column)
+    # the JSON encoded addresses have escaped new lines
+    assert n_backslash > 0
+
+
+def test_sync_catalog(ds003, glue_client):
+    assert ds003.create_catalog(database="db", glue_client=glue_client) == 250
+    # idempotent
+    assert ds003.create_catalog(database="db", glue_client=glue_client) == 0
+
+    paginator = glue_client.get_paginator("get_partitions")
+    partitions = [
+        partition
+        for page in paginator.paginate(DatabaseName="db", TableName=ds003.name)
+        for partition in page["Partitions"]
+    ]
+    assert len(partitions) == 250
+    partition = [p for p in partitions if p["Values"] == ["2022", "01", "02"]][0]
+    assert partition["StorageDescriptor"]["Location"] == ds003.get_s3path(2).parent.uri
+
+
+def test_sync_catalog_projection(ds003, glue_client):
+    assert ds003.create_catalog(
+        database="db", glue_client=glue_client, projection=True
+    ) == 0
+    parameters = glue_client.get_table(DatabaseName="db", Name=ds003.name)[
+        "Table"
+    ]["Parameters"]
+    assert parameters["projection.enabled"] == "true"
+    assert parameters["projection.year.range"] == "2022,2022"
+    assert parameters["projection.month.digits"] == "2"
+    assert parameters["storage.location.template"].endswith(
+        "/year=${year}/month=${month}/day=${day}/"
+    )
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
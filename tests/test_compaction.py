@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+import io
+import dataclasses
+
+import pyarrow.parquet as pq
+import pytest
+from s3pathlib import S3Path
+
+from learn_big_data_on_aws.dataset.base import ExecutorEnum
+from learn_big_data_on_aws.dataset.compaction import read_compaction_manifest
+
+
+def test_compact(ds003):
+    ds003.create_all(executor=ExecutorEnum.serial)
+    # more small files in one partition
+    for nth_file in [1, 2, 3]:
+        key = ds003.get_s3path(1).key.replace("001.json", f"00{nth_file + 1}.json")
+        data = ds003.storage.read_bytes(ds003.get_s3path(nth_file).key)
+        ds003.storage.write_bytes(key, data)
+
+    manifest = ds003.compact(row_group_nbytes=1, target_file_size=1, delete_source=True)
+    assert manifest.n_files_before == 8
+    # one row group per file, one file per source file
+    assert manifest.n_files_after == 8
+    assert read_compaction_manifest(ds003) == manifest
+
+    keys = list(ds003.storage.list_keys(S3Path(manifest.location).key))
+    assert len(keys) == 8
+    assert all("/year=2022/month=01/day=" in key for key in keys)
+    assert list(ds003.storage.list_keys(ds003.s3path_loc.key)) == []
+
+    # the generation manifest and the partition index describe deleted files
+    assert ds003.storage.exists(ds003.s3path_manifest.key) is False
+    assert ds003.storage.exists(ds003.s3path_partition_index.key) is False
+
+    # nothing new to compact, no swap, the compacted data is kept
+    assert ds003.compact(delete_source=True) == manifest
+    assert read_compaction_manifest(ds003) == manifest
+    assert len(list(ds003.storage.list_keys(S3Path(manifest.location).key))) == 8
+
+
+def test_compact_carry_forward(ds003):
+    ds003.create_all(executor=ExecutorEnum.serial)
+    n_rows = ds003.read_manifest().total_rows
+    manifest = ds003.compact(delete_source=True)
+    assert manifest.source_deleted is True
+
+    # new source files arrive, only two days this time
+    ds003.n_files = 2
+    ds003.create_all(executor=ExecutorEnum.serial)
+    n_rows += ds003.read_manifest().total_rows
+    manifest_v2 = ds003.compact(delete_source=True)
+    assert manifest_v2.location != manifest.location
+    assert manifest_v2.n_files_before == 2 + 5
+    # one file per partition, the previous version is read back
+    assert manifest_v2.n_files_after == 5
+    assert sum(shard.n_rows for shard in manifest_v2.shards) == n_rows
+
+    # the previous version is deleted only because the new one covers it
+    assert list(ds003.storage.list_keys(S3Path(manifest.location).key)) == []
+    for shard in manifest_v2.shards:
+        assert ds003.verify_shard(shard)
+
+
+def test_compact_keep_then_delete_source(ds003):
+    def total_rows(manifest):
+        return sum(shard.n_rows for shard in manifest.shards)
+
+    ds003.create_all(executor=ExecutorEnum.serial)
+    n_rows = ds003.read_manifest().total_rows
+    v1 = ds003.compact(delete_source=True)
+    assert total_rows(v1) == n_rows
+
+    # a new batch, compacted with the source kept
+    ds003.create_all(executor=ExecutorEnum.serial)
+    v2 = ds003.compact(delete_source=False)
+    assert total_rows(v2) == 2 * n_rows
+    # v2 is the only copy of the first batch
+    assert v2.source_deleted is True
+    assert len(v2.kept_sources) == 5
+
+    # the kept source files are in v2 already, they are not read again
+    assert ds003.compact(delete_source=False) == v2
+    v3 = ds003.compact(delete_source=True)
+    assert v3 == dataclasses.replace(v2, kept_sources={})
+    assert read_compaction_manifest(ds003) == v3
+    assert list(ds003.storage.list_keys(ds003.s3path_loc.key)) == []
+    keys = list(ds003.storage.list_keys(S3Path(v3.location).key))
+    assert len(keys) == v3.n_files_after
+
+    # a new batch again, the carried data is kept
+    ds003.create_all(executor=ExecutorEnum.serial)
+    v4 = ds003.compact(delete_source=True)
+    assert total_rows(v4) == 3 * n_rows
+    assert v4.kept_sources == {}
+
+
+def test_compact_target_size(ds003):
+    ds003.create_all(executor=ExecutorEnum.serial)
+    manifest = ds003.compact()
+    # one file per partition
+    assert manifest.n_files_after == 5
+    total_rows = 0
+    for shard in manifest.shards:
+        table = pq.read_table(io.BytesIO(ds003.storage.read_bytes(shard.key)))
+        assert table.schema.names == ds003.schema.names
+        total_rows += table.num_rows
+    assert total_rows == ds003.read_manifest().total_rows
+    # the source is kept
+    assert len(list(ds003.storage.list_keys(ds003.s3path_loc.key))) == 5
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
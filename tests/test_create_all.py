@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+import typing as T
+import os
+import json
+
+import pytest
+
+from learn_big_data_on_aws.dataset.base import FormatEnum, ExecutorEnum, get_writer
+from learn_big_data_on_aws.dataset.ds001 import Dataset
+
+
+@pytest.fixture
+def new_dataset(make_dataset) -> T.Callable[..., Dataset]:
+    def new(storage: str = "memory", n_files: int = 5) -> Dataset:
+        return make_dataset(
+            "ds001",
+            name="ds_001_create_all",
+            n_files=n_files,
+            n_records_per_file=20,
+            storage=storage,
+        )
+
+    return new
+
+
+@pytest.fixture(params=["local", "memory"])
+def ds(request, new_dataset) -> Dataset:
+    return new_dataset(request.param)
+
+
+def test_verify_deleted_shard(ds):
+    manifest = ds.create_all(executor=ExecutorEnum.serial)
+    assert all(ds.verify_shard(shard) for shard in manifest.shards.values())
+
+    key = ds.get_s3path(3).key
+    ds.storage.delete(key)
+    assert ds.verify_shard(manifest.shards[3]) is False
+
+    # without verify, the manifest is trusted
+    assert ds.create_all(executor=ExecutorEnum.serial).missing() == []
+    assert ds.storage.exists(key) is False
+
+    ds.create_all(executor=ExecutorEnum.serial, verify=True)
+    assert ds.storage.exists(key)
+    assert ds.verify_shard(ds.read_manifest().shards[3])
+
+
+def test_verify_corrupted_shard(ds):
+    manifest = ds.create_all(executor=ExecutorEnum.serial)
+    key = ds.get_s3path(2).key
+    data = ds.storage.read_bytes(key)
+
+    # same size, different content, only the md5 can tell
+    corrupted = data[:-2] + bytes([data[-2] ^ 1]) + data[-1:]
+    ds.storage.write_bytes(key, corrupted)
+    assert ds.storage.head(key).size == manifest.shards[2].size
+    assert ds.verify_shard(manifest.shards[2]) is False
+
+    ds.create_all(executor=ExecutorEnum.serial, verify=True)
+    assert ds.storage.read_bytes(key) == data
+
+
+def test_checkpoint_every(new_dataset):
+    ds = new_dataset(n_files=7)
+
+    class Crash(Exception):
+        pass
+
+    create_one = ds.create_one
+
+    def crash_on_5th(nth_file: int, **kwargs):
+        if nth_file == 5:
+            raise Crash
+        return create_one(nth_file=nth_file, **kwargs)
+
+    ds.create_one = crash_on_5th
+    with pytest.raises(Crash):
+        ds.create_all(executor=ExecutorEnum.serial, checkpoint_every=2)
+    manifest = ds.read_manifest()
+    assert sorted(manifest.shards) == [1, 2, 3, 4]
+
+    n_created = []
+
+    def count(nth_file: int, **kwargs):
+        n_created.append(nth_file)
+        return create_one(nth_file=nth_file, **kwargs)
+
+    checkpoints = []
+    write_manifest = ds.write_manifest
+
+    def record(manifest):
+        checkpoints.append(sorted(manifest.shards))
+        write_manifest(manifest)
+
+    ds.create_one = count
+    ds.write_manifest = record
+    manifest = ds.create_all(executor=ExecutorEnum.serial, checkpoint_every=2)
+    assert n_created == [5, 6, 7]
+    assert checkpoints == [list(range(1, 7)), list(range(1, 8))]
+    assert manifest.missing() == []
+    assert ds.read_manifest().to_json() == manifest.to_json()
+
+
+def test_resume_other_configuration(new_dataset):
+    ds = new_dataset(n_files=3)
+    manifest = ds.create_all(executor=ExecutorEnum.serial)
+    assert manifest.format == "json_multi_line"
+    assert manifest.n_records_per_file == 20
+
+    ds.n_records_per_file = 10
+    with pytest.raises(ValueError):
+        ds.create_all(executor=ExecutorEnum.serial)
+    manifest = ds.create_all(executor=ExecutorEnum.serial, resume=False)
+    assert manifest.n_records_per_file == 10
+    assert manifest.total_rows == 3 * 10
+
+    ds.format = FormatEnum.csv
+    ds.writer = get_writer(FormatEnum.csv)
+    with pytest.raises(ValueError):
+        ds.create_all(executor=ExecutorEnum.serial)
+
+    # a manifest of an older version doesn't record them, it is trusted
+    ds.format = FormatEnum.json_multi_line
+    ds.writer = get_writer(FormatEnum.json_multi_line)
+    data = json.loads(ds.storage.read_bytes(ds.s3path_manifest.key))
+    del data["format"], data["n_records_per_file"]
+    ds.storage.write_bytes(ds.s3path_manifest.key, json.dumps(data).encode("utf-8"))
+    manifest = ds.create_all(executor=ExecutorEnum.serial)
+    assert manifest.missing() == []
+    assert manifest.n_records_per_file == 10
+
+
+@pytest.mark.parametrize(
+    "executor",
+    [ExecutorEnum.process, ExecutorEnum.thread, ExecutorEnum.serial],
+)
+def test_executor_parity(executor, new_dataset):
+    expected = new_dataset(n_files=6)
+    expected_manifest = expected.create_all(executor=ExecutorEnum.serial)
+
+    # the process executor can't share a MemoryStorage
+    storage = "local" if executor is ExecutorEnum.process else "memory"
+    ds = new_dataset(storage, n_files=6)
+    manifest = ds.create_all(executor=executor, max_workers=3)
+
+    assert manifest.to_json() == expected_manifest.to_json()
+    for nth_file in range(1, 7):
+        key = ds.get_s3path(nth_file).key
+        assert ds.storage.read_bytes(key) == expected.storage.read_bytes(key)
+
+
+@pytest.mark.parametrize(
+    "format",
+    [FormatEnum.json_multi_line, FormatEnum.csv, FormatEnum.parquet],
+)
+def test_fit_size(format, make_dataset):
+    target_file_size = 200_000
+    ds = make_dataset(
+        "ds001",
+        name="ds_001_fit_size",
+        format=format,
+        n_files=1,
+        n_records_per_file=1,
+        target_file_size=target_file_size,
+        target_total_size=1_000_000,
+        size_tolerance=0.05,
+    )
+    size = ds.fit_size(sample_rows=100)
+    assert abs(size - target_file_size) / target_file_size <= 0.05
+    assert ds.n_files == 5
+
+    # create_all fits again, with the default sample size
+    manifest = ds.create_all(executor=ExecutorEnum.serial)
+    assert len(manifest.shards) == 5
+    size = manifest.shards[1].size
+    assert abs(size - target_file_size) / target_file_size <= 0.05
+    # the ids of the later files have more digits, the text formats drift a bit
+    for shard in manifest.shards.values():
+        assert abs(shard.size - target_file_size) / target_file_size <= 0.1
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
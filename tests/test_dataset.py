@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import json
+import subprocess
+
+import pytest
+
+from learn_big_data_on_aws import dataset
+
+
+def test_list_datasets_is_lazy():
+    code = (
+        "import sys; "
+        "from learn_big_data_on_aws.dataset import list_datasets; "
+        "assert len(list_datasets()) >= 3; "
+        "assert 'pandas' not in sys.modules; "
+        "assert 'faker' not in sys.modules; "
+        "assert 'learn_big_data_on_aws.dataset.ds001' not in sys.modules"
+    )
+    dir_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], check=True, cwd=dir_project_root)
+
+
+def test_get_dataset(offline_config):
+    for name in dataset.list_datasets():
+        assert dataset.get_dataset(name).name == name
+    assert dataset.ds001.dataset is dataset.get_dataset("ds_001_multi_line_json")
+
+    with pytest.raises(KeyError):
+        dataset.get_dataset("not_exists")
+
+
+seed_code = """
+from s3pathlib import S3Path
+from learn_big_data_on_aws.dataset.base import FormatEnum
+from learn_big_data_on_aws.dataset.storage import MemoryStorage
+from learn_big_data_on_aws.dataset.ds001 import Dataset
+
+ds = Dataset(
+    name="ds_001_seed",
+    format=FormatEnum.parquet,
+    datalake_s3_loc=S3Path("s3://bucket/dataset/"),
+    n_files=3,
+    n_records_per_file=100,
+    storage=MemoryStorage(),
+)
+"""
+
+
+def test_create_one_is_reproducible():
+    namespace = dict()
+    exec(seed_code, namespace)
+    ds = namespace["ds"]
+    md5 = ds.create_one(2).md5
+    assert ds.create_one(2).md5 == md5
+    assert ds.create_one(3).md5 != md5
+
+    # another process, with another hash seed, gets the same bytes
+    code = seed_code + "print(ds.create_one(2).md5)"
+    dir_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    res = subprocess.run(
+        [sys.executable, "-c", code],
+        check=True,
+        cwd=dir_project_root,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, PYTHONHASHSEED="123"),
+    )
+    assert res.stdout.strip().splitlines()[-1] == md5
+
+
+def test_ds04_create_one_is_reproducible(monkeypatch, make_dataset):
+    from learn_big_data_on_aws.dataset import ds04
+
+    ds = make_dataset("ds04", n_files=3)
+    monkeypatch.setattr(ds04, "dataset", ds)
+    key = ds04.get_s3path_prefix().key + "002.json"
+    data = ds04.create_one(2)
+    content = ds.storage.read_bytes(key)
+    assert json.loads(content) == data
+    assert ds04.create_one(2) == data
+    assert ds.storage.read_bytes(key) == content
+    assert ds04.create_one(3) != data
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+
+import typing as T
+import os
+
+import pytest
+
+from learn_big_data_on_aws.dataset.base import ExecutorEnum
+from learn_big_data_on_aws.dataset.generator import RecordGenerator, IdColumn
+from learn_big_data_on_aws.dataset import ds003
+from learn_big_data_on_aws.dataset.ds003 import Dataset, get_path_dimension_table
+
+
+@pytest.fixture
+def new_dataset(make_dataset) -> T.Callable[..., Dataset]:
+    def new(**kwargs) -> Dataset:
+        return make_dataset(name="ds_003_dimension_table", n_files=2, **kwargs)
+
+    return new
+
+
+def test_get_path_dimension_table():
+    path = get_path_dimension_table("ds", "item", ds003.item_generator, 10)
+    assert path == get_path_dimension_table("ds", "item", ds003.item_generator, 10)
+    assert path != get_path_dimension_table("ds", "item", ds003.item_generator, 11)
+
+    generator = RecordGenerator(columns=list(ds003.item_generator.columns), seed=1)
+    assert path != get_path_dimension_table("ds", "item", generator, 10)
+    generator = RecordGenerator(
+        columns=[IdColumn("item_id")], seed=ds003.item_generator.seed
+    )
+    assert path != get_path_dimension_table("ds", "item", generator, 10)
+
+
+def test_delete_dimension_tables(new_dataset):
+    ds = new_dataset(n_customer=10, n_item=10)
+    ds.create_all(executor=ExecutorEnum.serial)
+    assert ds.path_customer_table.exists()
+    assert ds.path_item_table.exists()
+    assert ds.item_table.num_rows == 10
+
+    ds.delete_all()
+    assert ds.path_customer_table.exists() is False
+    assert ds.path_item_table.exists() is False
+    assert list(ds.storage.list_keys("")) == []
+
+    # the tables are rebuilt on demand
+    assert ds.item_table.num_rows == 10
+    ds.delete_dimension_tables()
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        dict(n_item=3, n_item_per_order_lower=4, n_item_per_order_upper=5),
+        dict(n_item_per_order_lower=3, n_item_per_order_upper=2),
+        dict(n_item_per_order_lower=-1),
+        dict(n_order_per_day_lower=10, n_order_per_day_upper=5),
+        dict(n_item=0),
+        dict(batch_size=0),
+    ],
+)
+def test_invalid_arguments(kwargs, new_dataset):
+    with pytest.raises(ValueError):
+        new_dataset(**kwargs)
+
+
+def test_small_item_table(new_dataset):
+    # the upper bound is clamped to n_item, every order has distinct items
+    ds = new_dataset(n_item=3, n_item_per_order_lower=3, n_item_per_order_upper=5)
+    for batch in ds.iter_batches(nth_file=1):
+        for items in batch.column("items").to_pylist():
+            assert sorted(item["item_id"] for item in items) == [1, 2, 3]
+    ds.delete_dimension_tables()
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
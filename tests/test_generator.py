@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+
+from datetime import datetime, timezone
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pytest
+
+from learn_big_data_on_aws.dataset.generator import (
+    RecordGenerator,
+    IdColumn,
+    IntColumn,
+    FloatColumn,
+    ChoiceColumn,
+    TimestampColumn,
+    PoolColumn,
+)
+
+
+@pytest.fixture
+def generator() -> RecordGenerator:
+    return RecordGenerator(
+        columns=[
+            IdColumn("id"),
+            IntColumn("age", low=18, high=20),
+            FloatColumn("price", low=1.0, high=2.0, decimals=1),
+            ChoiceColumn("color", values=["red", "green"]),
+            TimestampColumn(
+                "create_at",
+                start=datetime(2022, 1, 1, tzinfo=timezone.utc),
+                end=datetime(2022, 1, 2, tzinfo=timezone.utc),
+            ),
+            PoolColumn("name", factory=lambda fake: fake.name(), pool_size=10),
+        ],
+        batch_size=1000,
+        seed=1,
+    )
+
+
+def test_iter_batches(generator):
+    batches = list(
+        generator.iter_batches(n_rows=2500, rng=np.random.default_rng(1), start_id=11)
+    )
+    assert [batch.num_rows for batch in batches] == [1000, 1000, 500]
+    for batch in batches:
+        assert batch.schema == generator.schema
+
+    table = pa.Table.from_batches(batches)
+    assert table.column("id").to_pylist() == list(range(11, 2511))
+    assert generator.schema.field("create_at").type == pa.timestamp("s", tz="UTC")
+
+    age = table.column("age")
+    assert pc.min(age).as_py() == 18
+    assert pc.max(age).as_py() == 20
+
+    price = table.column("price").to_numpy()
+    assert price.min() >= 1.0 and price.max() <= 2.0
+    assert np.array_equal(price, np.round(price, 1))
+
+    create_at = table.column("create_at")
+    assert pc.min(create_at).as_py() >= datetime(2022, 1, 1, tzinfo=timezone.utc)
+    assert pc.max(create_at).as_py() < datetime(2022, 1, 2, tzinfo=timezone.utc)
+
+    assert set(table.column("color").to_pylist()) == {"red", "green"}
+    assert len(set(table.column("name").to_pylist())) <= 10
+
+
+def test_generate_table(generator):
+    assert generator.generate_table(n_rows=0).num_rows == 0
+    table_1 = generator.generate_table(n_rows=100, rng=np.random.default_rng(7))
+    table_2 = generator.generate_table(n_rows=100, rng=np.random.default_rng(7))
+    assert table_1.num_rows == 100
+    assert table_1.equals(table_2)
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+import pyarrow as pa
+import pytest
+
+from learn_big_data_on_aws.dataset.base import FormatEnum, ExecutorEnum
+from learn_big_data_on_aws.dataset.inference import PARQUET_FOOTER_READ_SIZE
+
+
+@pytest.mark.parametrize("ds003", [dict(n_files=30, storage="counting")], indirect=True)
+def test_infer_nested_json(ds003):
+    ds003.create_all(executor=ExecutorEnum.serial)
+    schema = ds003.infer_schema(n_samples=5, sample_bytes=4096)
+    assert ds003.storage.n_bytes_read <= 5 * 4096
+    assert pa.types.is_struct(schema.field("customer").type)
+    item_type = schema.field("items").type.value_type
+    assert {field.name for field in item_type} == {
+        "item_id",
+        "name",
+        "price",
+        "quantity",
+    }
+
+
+def test_infer_parquet_footer(make_dataset):
+    ds = make_dataset(
+        "ds001",
+        format=FormatEnum.parquet,
+        n_files=3,
+        n_records_per_file=20000,
+        storage="counting",
+    )
+    ds.create_all(executor=ExecutorEnum.serial)
+    assert ds.infer_schema().equals(ds.schema)
+    # one range GET for the footer of each file
+    assert ds.storage.n_bytes_read <= 3 * PARQUET_FOOTER_READ_SIZE
+
+
+def test_infer_from_manifest(make_dataset):
+    ds = make_dataset(
+        "ds001",
+        format=FormatEnum.csv,
+        n_files=3,
+        n_records_per_file=10,
+        storage="no_list",
+    )
+    ds.create_all(executor=ExecutorEnum.serial)
+    assert ds.infer_schema().names == ["id", "name"]
+
+
+def test_infer_long_line_and_empty_file(make_dataset):
+    ds = make_dataset("ds001", n_files=3, n_records_per_file=10, storage="counting")
+    long_line = b'{"id": 1, "name": "%s"}\n{"id": 2, "name": null}\n' % (b"a" * 5000)
+    ds.storage.write_bytes(ds.get_s3path(1).key, long_line)
+    ds.storage.write_bytes(ds.get_s3path(2).key, b"")
+    huge_line = b'{"id": 3, "blob": "%s"}\n' % (b"b" * 20000)
+    ds.storage.write_bytes(ds.get_s3path(3).key, huge_line)
+
+    # no manifest, the files are listed
+    schema = ds.infer_schema(sample_bytes=1000, max_doc_size=10000)
+    assert schema.names == ["id", "name"]
+    # the range doubles until the first line is complete, here the whole
+    # file, and up to max_doc_size before the huge line is skipped
+    assert ds.storage.n_bytes_read == len(long_line) + 10000
+
+    ds.storage.delete(ds.get_s3path(1).key)
+    with pytest.raises(ValueError):
+        ds.infer_schema(sample_bytes=1000, max_doc_size=10000)
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,399 @@
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import json
+import random
+import threading
+import importlib.util
+from pathlib import Path
+
+import boto3
+import pytest
+from moto import mock_aws
+
+dir_project_root = Path(__file__).absolute().parent.parent
+path_script = dir_project_root.joinpath(
+    "docs",
+    "source",
+    "02-Best-Practices",
+    "Process-Super-Big-JSON-File",
+    "lambda_function.py",
+)
+# the module creates the s3 client at import
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+spec = importlib.util.spec_from_file_location("lambda_function", path_script)
+lf = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(lf)
+
+bucket = "bucket"
+
+
+@pytest.fixture
+def s3_client(monkeypatch):
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=bucket)
+        monkeypatch.setattr(lf, "s3_client", s3_client)
+        yield s3_client
+
+
+def read_dir(s3_client, prefix: str) -> dict:
+    """
+    The ``{relative key: content}`` of all objects under the prefix.
+    """
+    paginator = s3_client.get_paginator("list_objects_v2")
+    return {
+        content["Key"][len(prefix) :]: s3_client.get_object(
+            Bucket=bucket, Key=content["Key"]
+        )["Body"].read()
+        for page in paginator.paginate(Bucket=bucket, Prefix=prefix)
+        for content in page.get("Contents", [])
+    }
+
+
+def random_string(rnd: random.Random) -> str:
+    chars = ["a", '"', "\\", "[", "]", "{", "}", ",", ":", " ", "\n", "é"]
+    return "".join(rnd.choice(chars) for _ in range(rnd.randint(0, 12)))
+
+
+def random_item(rnd: random.Random, depth: int = 0):
+    r = rnd.random()
+    if depth > 2 or r < 0.3:
+        return rnd.choice([1, -2.5, None, True, random_string(rnd)])
+    if r < 0.65:
+        return {
+            random_string(rnd): random_item(rnd, depth + 1)
+            for _ in range(rnd.randint(0, 3))
+        }
+    return [random_item(rnd, depth + 1) for _ in range(rnd.randint(0, 3))]
+
+
+adversarial_items = [
+    "a,b",
+    "],[",
+    '"}',
+    "\\",
+    "\\\\",
+    '\\"',
+    '\\\\"],',
+    {"k": '"', "v": "\\", "w": "]}"},
+    [[1, [2, [3]]], []],
+    [],
+    {},
+    "é, ü",
+    None,
+    1.0,
+]
+
+
+def make_documents():
+    rnd = random.Random(1)
+    docs = [
+        {"id": 1, "data": {"records": adversarial_items, "z": "]"}, "name": ',"'},
+        {"data": {"records": []}, "records": [1, 2]},
+        {"pre": ["records", {"records": [0]}], "data": {"records": [[["]"]]]}},
+    ]
+    for _ in range(12):
+        items = [random_item(rnd) for _ in range(rnd.randint(0, 30))]
+        docs.append(
+            {
+                "pre": random_item(rnd),
+                "data": {"records": items, "post": [random_string(rnd)]},
+                "records": random_string(rnd),
+            }
+        )
+    return docs
+
+
+documents = make_documents()
+
+
+def test_byte_range_splitter():
+    for doc in documents:
+        for indent in [None, 2]:
+            for ensure_ascii in [True, False]:
+                raw = json.dumps(doc, indent=indent, ensure_ascii=ensure_ascii)
+                raw = raw.encode("utf-8")
+                expected = lf.JsonSplitter("data.records", chunk_size=3)
+                expected_chunks = list(expected.iter_chunks(io.BytesIO(raw)))
+                # every byte can be a segment boundary
+                for segment_size in [1, 3, 7, 64]:
+                    splitter = lf.ByteRangeSplitter("data.records", chunk_size=3)
+                    chunks = list()
+                    for i in range(0, len(raw), segment_size):
+                        chunks.extend(splitter.feed(raw[i : i + segment_size]))
+                    chunks.extend(splitter.close())
+                    assert chunks == expected_chunks
+                    assert splitter.data == expected.data
+
+
+def test_byte_range_splitter_root_array():
+    raw = json.dumps(adversarial_items).encode("utf-8")
+    splitter = lf.ByteRangeSplitter("", chunk_size=5)
+    chunks = list()
+    for i in range(0, len(raw), 4):
+        chunks.extend(splitter.feed(raw[i : i + 4]))
+    chunks.extend(splitter.close())
+    assert sum(chunks, []) == adversarial_items
+
+
+def test_byte_range_splitter_chunk_bytes():
+    rnd = random.Random(1)
+    items = [{"k": i, "v": "a" * rnd.randint(0, 300)} for i in range(200)]
+    items[10]["v"] = "b" * 2000
+    items[-1]["v"] = "d" * 5000
+    raw = json.dumps({"data": {"records": items}}).encode("utf-8")
+    splitter = lf.ByteRangeSplitter("data.records", chunk_bytes=1000)
+    chunks = list()
+    for i in range(0, len(raw), 100):
+        chunks.extend(splitter.feed(raw[i : i + 100]))
+    chunks.extend(splitter.close())
+    assert sum(chunks, []) == items
+
+    # the size of an item is measured on the input bytes
+    sizes = [[len(json.dumps(item)) for item in chunk] for chunk in chunks]
+    for ith, chunk_sizes in enumerate(sizes):
+        if len(chunk_sizes) > 1:
+            assert sum(chunk_sizes) <= 1000
+        if ith + 1 < len(sizes):
+            assert sum(chunk_sizes) + sizes[ith + 1][0] > 1000
+    assert [items[10]] in chunks
+    assert chunks[-1] == [items[-1]]
+
+
+def test_split_json_parallel(s3_client):
+    for ith, doc in enumerate(documents[:5]):
+        s3_client.put_object(
+            Bucket=bucket,
+            Key=f"input/{ith}.json",
+            Body=json.dumps(doc, indent=2).encode("utf-8"),
+        )
+        kwargs = dict(
+            s3file_input=f"s3://{bucket}/input/{ith}.json",
+            json_path="data.records",
+            chunk_size=4,
+        )
+        lf.split_json(s3dir_output=f"s3://{bucket}/sequential/{ith}/", **kwargs)
+        assert (
+            lf.split_json_parallel(
+                s3dir_output=f"s3://{bucket}/parallel/{ith}/",
+                segment_size=16,
+                max_workers=3,
+                **kwargs,
+            )
+            is None
+        )
+        expected = read_dir(s3_client, f"sequential/{ith}/")
+        assert "data.json" in expected
+        assert read_dir(s3_client, f"parallel/{ith}/") == expected
+
+
+def test_chunk_uploader_bounded_queue(s3_client, monkeypatch):
+    put_object = lf.put_object
+    released = threading.Event()
+
+    def slow_put_object(uri, body):
+        released.wait(timeout=10)
+        return put_object(uri, body)
+
+    monkeypatch.setattr(lf, "put_object", slow_put_object)
+    s3dir_arrays = f"s3://{bucket}/output/arrays/"
+    with lf.ChunkUploader(s3dir_arrays, max_workers=1, max_pending=2) as uploader:
+        uploader.submit(1, [1])
+        uploader.submit(2, [2])
+        # the queue is full, the next submit blocks the parser
+        thread = threading.Thread(target=uploader.submit, args=(3, [3]))
+        thread.start()
+        thread.join(timeout=0.2)
+        assert thread.is_alive()
+        released.set()
+        thread.join(timeout=10)
+        assert thread.is_alive() is False
+    assert read_dir(s3_client, "output/arrays/") == {
+        "1.json": b"1",
+        "2.json": b"2",
+        "3.json": b"3",
+    }
+
+
+def test_chunk_uploader_error_stops_the_parser(s3_client, monkeypatch):
+    put_object = lf.put_object
+    uris = list()
+
+    def failing_put_object(uri, body):
+        uris.append(uri)
+        if uri.endswith("/3.json"):
+            raise RuntimeError("upload failed")
+        return put_object(uri, body)
+
+    monkeypatch.setattr(lf, "put_object", failing_put_object)
+    doc = {"records": list(range(1000))}
+    s3_client.put_object(Bucket=bucket, Key="input.json", Body=json.dumps(doc))
+    with pytest.raises(RuntimeError, match="upload failed"):
+        lf.split_json(
+            s3file_input=f"s3://{bucket}/input.json",
+            s3dir_output=f"s3://{bucket}/output/",
+            json_path="records",
+            chunk_size=1,
+            max_upload_workers=2,
+        )
+    # the parser stops once the error is seen, at most one queue later
+    assert len(uris) < 100
+    assert "data.json" not in read_dir(s3_client, "output/")
+
+
+def test_more_than_999_chunks(s3_client):
+    doc = {"id": 1, "records": list(range(1005))}
+    s3_client.put_object(Bucket=bucket, Key="input.json", Body=json.dumps(doc))
+    lf.split_json(
+        s3file_input=f"s3://{bucket}/input.json",
+        s3dir_output=f"s3://{bucket}/output/",
+        json_path="records",
+        chunk_size=1,
+    )
+    objects = read_dir(s3_client, "output/")
+    assert len(objects) == 1005 + 1
+    assert objects["data.json"] == b'{"id": 1}'
+    assert objects["arrays/1005.json"] == b"1004"
+
+
+def test_split_json_multi_path(s3_client):
+    doc = {
+        "data": {"records": [1, 2, 3], "meta": {"events": [{"e": 1}]}},
+        "events": ["a"],
+    }
+    s3_client.put_object(Bucket=bucket, Key="input.json", Body=json.dumps(doc))
+    response = lf.lambda_handler(
+        dict(
+            s3file_input=f"s3://{bucket}/input.json",
+            s3dir_output=f"s3://{bucket}/output/",
+            json_path=["data.records", "data.meta.events", "events", "missing"],
+            chunk_size=2,
+        ),
+        None,
+    )
+    assert response["done"] is True
+    assert read_dir(s3_client, "output/") == {
+        "arrays/data.records/1.json": b"1\n2",
+        "arrays/data.records/2.json": b"3",
+        "arrays/data.meta.events/1.json": b'{"e": 1}',
+        "arrays/events/1.json": b'"a"',
+        "data.json": b'{"data": {"meta": {}}}',
+    }
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_split_json_parquet_schema(s3_client, parallel):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    # int and null first, promoted to float and string, then narrower again
+    items = [
+        {"k": 1, "v": None},
+        {"k": 2, "v": None},
+        {"k": 3.5, "v": "a"},
+        {"k": 4, "v": None},
+        {"k": 5, "v": None},
+    ]
+    doc = {"records": items}
+    s3_client.put_object(Bucket=bucket, Key="input.json", Body=json.dumps(doc))
+    response = lf.lambda_handler(
+        dict(
+            s3file_input=f"s3://{bucket}/input.json",
+            s3dir_output=f"s3://{bucket}/output/",
+            json_path="records",
+            chunk_size=2,
+            parallel=parallel,
+            output_format="parquet",
+        ),
+        Context(10**6),
+    )
+    assert response["done"] is True
+    objects = read_dir(s3_client, "output/arrays/")
+    keys = ["1.parquet", "2.parquet", "3.parquet"]
+    assert sorted(objects) == keys + ["_schema.parquet"]
+    schema = pq.read_schema(pa.BufferReader(objects["_schema.parquet"]))
+    assert schema.field("k").type == pa.float64()
+    assert schema.field("v").type == pa.string()
+    # every chunk has the final schema, a reader like Athena needs no cast
+    tables = [pq.read_table(pa.BufferReader(objects[key])) for key in keys]
+    for table in tables:
+        assert table.schema.equals(schema)
+    assert pa.concat_tables(tables).to_pylist() == items
+
+
+class Context:
+    """
+    A Lambda context that runs out of time after ``n_chunks`` chunks.
+    """
+
+    def __init__(self, n_chunks: int):
+        self.n_chunks = n_chunks
+
+    def get_remaining_time_in_millis(self) -> int:
+        self.n_chunks -= 1
+        return 0 if self.n_chunks <= 0 else 900_000
+
+
+@pytest.mark.parametrize("output_format", ["json", "parquet"])
+def test_resume(s3_client, output_format):
+    rnd = random.Random(1)
+    items = [{"k": i, "v": "a\"],\\" * rnd.randint(0, 20)} for i in range(200)]
+    # a wider type in a later chunk, the promoted schema goes through the checkpoint
+    items[150]["k"] = 150.5
+    doc = {"id": 1, "data": {"records": items, "date": "2000-01-01"}}
+    s3_client.put_object(Bucket=bucket, Key="input.json", Body=json.dumps(doc))
+    event = dict(
+        s3file_input=f"s3://{bucket}/input.json",
+        json_path="data.records",
+        chunk_size=7,
+        parallel=True,
+        max_workers=3,
+        output_format=output_format,
+    )
+
+    response = lf.lambda_handler(
+        dict(event, s3dir_output=f"s3://{bucket}/full/"), Context(10**6)
+    )
+    assert response["done"] is True
+    expected = read_dir(s3_client, "full/")
+    # data.json, the chunks and the _schema.parquet sidecar
+    assert len(expected) == 1 + 29 + (output_format == "parquet")
+
+    event = dict(event, s3dir_output=f"s3://{bucket}/resumed/")
+    n_invocations = 0
+    while True:
+        n_invocations += 1
+        response = lf.lambda_handler(event, Context(5))
+        if response["done"]:
+            break
+        assert response["checkpoint"]["n_chunks"] == 5 * n_invocations
+        event = response["next_event"]
+        assert event["resume"] is True
+    assert n_invocations == 6
+    assert read_dir(s3_client, "resumed/") == expected
+    if output_format == "parquet":
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # uploaded by the first invocation, rewritten by the last one
+        schema = pq.read_schema(pa.BufferReader(expected["arrays/1.parquet"]))
+        assert schema.field("k").type == pa.float64()
+
+
+def test_resume_requires_parallel():
+    event = dict(
+        s3file_input=f"s3://{bucket}/input.json",
+        s3dir_output=f"s3://{bucket}/output/",
+        json_path="data.records",
+        chunk_size=7,
+        resume=True,
+    )
+    with pytest.raises(ValueError):
+        lf.lambda_handler(event, Context(1))
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import pytest
+
+from learn_big_data_on_aws.dataset.base import ExecutorEnum
+
+
+pytestmark = pytest.mark.parametrize(
+    "ds003", [dict(n_files=40, storage="no_list")], indirect=True
+)
+
+
+def test_find_keys(ds003):
+    assert ds003.find_keys() == []
+
+    ds003.create_all(executor=ExecutorEnum.serial, checkpoint_every=10)
+    index = ds003.read_partition_index()
+    assert index.num_rows == 40
+    assert sum(index["n_rows"].to_pylist()) == ds003.read_manifest().total_rows
+
+    keys = ds003.find_keys(start_date=date(2022, 1, 30), end_date=date(2022, 2, 2))
+    assert keys == [ds003.get_s3path(nth_file).key for nth_file in range(30, 34)]
+    assert len(ds003.find_keys(start_date=date(2022, 2, 1))) == 9
+
+
+def test_create_one_is_indexed(ds003):
+    # a file created alone is indexed at once
+    shard = ds003.create_one(nth_file=3)
+    assert ds003.storage.exists(shard.key)
+    assert ds003.read_partition_index().num_rows == 1
+    assert ds003.find_keys() == [shard.key]
+
+    # created again, the row is replaced
+    shard_5 = ds003.create_one(nth_file=5)
+    assert ds003.create_one(nth_file=3) == shard
+    index = ds003.read_partition_index()
+    assert index["nth_file"].to_pylist() == [3, 5]
+    assert index["n_rows"].to_pylist() == [shard.n_rows, shard_5.n_rows]
+    assert ds003.find_keys(
+        start_date=date(2022, 1, 3), end_date=date(2022, 1, 3)
+    ) == [shard.key]
+
+    # create_all rebuilds it from the manifest
+    manifest = ds003.create_all(executor=ExecutorEnum.serial)
+    assert manifest.shards[3] == shard
+    index = ds003.read_partition_index()
+    assert index.num_rows == 40
+    assert shard.key in ds003.find_keys(
+        start_date=date(2022, 1, 3), end_date=date(2022, 1, 3)
+    )
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
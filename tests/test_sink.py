@@ -0,0 +1,58 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from learn_big_data_on_aws.dataset.sink import MB, S3MultipartSink
+
+bucket = "bucket"
+
+
+@pytest.fixture
+def s3_client():
+    with mock_aws():
+        s3_client = boto3.client("s3", region_name="us-east-1")
+        s3_client.create_bucket(Bucket=bucket)
+        yield s3_client
+
+
+def test_multipart(s3_client):
+    data = hashlib.sha256(b"seed").digest() * (12 * MB // 32 + 1000)
+    with S3MultipartSink(s3_client, bucket, "big.bin", part_size=5 * MB) as f:
+        # write in odd sized pieces, the parts are cut on part_size anyway
+        for i in range(0, len(data), 999_999):
+            f.write(data[i : i + 999_999])
+    assert f.size == len(data)
+    assert f.md5.hexdigest() == hashlib.md5(data).hexdigest()
+    assert f.etag.strip('"').endswith("-3")
+
+    res = s3_client.get_object(Bucket=bucket, Key="big.bin")
+    assert res["Body"].read() == data
+    assert res["ETag"] == f.etag
+
+
+def test_small_file(s3_client):
+    with S3MultipartSink(s3_client, bucket, "small.txt") as f:
+        f.write(b"hello")
+    assert f.etag.strip('"') == hashlib.md5(b"hello").hexdigest()
+    body = s3_client.get_object(Bucket=bucket, Key="small.txt")["Body"].read()
+    assert body == b"hello"
+
+
+def test_abort_on_error(s3_client):
+    with pytest.raises(RuntimeError):
+        with S3MultipartSink(s3_client, bucket, "failed.bin", part_size=5 * MB) as f:
+            f.write(b"a" * (6 * MB))
+            raise RuntimeError("writer failed")
+    assert s3_client.list_multipart_uploads(Bucket=bucket).get("Uploads", []) == []
+    assert s3_client.list_objects_v2(Bucket=bucket).get("Contents", []) == []
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
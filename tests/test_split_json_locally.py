@@ -0,0 +1,262 @@
+# -*- coding: utf-8 -*-
+
+import os
+import io
+import json
+import random
+import importlib.util
+from pathlib import Path
+
+import pytest
+
+dir_project_root = Path(__file__).absolute().parent.parent
+path_script = dir_project_root.joinpath(
+    "docs",
+    "source",
+    "02-Best-Practices",
+    "Process-Super-Big-JSON-File",
+    "split_json_locally.py",
+)
+spec = importlib.util.spec_from_file_location("split_json_locally", path_script)
+sl = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(sl)
+
+
+def split(doc, json_path, **kwargs):
+    splitter = sl.JsonSplitter(json_path=json_path, **kwargs)
+    chunks = list(splitter.iter_chunks(io.BytesIO(json.dumps(doc).encode("utf-8"))))
+    return chunks, splitter.data
+
+
+def test_empty_array():
+    doc = {"id": 1, "data": {"records": [], "date": "2000-01-01"}}
+    chunks, data = split(doc, "data.records", chunk_size=10)
+    assert chunks == []
+    assert data == {"id": 1, "data": {"date": "2000-01-01"}}
+
+
+def test_key_is_prefix_of_path():
+    doc = {
+        "rec": 1,
+        "data": {
+            "rec": [1, 2],
+            "records_2": [3, 4],
+            "records": [{"records": 5}, {"records": 6}],
+        },
+        "records": [7],
+    }
+    chunks, data = split(doc, "data.records", chunk_size=1)
+    assert chunks == [[{"records": 5}], [{"records": 6}]]
+    assert data == {
+        "rec": 1,
+        "data": {"rec": [1, 2], "records_2": [3, 4]},
+        "records": [7],
+    }
+
+
+def test_value_equals_path():
+    doc = {
+        "path": "data.records",
+        "data": {"records": ["data.records", "records"], "key": "records"},
+        "records": "data.records",
+    }
+    chunks, data = split(doc, "data.records", chunk_size=10)
+    assert chunks == [["data.records", "records"]]
+    assert data == {
+        "path": "data.records",
+        "data": {"key": "records"},
+        "records": "data.records",
+    }
+
+
+def test_number_fidelity():
+    items = [
+        {
+            "int": 1,
+            "float": 1.0,
+            "decimal": 0.1,
+            # the C backend of ijson supports 64 bits integers
+            "big": 2**63 - 1,
+            "negative_zero": -0.0,
+            "small": 1e-7,
+            "nested": [2, 2.5, {"x": 3}],
+        },
+        3,
+        3.0,
+    ]
+    doc = {"records": items, "total": 2.0}
+    chunks, data = split(doc, "records", chunk_size=10)
+    # json.dumps tells 1 from 1.0
+    assert json.dumps(chunks) == json.dumps([items])
+    assert json.dumps(data) == json.dumps({"total": 2.0})
+
+
+def test_root_array():
+    chunks, data = split([{"k": 1}, {"k": 2}, {"k": 3}], "", chunk_size=2)
+    assert chunks == [[{"k": 1}, {"k": 2}], [{"k": 3}]]
+
+
+def check_chunk_bytes(chunks, items, chunk_bytes, chunk_size=None):
+    assert sum(chunks, []) == items
+    sizes = [[len(json.dumps(item)) for item in chunk] for chunk in chunks]
+    for ith, chunk_sizes in enumerate(sizes):
+        if len(chunk_sizes) > 1:
+            assert sum(chunk_sizes) <= chunk_bytes
+        if chunk_size is not None:
+            assert len(chunk_sizes) <= chunk_size
+        # a chunk is only cut when the next item doesn't fit
+        is_full = chunk_size is not None and len(chunk_sizes) == chunk_size
+        if ith + 1 < len(sizes) and not is_full:
+            assert sum(chunk_sizes) + sizes[ith + 1][0] > chunk_bytes
+
+
+def test_chunk_bytes():
+    rnd = random.Random(1)
+    items = [{"k": i, "v": "a" * rnd.randint(0, 300)} for i in range(200)]
+    # oversized items, alone in their chunk
+    items[10]["v"] = "b" * 2000
+    items[11]["v"] = "c" * 3000
+    items[-1]["v"] = "d" * 5000
+    doc = {"data": {"records": items}}
+
+    chunks, _ = split(doc, "data.records", chunk_bytes=1000)
+    check_chunk_bytes(chunks, items, 1000)
+    for item in [items[10], items[11], items[-1]]:
+        assert [item] in chunks
+
+    chunks, _ = split(doc, "data.records", chunk_bytes=1000, chunk_size=3)
+    check_chunk_bytes(chunks, items, 1000, chunk_size=3)
+
+
+def test_multi_path():
+    doc = {
+        "id": 1,
+        "data": {
+            "records": [{"k": 1}, {"k": 2}, {"k": 3}],
+            "meta": {"events": [[1], [2, [3]]], "date": "2000-01-01"},
+        },
+        "events": ["a", "b", "c"],
+        "name": "alice",
+    }
+    json_paths = ["data.records", "data.meta.events", "events", "missing", "data.x"]
+    splitter = sl.JsonSplitter(json_path=json_paths, chunk_size=2)
+    raw = json.dumps(doc).encode("utf-8")
+    chunks = dict()
+    for path, items in splitter.iter_path_chunks(io.BytesIO(raw)):
+        chunks.setdefault(path, []).append(items)
+    assert chunks == {
+        "data.records": [[{"k": 1}, {"k": 2}], [{"k": 3}]],
+        "data.meta.events": [[[1], [2, [3]]]],
+        "events": [["a", "b"], ["c"]],
+    }
+    assert splitter.data == {
+        "id": 1,
+        "data": {"meta": {"date": "2000-01-01"}},
+        "name": "alice",
+    }
+    # the same chunks as one path at a time
+    for path in chunks:
+        chunks_one, _ = split(doc, path, chunk_size=2)
+        assert chunks_one == chunks[path]
+
+    with pytest.raises(ValueError):
+        sl.JsonSplitter(json_path=["data", "data.records"], chunk_size=2)
+
+
+def test_split_json_multi_path(tmp_path):
+    doc = {"a": {"records": [1, 2, 3]}, "events": [{"e": 1}], "name": "alice"}
+    path_in = tmp_path.joinpath("data.json")
+    path_in.write_text(json.dumps(doc))
+    dir_out = tmp_path.joinpath("output")
+    sl.split_json(
+        path_in,
+        dir_out,
+        json_path=["a.records", "events", "missing"],
+        chunk_size=2,
+    )
+    files = sorted(
+        str(path.relative_to(dir_out)) for path in dir_out.rglob("*") if path.is_file()
+    )
+    assert files == [
+        "arrays/a.records/1.json",
+        "arrays/a.records/2.json",
+        "arrays/events/1.json",
+        "data.json",
+    ]
+    assert json.loads(dir_out.joinpath("arrays/a.records/2.json").read_text()) == [3]
+    assert json.loads(dir_out.joinpath("data.json").read_text()) == {
+        "a": {},
+        "name": "alice",
+    }
+
+
+def test_split_json_parquet_schema(tmp_path):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    items = [
+        # int and null first
+        {"k": 1, "v": None},
+        {"k": 2, "v": None},
+        # promoted to float and string, and a new field
+        {"k": 3.5, "v": "a"},
+        {"k": 4, "v": None, "w": True},
+        # narrower than the schema, not a promotion
+        {"k": 5, "v": None},
+        {"k": 6, "v": None},
+        # a new struct field, then a wider struct
+        {"k": 7, "v": "b", "s": {"x": 1}},
+        {"k": 8, "v": "c"},
+        {"k": 9, "v": "d", "s": {"x": 2, "y": "z"}},
+        {"k": 10, "v": "e"},
+    ]
+    path_in = tmp_path.joinpath("data.json")
+    path_in.write_text(json.dumps({"records": items}))
+    dir_out = tmp_path.joinpath("output")
+    sl.split_json(
+        path_in,
+        dir_out,
+        json_path="records",
+        chunk_size=2,
+        output_format="parquet",
+    )
+    dir_arrays = dir_out.joinpath("arrays")
+    schema = pq.read_schema(dir_arrays.joinpath("_schema.parquet"))
+    assert schema.field("k").type == pa.float64()
+    assert schema.field("v").type == pa.string()
+    assert schema.field("w").type == pa.bool_()
+    assert schema.field("s").type == pa.struct([("x", pa.int64()), ("y", pa.string())])
+    # the chunks before the last promotion are rewritten, one type per column
+    for ith in range(1, 6):
+        assert pq.read_schema(dir_arrays.joinpath(f"{ith}.parquet")).equals(schema)
+
+    # read like Athena, without the sidecar schema
+    table = pq.read_table(dir_arrays)
+    rows = sorted(table.to_pylist(), key=lambda row: row["k"])
+    assert rows == pa.Table.from_pylist(items, schema=schema).to_pylist()
+
+
+def test_delete_node(tmp_path):
+    path = tmp_path.joinpath("data.json")
+    input_output_jsonpath = [
+        ({"id": 1, "delete": []}, {"id": 1}, "delete"),
+        ({"id": 1, "a": {"delete": []}}, {"id": 1, "a": {}}, "a.delete"),
+        (
+            {"id": 1, "a": {"a_value": 2, "b": {"delete": [[1], {}], "b_value": 3}}},
+            {"id": 1, "a": {"a_value": 2, "b": {"b_value": 3}}},
+            "a.b.delete",
+        ),
+        (
+            {"id": 1, "delete_me": [1], "delete": [1.5], "x": "delete"},
+            {"id": 1, "delete_me": [1], "x": "delete"},
+            "delete",
+        ),
+    ]
+    for input_data, output_data, json_path in input_output_jsonpath:
+        path.write_text(json.dumps(input_data))
+        assert sl.delete_node(path, json_path=json_path) == output_data
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+
+"""
+The contract every storage backend must follow, the dataset code relies on
+it without knowing the backend.
+"""
+
+import os
+import hashlib
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from learn_big_data_on_aws.dataset.storage import (
+    S3Storage,
+    LocalStorage,
+    MemoryStorage,
+)
+
+bucket = "bucket"
+
+objects = {
+    "data/a/001.json": b"0123456789",
+    "data/a/002.json": b"",
+    "data/ab/001.json": b"ab",
+    "data/b/year=2022/001.json": b"b",
+    "data-old/001.json": b"old",
+}
+
+
+@pytest.fixture(params=["s3", "local", "memory"])
+def storage(request, tmp_path):
+    if request.param == "s3":
+        with mock_aws():
+            s3_client = boto3.client("s3", region_name="us-east-1")
+            s3_client.create_bucket(Bucket=bucket)
+            yield S3Storage(bucket=bucket, s3_client=s3_client)
+    elif request.param == "local":
+        yield LocalStorage(dir_root=str(tmp_path))
+    else:
+        yield MemoryStorage()
+
+
+@pytest.fixture
+def seeded(storage):
+    for key, data in objects.items():
+        storage.write_bytes(key, data)
+    return storage
+
+
+def test_read_range(seeded):
+    key = "data/a/001.json"
+    assert seeded.read_bytes(key) == b"0123456789"
+    assert seeded.read_range(key, 0, 3) == b"012"
+    assert seeded.read_range(key, 3, 4) == b"3"
+    assert seeded.read_range(key, 7, 10) == b"789"
+    # the object is smaller than end
+    assert seeded.read_range(key, 7, 100) == b"789"
+
+
+def test_head(seeded):
+    info = seeded.head("data/a/001.json")
+    assert info.size == 10
+    if info.etag is not None:
+        assert info.etag == '"{}"'.format(hashlib.md5(b"0123456789").hexdigest())
+    assert seeded.head("data/a/002.json").size == 0
+    assert seeded.head("data/a/003.json") is None
+    # a prefix is not an object
+    assert seeded.head("data/a") is None
+    assert seeded.exists("data/a/002.json") is True
+    assert seeded.exists("data/a/003.json") is False
+
+
+def test_list_keys(seeded):
+    assert list(seeded.list_keys("")) == sorted(objects)
+    assert list(seeded.list_keys("data/a/")) == ["data/a/001.json", "data/a/002.json"]
+    assert list(seeded.list_keys("data/a")) == [
+        "data/a/001.json",
+        "data/a/002.json",
+        "data/ab/001.json",
+    ]
+    assert list(seeded.list_keys("data/b/year=2022/")) == ["data/b/year=2022/001.json"]
+    assert list(seeded.list_keys("not-exists/")) == []
+
+
+def test_delete(seeded):
+    seeded.delete("data/a/001.json")
+    seeded.delete("data/a/001.json")  # deleting a missing key is not an error
+    assert seeded.exists("data/a/001.json") is False
+    assert len(list(seeded.list_keys(""))) == len(objects) - 1
+
+
+def test_delete_keys(seeded):
+    seeded.delete_keys(["data/a/001.json", "data/ab/001.json", "not-exists.json"])
+    assert list(seeded.list_keys("data/a")) == ["data/a/002.json"]
+
+
+def test_delete_prefix(seeded):
+    seeded.delete_prefix("data/a/")
+    assert list(seeded.list_keys("")) == [
+        "data-old/001.json",
+        "data/ab/001.json",
+        "data/b/year=2022/001.json",
+    ]
+    seeded.delete_prefix("not-exists/")
+    seeded.delete_prefix("data")
+    assert list(seeded.list_keys("")) == []
+
+    # the prefix is still writable after it is deleted
+    seeded.write_bytes("data/a/001.json", b"new")
+    assert seeded.read_bytes("data/a/001.json") == b"new"
+
+
+def test_delete_prefix_many_keys(storage):
+    # S3 deletes in batches of 1000 keys
+    keys = [f"many/{str(i).zfill(4)}.json" for i in range(1005)]
+    for key in keys:
+        storage.write_bytes(key, b"")
+    assert list(storage.list_keys("many/")) == keys
+    storage.delete_prefix("many/")
+    assert list(storage.list_keys("many/")) == []
+
+
+if __name__ == "__main__":
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])
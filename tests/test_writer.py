@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+
+import pyarrow as pa
+import pyarrow.csv
+import pytest
+
+from learn_big_data_on_aws.dataset.writer import CsvWriter, TsvWriter, decode_nested
+
+schema = pa.schema(
+    [
+        ("order_id", pa.string()),
+        ("customer", pa.struct([("customer_id", pa.int64()), ("name", pa.string())])),
+        (
+            "items",
+            pa.list_(pa.struct([("item_id", pa.int64()), ("price", pa.float64())])),
+        ),
+    ]
+)
+
+rows = [
+    {
+        "order_id": "o-1\\",
+        "customer": {"customer_id": 1, "name": 'alice, "a" \\ \n'},
+        "items": [{"item_id": 1, "price": 1.5}, {"item_id": 2, "price": 0.3}],
+    },
+    {"order_id": "o-2", "customer": None, "items": []},
+]
+
+
+@pytest.mark.parametrize("writer", [CsvWriter(), TsvWriter()])
+def test_write_nested(writer):
+    batch = pa.RecordBatch.from_pylist(rows, schema=schema)
+    f = io.BytesIO()
+    assert writer.write([batch], f, schema=schema) == 2
+
+    file_schema = writer.get_file_schema(schema)
+    assert file_schema.field("customer").type == pa.string()
+    assert file_schema.field("items").type == pa.string()
+    table = pyarrow.csv.read_csv(
+        io.BytesIO(f.getvalue()),
+        parse_options=writer.get_parse_options(),
+        convert_options=pyarrow.csv.ConvertOptions(column_types=file_schema),
+    )
+    assert json.loads(table.column("customer")[0].as_py()) == rows[0]["customer"]
+    assert decode_nested(table, schema).to_pylist() == rows
+
+
+if __name__ == "__main__":
+    import os
+
+    basename = os.path.basename(__file__)
+    pytest.main([basename, "-s", "--tb=native"])